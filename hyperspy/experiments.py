@@ -24,9 +24,10 @@ import numpy as np
 import matplotlib.pyplot as plt
 from hyperspy.misc.utils import generate_axis, check_cube_dimensions, check_energy_dimensions
 from hyperspy.signals.spectrum import Spectrum
-from hyperspy.misc.utils import estimate_drift
+from hyperspy.misc.utils import estimate_drift, get_temporary_memmap
 from hyperspy.io import load
 from hyperspy.misc.progressbar import progressbar
+from hyperspy import messages
 
 class Experiments:
     def __init__(self, hl, ll=None):
@@ -43,7 +44,7 @@ class Experiments:
                 self.ll = load(ll)
         else:
             self.ll = None
-        self.shape = self.hl.data_cube.shape
+        self.shape = self.hl.data.shape
         self.convolution_axis = None
     def set_convolution_axis(self):
         """
@@ -98,93 +99,182 @@ class Experiments:
             plt.xlabel('Pixel')
             plt.ylabel('Correction factor')
 
-    def fourier_ratio_deconvolution(self, fwhm = None):
+    def fourier_ratio_deconvolution(self, fwhm = None, max_chunk_size = None):
         """Performs Fourier-ratio deconvolution
         
         The kernel is eds.hl and the psf is defined in eds.psf.
         
+        The spectra are processed in chunks of the navigation space using 
+        zero padded real FFTs. For each chunk the ratio of the transforms of
+        the zero loss and the low loss is computed once. A zero loss that is
+        a single spectrum, e.g. the gaussian defined by fwhm, is transformed 
+        only once and broadcast to all the pixels.
+        
         Parameters
         ----------
         fwhm : float or None
-            If None, the zero loss stored in eds.ll.zero_loss is used if it 
-            exists, otherwise it is calculated using the extract_zero_loss 
-            Spectrum method. Otherwise if float, a gaussian of the given FWHM 
+            If None, the zero loss stored in eds.ll.zero_loss is used. It 
+            can be either a SI of the same shape as the low loss or a single
+            spectrum. Otherwise if float, a gaussian of the given FWHM 
             will be used.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
+            
+        Returns
+        -------
+        A new spectrum with the deconvolved high loss. If the high loss is 
+        stored on disk the data of the new spectrum is a temporary file.
         """
-        
+        ll_axis = self.ll.axes_manager._slicing_axes[0]
+        hl_size = self.hl.axes_manager._slicing_axes[0].size
+        fft_size = 2 ** int(np.ceil(np.log2(2 * max(hl_size, ll_axis.size))))
         if fwhm is None:
             if self.ll.zero_loss is None:
-                self.ll.extract_zero_loss()
+                messages.warning_exit(
+                "The zero loss must be defined in the zero_loss attribute of "
+                "the low loss")
             zl = self.ll.zero_loss
+            shared_zl = len(zl.data.shape) == 1
+            if shared_zl is True:
+                z = zl._get_cached(('rfft', fft_size))
+                if z is None:
+                    z = np.fft.rfft(zl.data, fft_size)
+                    zl._set_cached(('rfft', fft_size), z)
         else:
-            from components.gaussian import Gaussian
-            g = Gaussian()
-            g.sigma.value = fwhm / 2.3548
-            g.A.value = 1
-            g.origin.value = 0
-            zl = np.zeros(self.ll.data_cube.shape)
-            zl[:] = g.function(self.ll.energy_axis).reshape(-1,1,1)
-        z = np.fft.fft(zl, axis=0)
-        jk = np.fft.fft(self.hl.data_cube, axis=0)
-        jl = np.fft.fft(self.ll.data_cube, axis=0)
-        self.hl._Spectrum__new_cube(np.fft.ifft(z*jk/jl, axis=0).real, 
-        'fourier-ratio deconvolution')
+            from hyperspy.components.gaussian import Gaussian
+            g = Gaussian(A = 1, sigma = fwhm / 2.3548, origin = 0)
+            shared_zl = True
+            z = np.fft.rfft(g.function(ll_axis.axis), fft_size)
+        if self.hl._is_lazy():
+            out = get_temporary_memmap(self.hl.data.shape, 'float64')
+        else:
+            out = np.empty(self.hl.data.shape, dtype = 'float64')
+        chunks = list(self.hl._iterate_navigation_chunks(max_chunk_size))
+        pbar = progressbar(maxval = len(chunks))
+        for i, chunk_slices in enumerate(chunks):
+            jl = np.fft.rfft(self.ll._signal_axis_last(
+                self.ll.data[chunk_slices]), fft_size)
+            if shared_zl is False:
+                z = np.fft.rfft(self.ll._signal_axis_last(
+                    zl.data[chunk_slices]), fft_size)
+            # The zero loss to low loss ratio is computed once per chunk
+            jl = z / jl
+            jk = np.fft.rfft(self.hl._signal_axis_last(
+                self.hl.data[chunk_slices]), fft_size)
+            self.hl._signal_axis_last(out[chunk_slices])[:] = np.fft.irfft(
+                jk * jl, fft_size)[..., :hl_size]
+            pbar.update(i + 1)
+        pbar.finish()
+        return self.hl._deepcopy_with_new_data(out)
             
     def richardson_lucy_deconvolution(self, iterations = 15, 
-    to_dec = 'self.hl', kernel = 'self.psf', mask = None):
+    to_dec = 'self.hl', kernel = 'self.psf', mask = None, tolerance = None,
+    max_chunk_size = None):
         """
     Performs 1D Richardson-Lucy Poissonian deconvolution of the to_dec by
     the psf. The deconvolved spim will be stored in the to_dec as a new cube.
     
+    The iterations are performed on chunks of spectra at once and the 
+    convolutions are computed by FFT. 
+    
     Parameters:
     -----------
     iterations: Number of iterations of the deconvolution. Note that increasing
     the value will increase the noise amplification.
     
     to_dec: a spectrum object.
-    psf: a 1D spectrum object containing the Point Spread Function
+    kernel: a spectrum object containing the Point Spread Function, either 
+    with the same dimensions as the to_dec or a single spectrum that is used 
+    for all the pixels without copying it.
+    mask: None or boolean array of the navigation shape of to_dec. If not None
+    only the spectra where the mask is True are deconvolved.
+    tolerance: None or float. If not None, the iterations of each spectrum 
+    stop when the maximum change of the deconvolved spectrum relative to its
+    maximum is smaller than tolerance.
+    max_chunk_size: None or int. Maximum size in bytes of the chunks of data. 
+    If None, signal.default_max_chunk_size is used.
         """
         if to_dec == 'self.hl':
             to_dec = self.hl
         if kernel == 'self.psf':
             kernel = self.psf
-        if check_cube_dimensions(to_dec, kernel, warn = False):
-            kernel_data = kernel.data_cube
-        elif check_energy_dimensions(to_dec, kernel, warn = False):
-            shape = to_dec.data_cube.shape
-            kernel_data = np.zeros(shape).swapaxes(0,2)
-            kernel_data[...] = kernel.data_cube[:,0,0]
-            kernel_data = kernel_data.swapaxes(0,2)
+        axis = to_dec.axes_manager._slicing_axes[0]
+        ia = axis.index_in_array
+        length = axis.size
+        if kernel.data.shape == to_dec.data.shape:
+            shared_kernel = False
+        elif kernel.data.shape == (length,):
+            shared_kernel = True
         else:
-            print """
-    The kernel must have either the same dimensions as the to_dec or be an
-    unidimensional spectrum with the same number of channels"""
-            sys.exit()
-        to_dec_data = copy.copy(to_dec.data_cube)
-        length = kernel_data.shape[0]
+            messages.warning_exit(
+            "The kernel must have either the same dimensions as the to_dec "
+            "or be an unidimensional spectrum with the same number of "
+            "channels")
+        # With this size the circular convolutions are linear convolutions
+        fft_size = 2 ** int(np.ceil(np.log2(2 * length)))
+        def kernel_transform(kernel_data):
+            """Returns the transform of the kernels, shifted so that their
+            maxima are at the origin, what centres the convolutions"""
+            kernel_data = kernel_data.reshape((-1, length))
+            rows = np.arange(kernel_data.shape[0])[:, np.newaxis]
+            shifted = np.zeros((kernel_data.shape[0], fft_size))
+            shifted[rows, (np.arange(length) - 
+                     kernel_data.argmax(1)[:, np.newaxis]) % fft_size] = \
+            kernel_data
+            return np.fft.rfft(shifted)
+        if shared_kernel is True:
+            K = kernel_transform(kernel.data)
+        if to_dec._is_lazy():
+            out = get_temporary_memmap(to_dec.data.shape, 'float64')
+        elif to_dec.data.dtype.kind == 'f':
+            out = to_dec.data
+        else:
+            out = np.empty(to_dec.data.shape, dtype = 'float64')
         print "\nPerfoming Richardson-Lucy iterative deconvolution"
-        dcshape = to_dec.data_cube.shape
-        pbar = progressbar(maxval = (dcshape[1] * dcshape[2]))
-        index = 0
-        for ix in xrange(to_dec.data_cube.shape[1]):
-            for iy in xrange(to_dec.data_cube.shape[2]):
-                if mask is None or mask[ix,iy]:
-#                    print "\n(%s, %s)" % (ix, iy)
-                    kernel_ = kernel_data[:, ix, iy]
-                    imax = kernel_.argmax()
-                    mimax = length -1 - imax
-                    D = to_dec.data_cube[:, ix, iy]
-                    O = copy.copy(D)
-                    for i in xrange(iterations):
-                        first = np.convolve(kernel_,O)[imax: imax + length]
-                        O = O * (np.convolve(kernel_[::-1], 
-                        D / first)[mimax: mimax + length])
-                    to_dec_data[:, ix, iy] = O
-                index += 1
-                pbar.update(index)
+        chunks = list(to_dec._iterate_navigation_chunks(max_chunk_size))
+        pbar = progressbar(maxval = len(chunks))
+        for index, chunk_slices in enumerate(chunks):
+            data = to_dec._signal_axis_last(to_dec.data[chunk_slices])
+            chunk_shape = data.shape
+            D = data.reshape((-1, length)).astype('float64')
+            O = D.copy()
+            if shared_kernel is False:
+                K = kernel_transform(to_dec._signal_axis_last(
+                    kernel.data[chunk_slices]))
+            if mask is None:
+                active = np.arange(D.shape[0])
+            else:
+                if ia < len(chunk_slices) - 1:
+                    mask_slices = chunk_slices[:ia] + chunk_slices[ia + 1:]
+                else:
+                    mask_slices = chunk_slices
+                active = np.where(np.ravel(mask[mask_slices]))[0]
+            for i in xrange(iterations):
+                if not len(active):
+                    break
+                K_active = K if shared_kernel is True else K[active]
+                first = np.fft.irfft(K_active * np.fft.rfft(
+                    O[active], fft_size), fft_size)[:, :length]
+                positive = first > 0
+                ratio = np.where(positive, 
+                    D[active] / np.where(positive, first, 1), 0)
+                new = O[active] * np.fft.irfft(K_active.conj() * 
+                    np.fft.rfft(ratio, fft_size), fft_size)[:, :length]
+                if tolerance is not None:
+                    change = np.abs(new - O[active]).max(1)
+                    scale = np.abs(new).max(1)
+                    converged = change <= tolerance * scale
+                O[active] = new
+                if tolerance is not None:
+                    active = active[converged == False]
+            to_dec._signal_axis_last(out[chunk_slices])[:] = \
+            O.reshape(chunk_shape)
+            pbar.update(index + 1)
         pbar.finish()
-        to_dec._Spectrum__new_cube(to_dec_data, 
-        'poissonian R-L deconvolution %i iterations' % iterations)
+        to_dec.data = out
+        to_dec._clear_cache()
+        to_dec._replot()
         
     def correct_spatial_drift(self):
         """Corrects the spatial drift between the CL and LL. It estimates 
@@ -144,18 +144,22 @@ class EgertonPanel(t.HasTraits):
     def plot_signal_map(self, *args, **kwargs):
         if self.define_signal_window is True and \
         self.signal_span_selector.range is not None:
-            ileft = self.SI.energy2index(self.signal_span_selector.range[0])
-            iright = self.SI.energy2index(self.signal_span_selector.range[1])
-            signal_sp = self.SI.data_cube[ileft:iright,...].squeeze().copy()
+            axis = self.SI.axes_manager._slicing_axes[0]
+            ileft = axis.value2index(self.signal_span_selector.range[0])
+            iright = axis.value2index(self.signal_span_selector.range[1])
+            # The signal window is integrated using the cached cumulative 
+            # sum, so moving the window does not require summing the data
+            signal_map = self.SI.integrate_in_index_range(ileft, iright)
             if self.define_background_window is True:
                 pars = utils.two_area_powerlaw_estimation(
-                self.SI, *self.bg_span_selector.range, only_current_spectrum = False)
-                x = self.SI.energy_axis[ileft:iright, np.newaxis, np.newaxis]
-                A = pars['A'][np.newaxis,...]
-                r = pars['r'][np.newaxis,...]
-                self.bg_sp = (A*x**(-r)).squeeze()
-                signal_sp -= self.bg_sp
-            self.signal_map = signal_sp.sum(0)
+                self.SI, *self.bg_span_selector.range, use_cumsum = True)
+                # Accumulate the background channel by channel instead of
+                # building the full background cube
+                bg_map = np.zeros(signal_map.shape)
+                for x in axis.axis[ileft:iright]:
+                    bg_map += pars['A'] * x ** (-pars['r'])
+                signal_map = signal_map - bg_map
+            self.signal_map = signal_map
             if self.map_ax is None:
                 f = plt.figure()
                 self.map_ax = f.add_subplot(111)
@@ -191,22 +195,42 @@ class EgertonPanel(t.HasTraits):
     
 
 def energy_window_dependency(s, left, right, min_width = 10):
-    ins = s.energy2index(left)
-    ine = s.energy2index(right)
-    energies = s.energy_axis[ins:ine - min_width]
+    """Plots the dependency of the power law background parameters on the 
+    starting energy of the fitting window.
+    
+    The window integrals are computed from the cumulative sum of the 
+    spectrum, that is calculated only once for all the starting energies.
+    
+    Parameters
+    ----------
+    s : Spectrum instance
+    left, right : float
+        The limits of the background window in energy units
+    min_width : int
+        The minimum width of the window in channels
+        
+    Returns
+    -------
+    rs, As : lists of the mean values of the parameters
+    """
+    axis = s.axes_manager._slicing_axes[0]
+    ins = axis.value2index(left)
+    ine = axis.value2index(right)
+    energies = axis.axis[ins:ine - min_width]
     rs = []
     As = []
     for E in energies:
-        di = utils.two_area_powerlaw_estimation(s, E, ine)
+        di = utils.two_area_powerlaw_estimation(s, E, right, 
+                                                use_cumsum = True)
         rs.append(di['r'].mean())
         As.append(di['A'].mean())
     f = plt.figure()
     ax1  = f.add_subplot(211)
-    ax1.plot(s.energy_axis[ins:ine - min_width], rs)
+    ax1.plot(energies, rs)
     ax1.set_title('Rs')
     ax1.set_xlabel('Energy')
     ax2  = f.add_subplot(212, sharex = ax1)
-    ax2.plot(s.energy_axis[ins:ine - min_width], As)
+    ax2.plot(energies, As)
     ax2.set_title('As')
     ax2.set_xlabel('Energy')
     return rs, As
@@ -43,6 +43,14 @@ def load(*filenames, **kwds):
     here is data_type, to manually force the outcome Signal to a particular
     type.
 
+    lazy : bool
+        Only supported by the hdf5 and ripple readers. If True, they do not
+        read the data into memory. Instead, the data attribute of the signal is a numpy memmap 
+        or an h5py dataset and the Signal methods that support it process 
+        it chunk by chunk. Use Signal.load_to_memory to read the data. 
+        The hdf5 file of an h5py dataset stays open until Signal.close or
+        Signal.load_to_memory is called.
+
     Example usage:
         Loading a single file:
             d=load('file.dm3')
@@ -50,6 +58,8 @@ def load(*filenames, **kwds):
             d=load('file.dm3',data_type='Image')
         Loading multiple files:
             d=load('file1.dm3','file2.dm3')
+        Loading a file that does not fit in memory:
+            d=load('file.hdf5', lazy=True)
 
     """
 
@@ -120,6 +130,10 @@ def load_with_reader(filename, reader, record_by = None, signal = None,
     from hyperspy.signals.spectrum import Spectrum
     from hyperspy.signals.eels import EELSSpectrum
     messages.information(reader.description)
+    if kwds.get('lazy', False) is True and \
+        getattr(reader, 'reads_lazy', False) is False:
+        messages.warning_exit(
+        "The %s reader does not support lazy loading" % reader.format_name)
     file_data_list = reader.file_reader(filename,
                                          record_by=record_by,
                                         **kwds)
@@ -35,6 +35,8 @@ default_extension = 4
 reads_images = True
 reads_spectrum = True
 reads_spectrum_image = True
+# The data can be loaded lazily, i.e. without reading it into memory
+reads_lazy = True
 # Writing capabilities
 writes_images = True
 writes_spectrum = True
@@ -69,9 +71,28 @@ writes_spectrum_image = True
 not_valid_format = 'The file is not a valid Hyperspy hdf5 file'
 
 def file_reader(filename, record_by, mode = 'r', driver = 'core', 
-                backing_store = False, **kwds):
-            
+                backing_store = False, lazy = False, **kwds):
+    """Reads the experiments stored in a Hyperspy hdf5 file.
+    
+    Parameters
+    ----------
+    filename : str
+    record_by : {None, 'spectrum', 'image'}
+    mode : str
+        The h5py file mode
+    driver : str
+        The h5py driver. By default the whole file is read into memory.
+    lazy : bool
+        If True, the data is not read into memory. When possible, i.e. when 
+        the dataset is stored contiguously and uncompressed, it is returned 
+        as a numpy memmap, otherwise as an h5py dataset. In the later case 
+        the file remains open until the close or load_to_memory method of 
+        the signal is called.
+    """
+    if lazy is True:
+        driver = None
     f = h5py.File(filename, mode = mode, driver = driver)
+    keep_open = False
     # If the file has been created with Hyperspy it should cointain a folder 
     # Experiments.
     experiments = []
@@ -88,7 +109,12 @@ def file_reader(filename, record_by, mode = 'r', driver = 'core',
         for experiment in experiments:
             exg = f['Experiments'][experiment]
             exp = {}
-            exp['data'] = exg['data'][:]
+            if lazy is True:
+                exp['data'] = get_lazy_array(exg['data'], filename, mode)
+                if isinstance(exp['data'], h5py.Dataset):
+                    keep_open = True
+            else:
+                exp['data'] = exg['data'][:]
             axes = []
             for i in xrange(len(exp['data'].shape)):
                 try:
@@ -106,9 +132,24 @@ def file_reader(filename, record_by, mode = 'r', driver = 'core',
         # Eventually there will be the possibility of loading the datasets of 
         # any hdf5 file
         pass
-    f.close()
+    if keep_open is False:
+        f.close()
     return exp_dict_list
 
+def get_lazy_array(dataset, filename, mode = 'r'):
+    """Returns a numpy memmap of the dataset if it is stored contiguously
+    and uncompressed in the file, otherwise returns the dataset itself"""
+    if dataset.chunks is None and dataset.compression is None:
+        try:
+            offset = dataset.id.get_offset()
+        except Exception:
+            offset = None
+        if offset is not None:
+            return np.memmap(filename, dtype = dataset.dtype, 
+                             mode = 'c' if mode == 'r' else 'r+', 
+                             offset = offset, shape = dataset.shape)
+    return dataset
+
 def dict2hdfgroup(dictionary, group):
     for key, value in dictionary.iteritems():
         if isinstance(value, dict):
@@ -143,7 +184,15 @@ def file_writer(filename, signal, *args, **kwds):
     f = h5py.File(filename, mode = 'w')
     exps = f.create_group('Experiments')
     expg = exps.create_group(signal.mapped_parameters.name)
-    expg.create_dataset('data', data = signal.data)
+    if isinstance(signal.data, np.ndarray) and \
+    not isinstance(signal.data, np.memmap):
+        expg.create_dataset('data', data = signal.data)
+    else:
+        # The data is on disk, write it chunk by chunk
+        dataset = expg.create_dataset('data', shape = signal.data.shape, 
+                                      dtype = signal.data.dtype)
+        for chunk_slices in signal._iterate_chunks():
+            dataset[chunk_slices] = np.asarray(signal.data[chunk_slices])
     for axis in signal.axes_manager.axes:
         axis_dict = axis.get_axis_dictionary()
         # For the moment we don't store the slice_bool
@@ -41,6 +41,8 @@ default_extension = 0
 reads_images = True
 reads_spectrum = True          # but maybe True
 reads_spectrum_image = True
+# The data can be loaded lazily, i.e. without reading it into memory
+reads_lazy = True
 # Writing capabilities
 writes_images = True           # but maybe True
 writes_spectrum = True
@@ -142,9 +144,12 @@ def parse_ripple(fp):
         raise IOError, err
     return rpl_info
 
-def read_raw(rpl_info, fp):
+def read_raw(rpl_info, fp, lazy = False):
     """Read the raw file object 'fp' based on the information given in the
     'rpl_info' dictionary.
+    
+    If lazy is True the data is returned as a numpy memmap instead of being 
+    read into memory.
     """
     width = rpl_info['width']
     height = rpl_info['height']
@@ -175,9 +180,12 @@ def read_raw(rpl_info, fp):
     data_type = np.dtype(data_type)
     data_type = data_type.newbyteorder(endian)
 
-    data = read_data_array(fp,
-                           byte_address=offset,
-                           data_type=data_type)
+    if lazy is True:
+        data = np.memmap(fp, offset=offset, dtype=data_type, mode='c')
+    else:
+        data = read_data_array(fp,
+                               byte_address=offset,
+                               data_type=data_type)
 
     if record_by == 'vector':   # spectral image
         size = (height, width, depth)
@@ -190,7 +198,7 @@ def read_raw(rpl_info, fp):
         data = data.reshape(size)
     return data
 
-def file_reader(filename, rpl_info=None, *args, **kwds):
+def file_reader(filename, rpl_info=None, lazy=False, *args, **kwds):
     """Parses a Lispix (http://www.nist.gov/lispix/) ripple (.rpl) file
     and reads the data from the corresponding raw (.raw) file;
     or, read a raw file if the dictionary rpl_info is provided.
@@ -280,6 +288,9 @@ def file_reader(filename, rpl_info=None, *args, **kwds):
     Other keys and values can be included and are ignored.
 
     Any number of spaces can go along with each tab.
+
+    If lazy is True the raw file is memory mapped instead of being read 
+    into memory.
     """
     if not rpl_info:
         if filename[-3:] in file_extensions:
@@ -296,7 +307,7 @@ def file_reader(filename, rpl_info=None, *args, **kwds):
     if not rawfname:
         raise IOError, 'RAW file "%s" does not exists' % rawfname
     else:
-        data = read_raw(rpl_info, rawfname)
+        data = read_raw(rpl_info, rawfname, lazy=lazy)
 
     if rpl_info['record-by'] == 'vector':
         print 'Loading as spectrum'
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from hyperspy import messages
+
+def _mask_to_indexes(mask, size):
+    if mask is None:
+        return np.arange(size)
+    return np.where(mask)[0]
+
+def _contiguous_runs(indexes):
+    """Returns the (start, stop) limits of the runs of consecutive values of
+    a sorted array of ints"""
+    breaks = np.where(np.diff(indexes) != 1)[0] + 1
+    starts = np.concatenate(([0], breaks))
+    stops = np.concatenate((breaks, [len(indexes)]))
+    return [(indexes[i], indexes[j - 1] + 1) for i, j in zip(starts, stops)]
+
+class UnfoldedData(object):
+    """Read-only view of a multidimensional array as the transposed 
+    unfolded data, i.e. as a matrix with a row per channel and a column per
+    pixel.
+
+    The array, e.g. a numpy memmap or an h5py dataset, is not reshaped and
+    only the part of it that contains the requested columns is read, i.e. 
+    the indexes of the first navigation axis that contain them, so that a 
+    sparse list of columns does not read the whole span between them. The
+    columns are numbered in the order of the unfolded data.
+
+    Parameters
+    ----------
+    data : array-like
+    navigation_axes, signal_axes : lists of ints
+        The indexes in the array of the navigation and signal axes.
+    """
+
+    def __init__(self, data, navigation_axes, signal_axes):
+        self.data = data
+        self.navigation_axes = sorted(navigation_axes)
+        self.signal_axes = sorted(signal_axes)
+        navigation_shape = [data.shape[i] for i in self.navigation_axes]
+        signal_shape = [data.shape[i] for i in self.signal_axes]
+        self.shape = (int(np.prod(signal_shape)), 
+                      int(np.prod(navigation_shape)))
+        # Number of columns per index of the first navigation axis
+        self._columns_per_index = int(np.prod(navigation_shape[1:]))
+
+    def __getitem__(self, index):
+        rows, columns = index
+        n = self._columns_per_index
+        if isinstance(columns, slice):
+            j0, j1 = columns.indices(self.shape[1])[:2]
+            runs = [(j0 // n, -(-j1 // n))]
+        else:
+            columns = np.asarray(columns)
+            if not len(columns):
+                return np.empty((self.shape[0], 0))[rows]
+            indexes = np.unique(columns // n)
+            runs = _contiguous_runs(indexes)
+        chunks = []
+        for i0, i1 in runs:
+            getitem = [slice(None)] * len(self.data.shape)
+            if self.navigation_axes:
+                getitem[self.navigation_axes[0]] = slice(i0, i1)
+            chunk = np.asarray(self.data[tuple(getitem)])
+            chunk = chunk.transpose(self.navigation_axes + self.signal_axes)
+            chunks.append(chunk.reshape((-1, self.shape[0])))
+        chunk = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+        if isinstance(columns, slice):
+            offset = runs[0][0] * n
+            chunk = chunk[j0 - offset:j1 - offset]
+        else:
+            # Position of each column in the concatenated runs
+            chunk = chunk[np.searchsorted(indexes, columns // n) * n + 
+                          columns % n]
+        return chunk.T[rows]
+
+class TreatedData(object):
+    """Data matrix of a multivariate analysis with its pre-treatments.
+
+    The pre-treatments are not applied to the stored data, that is never
+    modified or copied as a whole. Instead they are applied on the fly to
+    the blocks of columns that are read. The treated matrix is
+
+        T = r[:, np.newaxis] * (X - m[np.newaxis, :]) * s[np.newaxis, :]
+
+    where X is the data matrix, with a row per channel and a column per
+    pixel, m is the mean of each column (centering), s is the scale of each
+    column (variance or Poissonian noise normalization) and r is the scale
+    of each row (Poissonian noise normalization). The decomposition uses
+    only the rows and the columns selected by the signal and navigation
+    masks.
+
+    Parameters
+    ----------
+    X : numpy array of shape (channels, pixels) or UnfoldedData
+        Typically a transposed view of the unfolded data.
+    navigation_mask, signal_mask : None or boolean numpy array
+        The pixels and channels to use. If None all are used.
+    max_chunk_size : int
+        Maximum size in bytes of the blocks of treated data.
+    """
+
+    def __init__(self, X, navigation_mask = None, signal_mask = None,
+                 max_chunk_size = 64 * 2**20):
+        self.X = X
+        self.rows = _mask_to_indexes(signal_mask, X.shape[0])
+        self.columns = _mask_to_indexes(navigation_mask, X.shape[1])
+        self.column_mean = None
+        self.column_scale = None
+        self.row_scale = None
+        self.max_chunk_size = max_chunk_size
+
+    @property
+    def shape(self):
+        """Shape of the treated matrix restricted to the masks"""
+        return len(self.rows), len(self.columns)
+
+    def _get_mask(self, indexes, size):
+        if len(indexes) == size:
+            return None
+        mask = np.zeros(size, dtype = 'bool')
+        mask[indexes] = True
+        return mask
+
+    @property
+    def navigation_mask(self):
+        return self._get_mask(self.columns, self.X.shape[1])
+
+    @property
+    def signal_mask(self):
+        return self._get_mask(self.rows, self.X.shape[0])
+
+    def get_block(self, j0, j1, all_rows = False):
+        """Returns the treated columns j0:j1 of the masked matrix.
+
+        Parameters
+        ----------
+        j0, j1 : int
+        all_rows : bool
+            If True, the rows that are not in the signal mask are also
+            returned.
+        """
+        columns = self.columns[j0:j1]
+        if len(columns) and columns[-1] - columns[0] == len(columns) - 1:
+            # Contiguous columns are read with a slice
+            block = self.X[:, columns[0]:columns[-1] + 1]
+        else:
+            block = self.X[:, columns]
+        block = np.array(block, dtype = 'float64')
+        if all_rows is False and len(self.rows) != self.X.shape[0]:
+            block = block[self.rows]
+        if self.column_mean is not None:
+            block -= self.column_mean[columns]
+        if self.column_scale is not None:
+            block *= self.column_scale[columns]
+        if self.row_scale is not None:
+            if all_rows is True:
+                block *= self.row_scale[:, np.newaxis]
+            else:
+                block *= self.row_scale[self.rows][:, np.newaxis]
+        return block
+
+    def iterate_blocks(self, all_rows = False):
+        """Yields (j0, j1, block) where block contains the treated columns
+        j0:j1 of the masked matrix. See get_block."""
+        n_rows = self.X.shape[0] if all_rows is True else len(self.rows)
+        step = int(max(1, self.max_chunk_size // (8 * max(1, n_rows))))
+        for j0 in xrange(0, len(self.columns), step):
+            j1 = min(j0 + step, len(self.columns))
+            yield j0, j1, self.get_block(j0, j1, all_rows)
+
+    def to_array(self, all_rows = False):
+        """Returns the treated masked matrix as an array. Unlike the other
+        methods, it forms a float64 copy of the whole selected data."""
+        n_rows = self.X.shape[0] if all_rows is True else len(self.rows)
+        T = np.empty((n_rows, len(self.columns)))
+        for j0, j1, block in self.iterate_blocks(all_rows):
+            T[:, j0:j1] = block
+        return T
+
+    def dot(self, v, all_rows = False):
+        """Returns the product of the treated masked matrix by v, which has
+        a row per selected column"""
+        n_rows = self.X.shape[0] if all_rows is True else len(self.rows)
+        result = np.zeros((n_rows,) + v.shape[1:])
+        for j0, j1, block in self.iterate_blocks(all_rows):
+            result += np.dot(block, v[j0:j1])
+        return result
+
+    def gram(self, all_rows = False):
+        """Returns the product of the treated masked matrix by its 
+        transpose, accumulated block by block in a single pass over the 
+        data.
+
+        Parameters
+        ----------
+        all_rows : bool
+            If True, the left factor also contains the rows that are not in
+            the signal mask, so the result has a row per channel and a 
+            column per selected row.
+        """
+        n_rows = self.X.shape[0] if all_rows is True else len(self.rows)
+        G = np.zeros((n_rows, len(self.rows)))
+        for j0, j1, block in self.iterate_blocks(all_rows):
+            if all_rows is True and len(self.rows) != self.X.shape[0]:
+                G += np.dot(block, block[self.rows].T)
+            else:
+                G += np.dot(block, block.T)
+        return G
+
+    def transpose_dot(self, u):
+        """Returns the product of the transposed treated masked matrix by u,
+        which has a row per selected row"""
+        result = np.empty((len(self.columns),) + u.shape[1:])
+        for j0, j1, block in self.iterate_blocks():
+            result[j0:j1] = np.dot(block.T, u)
+        return result
+
+    def center(self):
+        """Subtracts the mean of each column, computed over the selected
+        rows"""
+        self.column_mean = np.zeros(self.X.shape[1])
+        for j0, j1, block in self.iterate_blocks():
+            self.column_mean[self.columns[j0:j1]] = block.mean(0)
+
+    def variance2one(self):
+        """Scales each column to unit variance over the selected rows"""
+        std = np.ones(self.X.shape[1])
+        for j0, j1, block in self.iterate_blocks():
+            std[self.columns[j0:j1]] = block.std(0)
+        std[std == 0] = 1
+        self.column_scale = 1 / std
+
+    def normalize_poissonian_noise(self):
+        """Scales the rows and columns following Surf. Interface Anal. 2004;
+        36: 203-212 to "normalize" the Poissonian noise.
+
+        The rows and columns that sum zero are removed from the masks.
+        """
+        messages.information(
+            "Scaling the data to normalize the (presumably) Poissonian noise")
+        aG = np.zeros(len(self.columns))
+        bH = np.zeros(len(self.rows))
+        for j0, j1, block in self.iterate_blocks():
+            aG[j0:j1] = block.sum(0)
+            bH += block.sum(1)
+        if (aG < 0).any() or (bH < 0).any():
+            messages.warning_exit(
+            "Data error: negative values\n"
+            "Are you sure that the data follow a poissonian distribution?")
+        self.columns = self.columns[aG != 0]
+        self.rows = self.rows[bH != 0]
+        self.root_aG = np.sqrt(aG[aG != 0])
+        self.root_bH = np.sqrt(bH[bH != 0])
+        self.column_scale = np.ones(self.X.shape[1])
+        self.column_scale[self.columns] = 1 / self.root_aG
+        self.row_scale = np.ones(self.X.shape[0])
+        self.row_scale[self.rows] = 1 / self.root_bH
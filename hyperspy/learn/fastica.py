@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+"""FastICA with symmetric decorrelation following Hyvarinen, IEEE Trans.
+Neural Networks 10 (1999) 626-634."""
+
+import multiprocessing.pool
+
+import numpy as np
+from numpy.polynomial.hermite_e import hermegauss
+
+from hyperspy import messages
+
+# Each nonlinearity is defined by the contrast function G, its derivative g
+# and the derivative of g
+
+def _logcosh(y):
+    gy = np.tanh(y)
+    return gy, 1 - gy ** 2
+
+def _logcosh_contrast(y):
+    # log(cosh(y)) computed without overflow
+    y = np.abs(y)
+    return y + np.log1p(np.exp(-2 * y)) - np.log(2)
+
+def _exp(y):
+    exp = np.exp(- y ** 2 / 2)
+    return y * exp, (1 - y ** 2) * exp
+
+def _exp_contrast(y):
+    return - np.exp(- y ** 2 / 2)
+
+def _cube(y):
+    return y ** 3, 3 * y ** 2
+
+def _cube_contrast(y):
+    return y ** 4 / 4
+
+nonlinearities = {
+    'logcosh' : (_logcosh, _logcosh_contrast),
+    'exp' : (_exp, _exp_contrast),
+    'cube' : (_cube, _cube_contrast),
+    }
+
+def _gaussian_expectation(function):
+    """Expectation of function for a standard normal variable, computed by
+    Gauss-Hermite quadrature"""
+    x, weights = hermegauss(60)
+    return np.dot(weights, function(x)) / np.sqrt(2 * np.pi)
+
+def _sym_decorrelation(W):
+    """Returns (W * W.T) ** (-1/2) * W"""
+    s, u = np.linalg.eigh(np.dot(W, W.T))
+    return np.dot(np.dot(u * (1 / np.sqrt(s)), u.T), W)
+
+def negentropy(X, W, fun = 'logcosh'):
+    """Approximation of the negentropy of the sources X * W.T, summed over
+    the sources.
+
+    Parameters
+    ----------
+    X : numpy array
+        Whitened data with a row per sample and a column per variable.
+    W : numpy array
+        Unmixing matrix.
+    fun : {'logcosh', 'exp', 'cube'}
+    """
+    contrast = nonlinearities[fun][1]
+    Y = np.dot(X, W.T)
+    return ((contrast(Y).mean(0) -
+             _gaussian_expectation(contrast)) ** 2).sum()
+
+def _fastica(X, fun, max_iter, tol, random_state):
+    """Runs FastICA from a random unmixing matrix. Returns the unmixing
+    matrix and True if it converged."""
+    g = nonlinearities[fun][0]
+    n = X.shape[1]
+    W = _sym_decorrelation(
+        np.random.RandomState(random_state).normal(size = (n, n)))
+    for i in xrange(max_iter):
+        gy, g_y = g(np.dot(X, W.T))
+        W1 = _sym_decorrelation(
+            np.dot(gy.T, X) / X.shape[0] - g_y.mean(0)[:, np.newaxis] * W)
+        lim = np.abs(np.abs(np.diag(np.dot(W1, W.T))) - 1).max()
+        W = W1
+        if lim < tol:
+            return W, True
+    return W, False
+
+def fastica(X, fun = 'logcosh', n_restarts = 1, parallel = None,
+            max_iter = 200, tol = 1e-4, random_state = None):
+    """Independent components analysis by FastICA.
+
+    All the sources are estimated at once by fixed point iterations with a
+    symmetric decorrelation of the unmixing matrix.
+
+    Parameters
+    ----------
+    X : numpy array
+        Centered and whitened data with a row per sample and a column per
+        variable.
+    fun : {'logcosh', 'exp', 'cube'}
+        The nonlinearity. 'cube' corresponds to the kurtosis, 'exp' is
+        more robust for super-gaussian sources.
+    n_restarts : int
+        Number of runs from different random initializations. The
+        unmixing matrix with the largest negentropy is returned.
+    parallel : None or int
+        If not None, the runs are distributed between this number of
+        threads.
+    max_iter : int
+    tol : float
+        Tolerance of the change of the unmixing matrix.
+    random_state : None or int
+        Seed of the random initializations.
+
+    Returns
+    -------
+    W : numpy array
+        The orthogonal unmixing matrix, the sources are X * W.T
+    """
+    if fun not in nonlinearities:
+        messages.warning_exit("Unknown FastICA nonlinearity: %s" % fun)
+    seeds = np.random.RandomState(random_state).randint(
+        2**31 - 1, size = n_restarts)
+    run = lambda seed: _fastica(X, fun, max_iter, tol, seed)
+    if parallel is None or parallel < 2 or n_restarts < 2:
+        results = map(run, seeds)
+    else:
+        pool = multiprocessing.pool.ThreadPool(parallel)
+        try:
+            results = pool.map(run, seeds)
+        finally:
+            pool.close()
+            pool.join()
+    if not np.any([converged for W, converged in results]):
+        messages.warning(
+            "FastICA did not converge. Consider increasing max_iter or "
+            "tol")
+    negentropies = [negentropy(X, W, fun) for W, converged in results]
+    return results[int(np.argmax(negentropies))][0]
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+def _expand_index(index, ndim):
+    """Returns the index as a tuple of ndim items without Ellipsis"""
+    if not isinstance(index, tuple):
+        index = (index,)
+    for i, item in enumerate(index):
+        if item is Ellipsis:
+            index = index[:i] + (slice(None),) * (ndim - len(index) + 1) + \
+                index[i + 1:]
+            break
+    return index + (slice(None),) * (ndim - len(index))
+
+def _is_integer(item):
+    return isinstance(item, (int, long, np.integer))
+
+class LowRankData(object):
+    """Read-only array-like object that stores a low-rank model of the data,
+    the product of factors by scores, and reconstructs only the part of the
+    data that is requested by indexing, e.g. the current spectrum when
+    plotting or a chunk of data when saving.
+
+    A Signal whose data is a LowRankData is processed chunk by chunk as if
+    the data were stored on disk.
+
+    Parameters
+    ----------
+    factors : numpy array
+        Array with a row per channel and a column per component.
+    scores : numpy array
+        Array with a row per component and a column per pixel.
+    shape : tuple of ints
+        The shape of the data.
+    navigation_axes, signal_axes : lists of ints
+        The indexes in the array of the navigation and signal axes. The
+        pixels and channels are numbered in the order of the unfolded data.
+    """
+
+    def __init__(self, factors, scores, shape, navigation_axes,
+                 signal_axes):
+        self.factors = factors
+        self.scores = scores
+        self.shape = tuple(shape)
+        self.navigation_axes = sorted(navigation_axes)
+        self.signal_axes = sorted(signal_axes)
+        self.dtype = np.result_type(factors.dtype, scores.dtype)
+        self._navigation_index = np.arange(scores.shape[1]).reshape(
+            [self.shape[i] for i in self.navigation_axes])
+        self._signal_index = np.arange(factors.shape[0]).reshape(
+            [self.shape[i] for i in self.signal_axes])
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        index = _expand_index(index, self.ndim)
+        navigation = np.asarray(self._navigation_index[
+            tuple([index[i] for i in self.navigation_axes])])
+        signal = np.asarray(self._signal_index[
+            tuple([index[i] for i in self.signal_axes])])
+        data = np.dot(self.factors[signal.ravel()],
+                      self.scores[:, navigation.ravel()])
+        data = data.reshape(signal.shape + navigation.shape)
+        # Put the remaining axes in the order of the array
+        remaining = [i for i in self.signal_axes + self.navigation_axes
+                     if not _is_integer(index[i])]
+        return data.transpose(np.argsort(remaining))
+
+    def __array__(self, dtype = None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype)
+        return data
+
+class ResidualData(object):
+    """Read-only array-like object that computes the difference between the
+    data and a model, e.g. a LowRankData, only for the part of the data that
+    is requested by indexing.
+
+    Parameters
+    ----------
+    data : array-like
+    model : array-like with the same shape
+    """
+
+    def __init__(self, data, model):
+        self.data = data
+        self.model = model
+        self.shape = tuple(data.shape)
+        self.dtype = np.result_type(data.dtype, model.dtype, 'float32')
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        return np.asarray(self.data[index], dtype = self.dtype) - \
+            np.asarray(self.model[index])
+
+    def __array__(self, dtype = None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype)
+        return data
@@ -26,11 +26,34 @@
 import numpy as np
 import scipy.linalg
 
-try:
-    from scikits.learn.utils.extmath import fast_svd
-    sklearn = True
-except:
-    sklearn = False
+from hyperspy.learn.svd_pca import randomized_svd
+
+def _ml_projection(X, W, U, block_size = 4096):
+    """Projects each column of X on the column space of U, minimizing the 
+    sum of the squared residuals weighted by the corresponding column of W.
+
+    The p x p normal equations of all the columns of a block are solved at
+    once.
+
+    Returns
+    -------
+    MLX : the projected matrix
+    Sobj : the weighted sum of the squared residuals
+    """
+    m, p = U.shape
+    UU = (U[:, :, np.newaxis] * U[:, np.newaxis, :]).reshape((m, p * p))
+    MLX = np.empty(X.shape)
+    Sobj = 0.
+    for i0 in xrange(0, X.shape[1], block_size):
+        x = X[:, i0:i0 + block_size]
+        w = W[:, i0:i0 + block_size]
+        # U.T * diag(w) * U for each column
+        M = np.dot(w.T, UU).reshape((-1, p, p))
+        b = np.dot((w * x).T, U)
+        F = np.linalg.solve(M, b[..., np.newaxis])[..., 0]
+        MLX[:, i0:i0 + block_size] = np.dot(U, F.T)
+        Sobj += (w * (x - MLX[:, i0:i0 + block_size]) ** 2).sum()
+    return MLX, Sobj
 
 def mlpca(X,varX,p, convlim = 1E-10, maxiter = 50000, fast = False):
     """
@@ -51,66 +74,50 @@ def mlpca(X,varX,p, convlim = 1E-10, maxiter = 50000, fast = False):
             0 = nkmal termination
             1 = max iterations exceeded.
     """
-    if fast is True and sklearn is True:
+    if fast is True:
         def svd(X):
-            return fast_svd(X, p, q = 3)
+            return randomized_svd(X, p, n_iter = 3)
     else:
         def svd(X):
             return scipy.linalg.svd(X, full_matrices = False)
     XX = X
 #    varX = stdX**2
-    n = XX.shape[1]
     print "\nPerforming maximum likelihood principal components analysis"
     # Generate initial estimates
     print "Generating initial estimates"
-#    CV = np.zeros((X.shape[0], X.shape[0]))
-#    for i in xrange(X.shape[0]):
-#        for j in xrange(X.shape[0]):
-#            denom = np.min((len(np.where(X[i,:] != 0)), 
-#            len(np.where(X[j,:] != 0))))
-#            CV[i,j] = np.dot(X[i,:], (X[j,:]).T) / denom
     CV = np.cov(X)
     U, S, Vh = svd(CV)
-    U0 = U
+    U0 = U[:, :p]
+    W = 1 / varX
 
     # Loop for alternating least squares
+    # The rows and columns spaces are optimized alternately, what does not 
+    # change the objective function, so the convergence is checked at every
+    # iteration
     print "Optimization iteration loop"
     count = 0
     Sold = 0
     ErrFlag = -1
     while ErrFlag < 0:
         count += 1
-        Sobj = 0
-        MLX = np.zeros(XX.shape)
-        for i in xrange(n):
-#            Q = sp.sparse.lil_matrix((varX.shape[0] ,varX.shape[0]))
-#            Q.setdiag((1/(varX[:,i])).squeeze())
-#            Q.tocsc()
-
-            Q = np.diag((1/(varX[:,i])).squeeze())
-            U0m = np.matrix(U0)
-            F = np.linalg.inv((U0m.T * Q * U0m))
-            MLX[:,i] = np.array(U0m * F * U0m.T * Q * ((np.matrix(XX[:,i])).T)).squeeze()
-            dx = np.matrix((XX[:,i] - MLX[:,i]).squeeze())
-            Sobj = Sobj + float(dx *Q * dx.T)
-        if (count % 2) == 1:
-            print "Iteration : %s" % (count / 2)
-            if (abs(Sold - Sobj) / Sobj) < convlim:
-                ErrFlag = 1
-            print "(abs(Sold - Sobj) / Sobj) = %s" % (abs(Sold - Sobj) / Sobj)
-            if count > maxiter:
-                ErrFlag = 1
+        MLX, Sobj = _ml_projection(XX, W, U0)
+        print "Iteration : %s" % count
+        print "(abs(Sold - Sobj) / Sobj) = %s" % (abs(Sold - Sobj) / Sobj)
+        if (abs(Sold - Sobj) / Sobj) < convlim:
+            ErrFlag = 0
+        elif count > maxiter:
+            ErrFlag = 1
         
         if ErrFlag < 0:
             Sold = Sobj
             U,S,Vh = svd(MLX)
-            V = Vh.T
             XX = XX.T
-            varX = varX.T
-            n = XX.shape[1]
-            U0 = V[:]
+            W = W.T
+            U0 = Vh[:p].T
     # Finished
-    
+    if count % 2 == 0:
+        # The last projection was done on the transposed matrix
+        MLX = MLX.T
     U, S, Vh = svd(MLX)
     V = Vh.T
 #    S = S[:p]
@@ -23,11 +23,20 @@ import os
 
 import numpy as np
 import matplotlib.pyplot as plt
-import mdp
+try:
+    import mdp
+except ImportError:
+    # Only the mdp and NIPALS PCA algorithms and the JADE, CuBICA and 
+    # TDSEP ICA algorithms require it
+    mdp = None
 
 from hyperspy.misc import utils
-from hyperspy.learn.svd_pca import pca
+from hyperspy.learn.svd_pca import pca, gram_pca, _choose_formulation
 from hyperspy.learn.mlpca import mlpca
+from hyperspy.learn.nmf import nmf
+from hyperspy.learn.fastica import fastica
+from hyperspy.learn.low_rank import LowRankData, ResidualData
+from hyperspy.learn.data_operator import TreatedData, UnfoldedData
 from hyperspy.misc.utils import center_and_scale
 from hyperspy.defaults_parser import defaults
 from hyperspy import messages
@@ -50,10 +59,36 @@ class MVA():
             target=self.mva_results
         return target
 
+    def _get_data_matrix(self, on_peaks = False):
+        """Returns the data as a matrix with a row per channel and a column
+        per pixel, unfolding the data if needed.
+
+        The data on disk is not reshaped, it is read by chunks of pixels in
+        the order of the unfolded data (see UnfoldedData). Sets 
+        self._unfolded4pca, the caller must fold the data back when it is 
+        True.
+        """
+        if self._is_lazy() and not on_peaks:
+            self._unfolded4pca = False
+        else:
+            self._unfolded4pca = self.unfold_if_multidim()
+        if on_peaks:
+            return self.peak_chars
+        elif self._is_lazy():
+            return UnfoldedData(self.data, 
+                [axis.index_in_array for axis in 
+                 self.axes_manager._non_slicing_axes],
+                [axis.index_in_array for axis in 
+                 self.axes_manager._slicing_axes])
+        else:
+            # The data must be transposed both for Images and Spectra
+            return self.data.T.squeeze()
+
     def principal_components_analysis(self, normalize_poissonian_noise = False,
     algorithm = 'svd', output_dimension = None, navigation_mask = None,
     signal_mask = None, center = False, variance2one = False, var_array = None,
-    var_func = None, polyfit = None, on_peaks=False):
+    var_func = None, polyfit = None, on_peaks=False, n_iter = 2, 
+    n_oversamples = 10):
         """Principal components analysis.
 
         The results are stored in self.mva_results
@@ -62,7 +97,8 @@ class MVA():
         ----------
         normalize_poissonian_noise : bool
             If True, scale the SI to normalize Poissonian noise
-        algorithm : {'svd', 'fast_svd', 'mlpca', 'fast_mlpca', 'mdp', 'NIPALS'}
+        algorithm : {'svd', 'fast_svd', 'gram', 'mlpca', 'fast_mlpca', 'mdp', 
+                     'NIPALS'}
         output_dimension : None or int
             number of PCA to keep
         navigation_mask : boolean numpy array
@@ -78,19 +114,49 @@ class MVA():
             var_array. Alternatively, it can a an array with the coefficients
             of a polynomy.
         polyfit :
-
+        n_iter : int
+            Number of power iterations of the 'fast_svd' algorithm. 
+            Increasing it improves the accuracy of the components when the 
+            singular values decay slowly, at the cost of two passes over 
+            the data per iteration.
+        n_oversamples : int
+            Number of random vectors in addition to output_dimension used 
+            by the 'fast_svd' algorithm to sample the range of the data.
+
+        Notes
+        -----
+        The pre-treatments (centering, variance and Poissonian noise 
+        normalization) are applied on the fly to the data as it is read 
+        and the data is neither modified nor copied. Centering subtracts 
+        the mean of each pixel over the selected channels and the variance 
+        normalization scales each pixel to unit variance over the selected
+        channels.
+
+        The 'svd' algorithm eigendecomposes the (channels x channels) Gram
+        matrix of the treated data, accumulated as with 'gram', unless 
+        there are many more channels than pixels, in which case it loads 
+        a float64 copy of the treated data in memory to eigendecompose the
+        (pixels x pixels) Gram matrix. It uses ARPACK when 
+        output_dimension is small (see hyperspy.learn.svd_pca.pca).
+
+        The 'gram' algorithm accumulates the (channels x channels) Gram 
+        matrix of the treated data in one pass over chunks of spectra and
+        computes the scores in a second pass. Together with 'fast_svd' it 
+        never copies the data, so they are the algorithms of choice for 
+        data stored on disk, that is decomposed without unfolding it. The 
+        'mdp', 'NIPALS', 'mlpca' and 'fast_mlpca' algorithms need the 
+        treated data as an array and therefore load a float64 copy of it 
+        in memory.
 
         See also
         --------
         plot_principal_components, plot_principal_components_maps, plot_lev
 
         """
-        # backup the original data
-        if on_peaks:
-            self._data_before_treatments = self.peak_chars.copy()
-        else:
-            self._data_before_treatments = self.data.copy()
         # Check for conflicting options and correct them when possible
+        if (algorithm == 'mdp' or algorithm == 'NIPALS') and mdp is None:
+            messages.warning_exit(
+            "The %s algorithm requires the MDP toolkit" % algorithm)
         if (algorithm == 'mdp' or algorithm == 'NIPALS') and center is False:
             print \
             """
@@ -123,39 +189,40 @@ class MVA():
             "Disabling variance2one")
             variance2one = False
 
-        # Apply pre-treatments
+        if self._is_lazy() and not on_peaks and algorithm in \
+            ('mdp', 'NIPALS', 'mlpca', 'fast_mlpca'):
+            messages.warning(
+            "The %s algorithm loads a float64 copy of the whole data in "
+            "memory. Use the svd, fast_svd or gram algorithms to decompose "
+            "data that does not fit in memory" % algorithm)
+
+        # Transform the data in a line spectrum
+        dc = self._get_data_matrix(on_peaks)
+        navigation_mask = \
+            self._correct_navigation_mask_when_unfolded(navigation_mask)
+        # The pre-treatments are applied on the fly to the blocks of data
+        # that are read, the data is not modified
+        from hyperspy.signal import default_max_chunk_size
+        treated = TreatedData(dc, navigation_mask, signal_mask,
+                              default_max_chunk_size)
         # Centering
         if center is True:
-            self.energy_center()
+            messages.information("Centering the data")
+            treated.center()
         # Variance normalization
         if variance2one is True:
-            self.variance2one()
-        # Transform the data in a line spectrum
-        self._unfolded4pca = self.unfold_if_multidim()
+            messages.information("Normalizing the variance")
+            treated.variance2one()
         # Normalize the poissonian noise
-        # Note that this function can change the masks
+        # Note that this can change the masks
         if normalize_poissonian_noise is True:
-            navigation_mask, signal_mask = \
-                self.normalize_poissonian_noise(navigation_mask = navigation_mask,
-                                                signal_mask = signal_mask,
-                                                return_masks = True)
-
-        navigation_mask = self._correct_navigation_mask_when_unfolded(navigation_mask)
+            treated.normalize_poissonian_noise()
+        navigation_mask = treated.navigation_mask
 
         messages.information('Performing principal components analysis')
 
-        if on_peaks:
-            dc=self.peak_chars
-        else:
-            # The data must be transposed both for Images and Spectra
-            dc = self.data.T.squeeze()
         #set the output target (peak results or not?)
         target=self._get_target(on_peaks)
-        # Transform the None masks in slices to get the right behaviour
-        if navigation_mask is None:
-            navigation_mask = slice(None)
-        if signal_mask is None:
-            signal_mask = slice(None)
         if algorithm == 'mdp' or algorithm == 'NIPALS':
             if algorithm == 'mdp':
                 target.pca_node = mdp.nodes.PCANode(
@@ -166,31 +233,49 @@ class MVA():
             # Train the node
             print "\nPerforming the PCA node training"
             print "This include variance normalizing"
-            target.pca_node.train(
-                dc[signal_mask,:][:,navigation_mask])
+            target.pca_node.train(treated.to_array())
+            target.pca_node.stop_training()
             print "Performing PCA projection"
-            pc = target.pca_node.execute(dc[:,navigation_mask])
+            # Equivalent to executing the node on the treated data with all
+            # the rows but without forming a second copy of it
             pca_v = target.pca_node.v
+            pc = treated.dot(pca_v, all_rows = True) - \
+                np.dot(target.pca_node.avg, pca_v)
             pca_V = target.pca_node.d
             target.output_dimension = output_dimension
 
         elif algorithm == 'svd':
-            pca_v, pca_V = pca(dc[signal_mask,:][:,navigation_mask])
-            pc = np.dot(dc[:,navigation_mask], pca_v)
+            # The formulation (SVD or eigendecomposition of the smaller 
+            # Gram matrix) is chosen from the shape of the data
+            if self._is_lazy() and not on_peaks and \
+                _choose_formulation(treated.shape) == 'columns':
+                messages.warning(
+                "The data has many more channels than pixels and the svd "
+                "algorithm loads a float64 copy of it in memory. Use the "
+                "fast_svd or gram algorithms to decompose data that does "
+                "not fit in memory")
+            pca_v, pca_V = pca(treated, output_dimension = output_dimension)
+            pc = treated.dot(pca_v, all_rows = True)
         elif algorithm == 'fast_svd':
-            pca_v, pca_V = pca(dc[signal_mask,:][:,navigation_mask],
-            fast = True, output_dimension = output_dimension)
-            pc = np.dot(dc[:,navigation_mask], pca_v)
+            # The randomized SVD does not need to form the treated matrix
+            pca_v, pca_V = pca(treated,
+            fast = True, output_dimension = output_dimension, 
+            n_iter = n_iter, n_oversamples = n_oversamples)
+            pc = treated.dot(pca_v, all_rows = True)
+        elif algorithm == 'gram':
+            pca_v, pca_V, pc = gram_pca(treated, 
+                                        output_dimension = output_dimension)
 
         elif algorithm == 'mlpca' or algorithm == 'fast_mlpca':
             print "Performing the MLPCA training"
             if output_dimension is None:
                 messages.warning_exit(
                 "For MLPCA it is mandatory to define the output_dimension")
+            Y = treated.to_array()
             if var_array is None and var_func is None:
                 messages.information('No variance array provided.'
                 'Supposing poissonian data')
-                var_array = dc.squeeze()[signal_mask,:][:,navigation_mask]
+                var_array = Y
 
             if var_array is not None and var_func is not None:
                 messages.warning_exit(
@@ -198,11 +283,10 @@ class MVA():
                 "Please, define just one of them")
             if var_func is not None:
                 if hasattr(var_func, '__call__'):
-                    var_array = var_func(dc[signal_mask,...][:,navigation_mask])
+                    var_array = var_func(Y)
                 else:
                     try:
-                        var_array = np.polyval(polyfit,dc[signal_mask,
-                        navigation_mask])
+                        var_array = np.polyval(polyfit, Y)
                     except:
                         messages.warning_exit(
                         'var_func must be either a function or an array'
@@ -211,12 +295,12 @@ class MVA():
                 fast = False
             else:
                 fast = True
-            target.mlpca_output = mlpca(
-                dc.squeeze()[signal_mask,:][:,navigation_mask],
-                var_array.squeeze(), output_dimension, fast = fast)
+            target.mlpca_output = mlpca(Y, var_array.squeeze(),
+                                        output_dimension, fast = fast)
+            del Y
             U,S,V,Sobj, ErrFlag  = target.mlpca_output
             print "Performing PCA projection"
-            pc = np.dot(dc[:,navigation_mask], V)
+            pc = treated.dot(V, all_rows = True)
             pca_v = V
             pca_V = S ** 2
 
@@ -242,18 +326,11 @@ class MVA():
 
         # Rescale the results if the noise was normalized
         if normalize_poissonian_noise is True:
-            target.pc[signal_mask,:] *= self._root_bH
-            target.v *= self._root_aG.T
-            if isinstance(navigation_mask, slice):
-                navigation_mask = None
-            if isinstance(signal_mask, slice):
-                signal_mask = None
-
-        #undo any pre-treatments
-        self.undo_treatments(on_peaks)
+            target.pc /= treated.row_scale[:, np.newaxis]
+            target.v /= treated.column_scale[treated.columns][:, np.newaxis]
 
         # Set the pixels that were not processed to nan
-        if navigation_mask is not None or not isinstance(navigation_mask, slice):
+        if navigation_mask is not None:
             v = np.zeros((dc.shape[1], target.v.shape[1]),
                     dtype = target.v.dtype)
             v[navigation_mask == False,:] = np.nan
@@ -265,8 +342,10 @@ class MVA():
             self._unfolded4pca is False
 
     def independent_components_analysis(self, number_of_components = None,
-    algorithm = 'CuBICA', diff_order = 1, pc = None,
-    comp_list = None, mask = None, on_peaks=False, **kwds):
+    algorithm = 'FastICA', diff_order = 1, pc = None,
+    comp_list = None, mask = None, on_peaks=False, fun = 'logcosh', 
+    n_restarts = 1, parallel = None, max_iter = 200, tol = 1e-4, 
+    random_state = None):
         """Independent components analysis.
 
         Available algorithms: FastICA, JADE, CuBICA, and TDSEP
@@ -276,6 +355,8 @@ class MVA():
         number_of_components : int
             number of principal components to pass to the ICA algorithm
         algorithm : {FastICA, JADE, CuBICA, TDSEP}
+            FastICA is built-in, the other algorithms require the MDP 
+            toolkit.
         diff : bool
         diff_order : int
         pc : numpy array
@@ -286,19 +367,42 @@ class MVA():
         mask : numpy boolean array with the same dimension as the PC
             If not None, only the selected channels will be used by the
             algorithm.
+        fun : {'logcosh', 'exp', 'cube'}
+            The FastICA nonlinearity.
+        n_restarts : int
+            Number of FastICA runs from different random initializations.
+            The result with the largest negentropy is kept.
+        parallel : None or int
+            Number of threads that perform the FastICA runs.
+        max_iter : int
+            Maximum number of FastICA iterations.
+        tol : float
+            Tolerance of the FastICA convergence.
+        random_state : None or int
+            Seed of the FastICA random initializations.
+
+        See also
+        --------
+        hyperspy.learn.fastica.fastica
         """
         target=self._get_target(on_peaks)
 
         if hasattr(target, 'pc'):
+            if algorithm != 'FastICA' and mdp is None:
+                messages.warning_exit(
+                "The %s algorithm requires the MDP toolkit" % algorithm)
             if pc is None:
                 pc = target.pc
-            bool_index = np.zeros((pc.shape[0]), dtype = 'bool')
+            bool_index = np.zeros((pc.shape[1]), dtype = 'bool')
             if number_of_components is not None:
                 bool_index[:number_of_components] = True
             else:
-                if self.output_dimension is not None:
-                    number_of_components = self.output_dimension
+                if target.output_dimension is not None:
+                    number_of_components = target.output_dimension
                     bool_index[:number_of_components] = True
+                else:
+                    number_of_components = pc.shape[1]
+                    bool_index[:] = True
 
             if comp_list is not None:
                 for ipc in comp_list:
@@ -310,14 +414,21 @@ class MVA():
             if mask is not None:
                 pc = pc[mask, :]
 
+            # first centers and scales data
+            whitened = center_and_scale(pc)
+            invsqcovmat, pc = whitened['invsqcovmat'], whitened['data']
+            if algorithm == 'FastICA':
+                target.ica_node = None
+                w = fastica(pc, fun = fun, n_restarts = n_restarts, 
+                            parallel = parallel, max_iter = max_iter, 
+                            tol = tol, random_state = random_state)
             else:
-                # first centers and scales data
-                invsqcovmat, pc = center_and_scale(pc).itervalues()
-                exec('target.ica_node=mdp.nodes.%sNode(white_parm = \
-                {\'svd\' : True})' % algorithm)
+                target.ica_node = getattr(mdp.nodes, '%sNode' % algorithm)(
+                    white_parm = {'svd' : True})
                 target.ica_node.variance2oneed = True
                 target.ica_node.train(pc)
-                target.w = np.dot(target.ica_node.get_recmatrix(), invsqcovmat)
+                w = target.ica_node.get_recmatrix()
+            target.w = np.dot(w, invsqcovmat)
             self._ic_from_w(target)
             target.ica_scores=self._get_ica_scores(target)
             target.ica_algorithm = algorithm
@@ -326,6 +437,77 @@ class MVA():
             "You have to perform Principal Components Analysis before"
             sys.exit(0)
 
+    def nmf(self, n_components, solver = 'mu', loss = 'frobenius', 
+            navigation_mask = None, signal_mask = None, max_iter = 200, 
+            tol = 1e-4, random_state = None, on_peaks = False):
+        """Non-negative matrix factorization.
+
+        The results are stored in self.mva_results as nmf_factors, with a 
+        column per component, and nmf_scores, with a row per component.
+
+        Parameters
+        ----------
+        n_components : int
+        solver : {'mu', 'hals'}
+            Multiplicative updates or hierarchical alternating least 
+            squares.
+        loss : {'frobenius', 'kullback-leibler'}
+            The Kullback-Leibler divergence is the maximum likelihood loss
+            for Poissonian noise. It requires the 'mu' solver.
+        navigation_mask : boolean numpy array
+        signal_mask : boolean numpy array
+        max_iter : int
+        tol : float
+            The iterations stop when the relative decrease of the loss is 
+            smaller than tol.
+        random_state : None or int
+            Seed of the random initialization.
+
+        Notes
+        -----
+        Each iteration reads the data once by chunks of pixels, so data 
+        stored on disk can be factorized. The scores of the pixels that are
+        not in the navigation mask are set to nan. The factors of the 
+        channels that are not in the signal mask are fitted to the scores 
+        by least squares and clipped to non-negative values.
+
+        See also
+        --------
+        plot_maps, nmf_build_SI
+
+        """
+        dc = self._get_data_matrix(on_peaks)
+        navigation_mask = \
+            self._correct_navigation_mask_when_unfolded(navigation_mask)
+        from hyperspy.signal import default_max_chunk_size
+        treated = TreatedData(dc, navigation_mask, signal_mask,
+                              default_max_chunk_size)
+        W, H, value = nmf(treated, n_components, solver = solver, 
+                          loss = loss, max_iter = max_iter, tol = tol,
+                          random_state = random_state)
+        if signal_mask is not None:
+            factors = np.linalg.solve(np.dot(H, H.T), 
+                treated.dot(H.T, all_rows = True).T).T
+            factors = np.maximum(factors, 0)
+            factors[treated.rows] = W
+        else:
+            factors = W
+        if navigation_mask is not None:
+            scores = np.zeros((n_components, dc.shape[1]))
+            scores[:] = np.nan
+            scores[:, treated.columns] = H
+        else:
+            scores = H
+
+        target = self._get_target(on_peaks)
+        target.nmf_factors = factors
+        target.nmf_scores = scores
+        target.nmf_algorithm = solver
+        target.nmf_loss = loss
+        if self._unfolded4pca is True:
+            self.fold()
+            self._unfolded4pca = False
+
     def reverse_ic(self, ic_n, on_peaks = False):
         """Reverse the independent component
 
@@ -368,7 +550,7 @@ class MVA():
         return np.dot(Q,W)
 
     def _calculate_recmatrix(self, components = None, mva_type=None,
-                             on_peaks=False):
+                             on_peaks=False, lazy=False):
         """
         Rebuilds SIs from selected components
 
@@ -379,13 +561,21 @@ class MVA():
              if None, rebuilds SI from all components
              if int, rebuilds SI from components in range 0-given int
              if list of ints, rebuilds SI from only components in given list
-        mva_type : string, currently either 'pca' or 'ica'
+        mva_type : string, currently either 'pca', 'ica' or 'nmf'
              (not case sensitive)
+        lazy : bool
+             If True, the data of the returned signal is a LowRankData that
+             stores only the selected factors and scores and reconstructs 
+             the data on demand. It is not available with on_peaks.
 
         Returns
         -------
         Signal instance
         """
+        if lazy is True and on_peaks is True:
+            messages.warning_exit(
+            "The lazy reconstruction is not available for the peak "
+            "characteristics")
 
         target=self._get_target(on_peaks)
 
@@ -395,8 +585,12 @@ class MVA():
         elif mva_type.lower() == 'ica':
             factors = target.ic
             scores = self._get_ica_scores(target)
+        elif mva_type.lower() == 'nmf':
+            factors = target.nmf_factors
+            scores = target.nmf_scores
         if components is None:
-            a = np.atleast_3d(np.dot(factors,scores))
+            tfactors = factors
+            tscores = scores
             signal_name = 'rebuilt from %s with %i components' % (
             mva_type,factors.shape[1])
         elif hasattr(components, '__iter__'):
@@ -405,15 +599,26 @@ class MVA():
             for i in xrange(len(components)):
                 tfactors[:,i] = factors[:,components[i]]
                 tscores[i,:] = scores[components[i],:]
-            a = np.atleast_3d(np.dot(tfactors, tscores))
             signal_name = 'rebuilt from %s with components %s' % (
             mva_type,components)
         else:
-            a = np.atleast_3d(np.dot(factors[:,:components],
-                                     scores[:components,:]))
+            tfactors = factors[:,:components]
+            tscores = scores[:components,:]
             signal_name = 'rebuilt from %s with %i components' % (
             mva_type,components)
 
+        if lazy is True:
+            sc = self._deepcopy_with_new_data(LowRankData(tfactors, tscores,
+                self.data.shape,
+                [axis.index_in_array for axis in 
+                 self.axes_manager._non_slicing_axes],
+                [axis.index_in_array for axis in 
+                 self.axes_manager._slicing_axes]))
+            sc.name = signal_name
+            return sc
+
+        a = np.atleast_3d(np.dot(tfactors, tscores))
+
         self._unfolded4pca = self.unfold_if_multidim()
 
         sc = self.deepcopy()
@@ -431,7 +636,7 @@ class MVA():
             sc.fold()
         return sc
 
-    def pca_build_SI(self, components=None, on_peaks=False):
+    def pca_build_SI(self, components=None, on_peaks=False, lazy=False):
         """Return the spectrum generated with the selected number of principal
         components
 
@@ -441,18 +646,93 @@ class MVA():
              if None, rebuilds SI from all components
              if int, rebuilds SI from components in range 0-given int
              if list of ints, rebuilds SI from only components in given list
+        lazy : bool
+             If True, the factors and scores are stored instead of the 
+             rebuilt data, that is reconstructed on demand, e.g. the current
+             spectrum when plotting or chunk by chunk when saving. It is
+             not available with on_peaks.
 
         Returns
         -------
         Signal instance
         """
         rec=self._calculate_recmatrix(components=components, mva_type='pca',
-                                         on_peaks=on_peaks)
-        rec.residual=rec.copy()
-        rec.residual.data=self.data-rec.data
+                                         on_peaks=on_peaks, lazy=lazy)
+        if lazy is True:
+            rec.residual = self._deepcopy_with_new_data(
+                ResidualData(self.data, rec.data))
+        else:
+            rec.residual=rec.copy()
+            rec.residual.data=self.data-rec.data
         return rec
 
-    def ica_build_SI(self,components = None, on_peaks=False):
+    def get_residual_statistics(self, components = None, mva_type = 'pca',
+                                max_chunk_size = None):
+        """Computes statistics of the residual of the model rebuilt from 
+        the selected components without storing the residual or the rebuilt
+        data, that are computed chunk by chunk.
+
+        Parameters
+        ----------
+        components : None, int, or list of ints
+             See pca_build_SI.
+        mva_type : {'pca', 'ica', 'nmf'}
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
+
+        Returns
+        -------
+        Dictionary:
+            squared_norm : Signal with the navigation axes containing the
+                sum over the channels of the squared residual.
+            mean, std : numpy arrays with the shape of the signal space 
+                containing the mean and the standard deviation of the 
+                residual over the pixels.
+            total : the sum of the squared residual.
+        The pixels that were not used by the analysis, i.e. with nan 
+        scores, are ignored.
+        """
+        rec = self._calculate_recmatrix(components = components, 
+            mva_type = mva_type, lazy = True)
+        residual = ResidualData(self.data, rec.data)
+        navigation_axes = [axis.index_in_array for axis in 
+                           self.axes_manager._non_slicing_axes]
+        signal_axes = [axis.index_in_array for axis in 
+                       self.axes_manager._slicing_axes]
+        def reduce_axes(data, axes):
+            for axis in sorted(axes, reverse = True):
+                data = data.sum(axis)
+            return data
+        squared_norm = np.zeros(
+            [self.data.shape[i] for i in sorted(navigation_axes)])
+        signal_shape = [self.data.shape[i] for i in sorted(signal_axes)]
+        residual_sum = np.zeros(signal_shape)
+        squared_sum = np.zeros(signal_shape)
+        counts = np.zeros(signal_shape)
+        # The chunks split the navigation axis that comes first in the 
+        # array, that is the first axis of the maps
+        for chunk_slices in self._iterate_navigation_chunks(max_chunk_size):
+            chunk = residual[chunk_slices]
+            valid = np.isnan(chunk) == False
+            chunk[valid == False] = 0
+            map_slices = chunk_slices[min(navigation_axes):][:1] \
+                if navigation_axes else (Ellipsis,)
+            squared_norm[map_slices] = reduce_axes(chunk ** 2, signal_axes)
+            squared_norm[map_slices][
+                reduce_axes(valid, signal_axes) == 0] = np.nan
+            residual_sum += reduce_axes(chunk, navigation_axes)
+            squared_sum += reduce_axes(chunk ** 2, navigation_axes)
+            counts += reduce_axes(valid, navigation_axes)
+        counts[counts == 0] = np.nan
+        mean = residual_sum / counts
+        return {'squared_norm' : self._get_navigation_signal(squared_norm),
+                'mean' : mean,
+                'std' : np.sqrt(np.maximum(squared_sum / counts - mean ** 2, 
+                                           0)),
+                'total' : squared_sum.sum()}
+
+    def ica_build_SI(self,components = None, on_peaks=False, lazy=False):
         """Return the spectrum generated with the selected number of
         independent components
 
@@ -462,13 +742,42 @@ class MVA():
              if None, rebuilds SI from all components
              if int, rebuilds SI from components in range 0-given int
              if list of ints, rebuilds SI from only components in given list
+        lazy : bool
+             If True, the factors and scores are stored instead of the 
+             rebuilt data, that is reconstructed on demand, e.g. the current
+             spectrum when plotting or chunk by chunk when saving. It is
+             not available with on_peaks.
 
         Returns
         -------
         Signal instance
         """
         return self._calculate_recmatrix(components=components, mva_type='ica',
-                                         on_peaks=on_peaks)
+                                         on_peaks=on_peaks, lazy=lazy)
+
+    def nmf_build_SI(self, components = None, on_peaks = False, 
+                     lazy = False):
+        """Return the spectrum generated with the selected number of 
+        non-negative matrix factorization components
+
+        Parameters
+        ------------
+        components : None, int, or list of ints
+             if None, rebuilds SI from all components
+             if int, rebuilds SI from components in range 0-given int
+             if list of ints, rebuilds SI from only components in given list
+        lazy : bool
+             If True, the factors and scores are stored instead of the 
+             rebuilt data, that is reconstructed on demand, e.g. the current
+             spectrum when plotting or chunk by chunk when saving. It is
+             not available with on_peaks.
+
+        Returns
+        -------
+        Signal instance
+        """
+        return self._calculate_recmatrix(components=components, mva_type='nmf',
+                                         on_peaks=on_peaks, lazy=lazy)
 
     def energy_center(self):
         """Subtract the mean energy pixel by pixel"""
@@ -615,7 +924,7 @@ class MVA():
             if None, returns maps of all components.
             if int, returns maps of components with ids from 0 to given int.
             if list of ints, returns maps of components with ids in given list.
-        mva_type: string, currently either 'pca' or 'ica'
+        mva_type: string, currently either 'pca', 'ica' or 'nmf'
         scores: numpy array, the array of score maps
         factors: numpy array, the array of components, with each column as a component.
         cmap: matplotlib colormap instance
@@ -644,6 +953,12 @@ class MVA():
                 if no_nans:
                     print 'Removing NaNs for a visually prettier plot.'
                     scores = np.nan_to_num(scores) # remove ugly NaN pixels
+            elif mva_type.lower() == 'nmf':
+                scores = target.nmf_scores
+                factors = target.nmf_factors
+                if no_nans:
+                    print 'Removing NaNs for a visually prettier plot.'
+                    scores = np.nan_to_num(scores)
             else:
                 print "No scores provided and analysis type '%s' unrecognized. Cannot proceed."%mva_type
                 return
@@ -907,81 +1222,35 @@ class MVA():
         Scales the SI following Surf. Interface Anal. 2004; 36: 203–212 to
         "normalize" the poissonian data for PCA analysis
 
+        The data is scaled in place block by block. Note that 
+        principal_components_analysis does not use this method, it applies
+        the scaling on the fly without modifying the data.
+
         Parameters
         ----------
         navigation_mask : boolen numpy array
         signal_mask  : boolen numpy array
         """
-        messages.information(
-            "Scaling the data to normalize the (presumably) Poissonian noise")
-        # If energy axis is not first, it needs to be for MVA.
         refold = self.unfold_if_multidim()
-        dc = self.data.T.squeeze().copy()
+        if self.data.dtype.kind != 'f':
+            self.data = self.data.astype('float64')
         navigation_mask = \
             self._correct_navigation_mask_when_unfolded(navigation_mask)
-        if navigation_mask is None:
-            navigation_mask = slice(None)
-        if signal_mask is None:
-            signal_mask = slice(None)
-        # Rescale the data to gaussianize the poissonian noise
-        aG = dc[signal_mask,:][:,navigation_mask].sum(0).squeeze()
-        bH = dc[signal_mask,:][:,navigation_mask].sum(1).squeeze()
-        # Checks if any is negative
-        if (aG < 0).any() or (bH < 0).any():
-            messages.warning_exit(
-            "Data error: negative values\n"
-            "Are you sure that the data follow a poissonian distribution?")
-        # Update the spatial and energy masks so it does not include rows
-        # or colums that sum zero.
-        aG0 = (aG == 0)
-        bH0 = (bH == 0)
-        if aG0.any():
-            if isinstance(navigation_mask, slice):
-                # Convert the slice into a mask before setting its values
-                navigation_mask = np.ones((self.data.shape[1]),dtype = 'bool')
-            # Set colums summing zero as masked
-            navigation_mask[aG0] = False
-            aG = aG[aG0 == False]
-        if bH0.any():
-            if isinstance(signal_mask, slice):
-                # Convert the slice into a mask before setting its values
-                signal_mask = np.ones((self.data.shape[0]), dtype = 'bool')
-            # Set rows summing zero as masked
-            signal_mask[bH0] = False
-            bH = bH[bH0 == False]
-        self._root_aG = np.sqrt(aG)[np.newaxis,:]
-        self._root_bH = np.sqrt(bH)[:, np.newaxis]
-        temp = (dc[signal_mask,:][:,navigation_mask] /
-                (self._root_aG * self._root_bH))
-        if  isinstance(signal_mask,slice) or isinstance(navigation_mask,slice):
-            dc[signal_mask,navigation_mask] = temp
-        else:
-            mask3D = signal_mask[:, np.newaxis] * \
-                navigation_mask[np.newaxis, :]
-            dc[mask3D] = temp.ravel()
-        # TODO - dc was never modifying self.data - was normalization ever
-        # really getting applied?  Comment next lines as necessary.
-        self.data = dc.T.copy()
-        # end normalization write to self.data.
+        from hyperspy.signal import default_max_chunk_size
+        treated = TreatedData(self.data.T.squeeze(), navigation_mask,
+                              signal_mask, default_max_chunk_size)
+        treated.normalize_poissonian_noise()
+        self._root_aG = treated.root_aG[np.newaxis,:]
+        self._root_bH = treated.root_bH[:, np.newaxis]
+        # The blocks are computed from the unscaled data before writing them
+        for j0, j1, block in treated.iterate_blocks():
+            treated.X[np.ix_(treated.rows, treated.columns[j0:j1])] = block
+        self._clear_cache()
         if refold is True:
             print "Automatically refolding the SI after scaling"
             self.fold()
         if return_masks is True:
-            if isinstance(navigation_mask, slice):
-                navigation_mask = None
-            if isinstance(signal_mask, slice):
-                signal_mask = None
-            return navigation_mask, signal_mask
-
-    def undo_treatments(self, on_peaks=False):
-        """Undo normalize_poissonian_noise"""
-        print "Undoing data pre-treatments"
-        if on_peaks:
-            self.peak_chars=self._data_before_treatments
-            del self._data_before_treatments
-        else:
-            self.data=self._data_before_treatments
-            del self._data_before_treatments
+            return treated.navigation_mask, treated.signal_mask
 
     def peak_pca(self):
         self.principal_components_analysis(on_peaks=True)
@@ -1004,6 +1273,10 @@ class MVA_Results():
         self.ica_node=None
         # Demixing matrix
         self.w = None
+        self.nmf_factors = None
+        self.nmf_scores = None
+        self.nmf_algorithm = None
+        self.nmf_loss = None
 
 
     def save(self, filename):
@@ -1017,7 +1290,9 @@ class MVA_Results():
         pca_algorithm = self.pca_algorithm, centered = self.centered,
         output_dimension = self.output_dimension, variance2one = self.variance2one,
         poissonian_noise_normalized = self.poissonian_noise_normalized,
-        w = self.w, ica_algorithm = self.ica_algorithm)
+        w = self.w, ica_algorithm = self.ica_algorithm,
+        nmf_factors = self.nmf_factors, nmf_scores = self.nmf_scores,
+        nmf_algorithm = self.nmf_algorithm, nmf_loss = self.nmf_loss)
 
     def load(self, filename):
         """Load the result of the PCA analysis
@@ -1061,6 +1336,7 @@ class MVA_Results():
         print "Variance normalized : %s" % self.variance2one
         print "Output dimension : %s" % self.output_dimension
         print "ICA algorithm : %s" % self.ica_algorithm
+        print "NMF algorithm : %s" % self.nmf_algorithm
 
     def crop_v(self, n):
         """
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from hyperspy import messages
+from hyperspy.misc import progressbar
+from hyperspy.learn.data_operator import TreatedData
+
+eps = np.finfo('float64').eps
+
+def _frobenius_iteration(X, W, H, solver):
+    """Updates H block by block and then W. Returns the squared Frobenius
+    norm of the residual of the updated H and the previous W"""
+    k = W.shape[1]
+    WtW = np.dot(W.T, W)
+    XHt = np.zeros(W.shape)
+    HHt = np.zeros((k, k))
+    XX = 0.
+    for j0, j1, block in X.iterate_blocks():
+        # A view, so H is updated in place
+        h = H[:, j0:j1]
+        WtX = np.dot(W.T, block)
+        if solver == 'mu':
+            h *= WtX / np.maximum(np.dot(WtW, h), eps)
+        else:
+            for r in xrange(k):
+                h[r] = np.maximum(
+                    h[r] + (WtX[r] - np.dot(WtW[r], h)) / WtW[r, r], eps)
+        XHt += np.dot(block, h.T)
+        HHt += np.dot(h, h.T)
+        XX += (block ** 2).sum()
+    value = XX - 2 * (W * XHt).sum() + (WtW * HHt).sum()
+    if solver == 'mu':
+        W *= XHt / np.maximum(np.dot(W, HHt), eps)
+    else:
+        for r in xrange(k):
+            W[:, r] = np.maximum(W[:, r] +
+                (XHt[:, r] - np.dot(W, HHt[:, r])) / HHt[r, r], eps)
+        # The components are normalized to keep the HALS updates well
+        # scaled
+        norms = np.sqrt((W ** 2).sum(0))
+        W /= norms
+        H *= norms[:, np.newaxis]
+    return value
+
+def _kullback_leibler_iteration(X, W, H):
+    """Updates H block by block and then W with the multiplicative rules.
+    Returns the generalized Kullback-Leibler divergence of the updated H
+    and the previous W"""
+    W_sum = np.maximum(W.sum(0), eps)[:, np.newaxis]
+    ratio_Ht = np.zeros(W.shape)
+    H_sum = np.zeros(W.shape[1])
+    value = 0.
+    for j0, j1, block in X.iterate_blocks():
+        h = H[:, j0:j1]
+        h *= np.dot(W.T, block / np.maximum(np.dot(W, h), eps)) / W_sum
+        WH = np.maximum(np.dot(W, h), eps)
+        ratio = block / WH
+        ratio_Ht += np.dot(ratio, h.T)
+        H_sum += h.sum(1)
+        nonzero = block > 0
+        value += (block[nonzero] * np.log(ratio[nonzero])).sum() - \
+            block.sum() + WH.sum()
+    W *= ratio_Ht / np.maximum(H_sum, eps)
+    return value
+
+def nmf(X, n_components, solver = 'mu', loss = 'frobenius', max_iter = 200,
+        tol = 1e-4, random_state = None):
+    """Non-negative matrix factorization X ~ W * H.
+
+    Each iteration makes a single pass over the blocks of columns of X:
+    the columns of H of each block are updated and the products needed to
+    update W are accumulated, so X is never formed if it is a data
+    operator.
+
+    Parameters
+    ----------
+    X : numpy array or TreatedData
+        MxN non-negative matrix, with a row per channel and a column per
+        pixel.
+    n_components : int
+    solver : {'mu', 'hals'}
+        'mu' for the multiplicative updates of Lee and Seung, Nature 401
+        (1999) 788-791, 'hals' for the hierarchical alternating least
+        squares of Cichocki and Phan, IEICE Trans. Fundamentals E92-A
+        (2009) 708-721.
+    loss : {'frobenius', 'kullback-leibler'}
+        The Kullback-Leibler divergence is the maximum likelihood loss for
+        Poissonian noise. It is only available with the 'mu' solver.
+    max_iter : int
+    tol : float
+        The iterations stop when the relative decrease of the loss is
+        smaller than tol.
+    random_state : None or int
+        Seed of the random initialization.
+
+    Returns
+    -------
+    W : MxK array of factors
+    H : KxN array of scores
+    value : the loss at the last iteration
+    """
+    if isinstance(X, np.ndarray):
+        X = TreatedData(X)
+    if solver not in ('mu', 'hals'):
+        messages.warning_exit("Unknown NMF solver: %s" % solver)
+    if loss not in ('frobenius', 'kullback-leibler'):
+        messages.warning_exit("Unknown NMF loss: %s" % loss)
+    if solver == 'hals' and loss != 'frobenius':
+        messages.warning_exit(
+            "The HALS solver only minimizes the Frobenius norm")
+    m, n = X.shape
+    total = 0.
+    for j0, j1, block in X.iterate_blocks():
+        if block.min() < 0:
+            messages.warning_exit(
+                "The NMF requires non-negative data")
+        total += block.sum()
+    random = np.random.RandomState(random_state)
+    scale = np.sqrt(total / (m * n) / n_components)
+    W = scale * random.rand(m, n_components)
+    H = scale * random.rand(n_components, n)
+    previous = None
+    print "Performing NMF with the %s solver" % solver
+    pbar = progressbar.progressbar(maxval = max_iter)
+    for i in xrange(max_iter):
+        if loss == 'frobenius':
+            value = _frobenius_iteration(X, W, H, solver)
+        else:
+            value = _kullback_leibler_iteration(X, W, H)
+        pbar.update(i + 1)
+        if previous is not None and \
+            abs(previous - value) <= tol * abs(previous):
+            break
+        previous = value
+    pbar.finish()
+    return W, H, value
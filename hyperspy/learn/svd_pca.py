@@ -17,32 +17,236 @@
 # along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import numpy as np
 import scipy.linalg
-try:
-    from scikits.learn.utils.extmath import fast_svd
-    sklearn = True
-except:
-    sklearn = False
+import scipy.sparse.linalg
 
-def pca(data, fast = False, output_dimension = None):
+from hyperspy import messages
+
+def _dot(A, x):
+    """Returns A * x for an array or a data operator, e.g. TreatedData"""
+    if isinstance(A, np.ndarray):
+        return np.dot(A, x)
+    return A.dot(x)
+
+def _transpose_dot(A, x):
+    """Returns A.T * x for an array or a data operator, e.g. TreatedData"""
+    if isinstance(A, np.ndarray):
+        return np.dot(A.T, x)
+    return A.transpose_dot(x)
+
+def randomized_svd(A, n_components, n_oversamples = 10, n_iter = 2,
+                   random_state = None):
+    """Computes a truncated SVD with a randomized range finder.
+
+    Follows Halko, Martinsson and Tropp, SIAM Review 53 (2011) 217-288. 
+    The matrix is only accessed through products by blocks of vectors, so 
+    it can be a data operator that is never formed, e.g. TreatedData.
+
+    Parameters
+    ----------
+    A : numpy array or data operator
+        A data operator must have a shape attribute and the dot and 
+        transpose_dot methods.
+    n_components : int
+        The rank of the approximation.
+    n_oversamples : int
+        Number of additional random vectors used to sample the range of A.
+    n_iter : int
+        Number of power iterations. Increasing it improves the accuracy 
+        when the singular values decay slowly, at the cost of two products
+        by A per iteration.
+    random_state : None or int
+        Seed of the random number generator.
+
+    Returns
+    -------
+    U, S, Vh as scipy.linalg.svd, truncated to n_components.
+    """
+    m, n = A.shape
+    n_random = min(n_components + n_oversamples, m, n)
+    random = np.random.RandomState(random_state)
+    Q = _dot(A, random.normal(size = (n, n_random)))
+    Q = scipy.linalg.qr(Q, mode = 'economic')[0]
+    for i in xrange(n_iter):
+        # The orthonormalization at each step avoids the loss of the small 
+        # singular values by round off errors
+        Z = scipy.linalg.qr(_transpose_dot(A, Q), mode = 'economic')[0]
+        Q = scipy.linalg.qr(_dot(A, Z), mode = 'economic')[0]
+    B = _transpose_dot(A, Q).T
+    Uh, S, Vh = scipy.linalg.svd(B, full_matrices = False)
+    U = np.dot(Q, Uh)
+    return U[:, :n_components], S[:n_components], Vh[:n_components]
+
+def _gram_eigh(G, n_components = None):
+    """Returns the largest eigenvalues, in decreasing order, and the 
+    eigenvectors of a symmetric positive semidefinite matrix.
+
+    If only a few components are requested, i.e. less than a tenth of the
+    size of G, they are computed with the Lanczos method of ARPACK and G 
+    can be a scipy.sparse.linalg.LinearOperator. Otherwise G is fully 
+    diagonalized. The eigenvalues that are zero to machine precision are 
+    set to zero but their components are kept, so that n_components (or 
+    all the) components are always returned.
+    """
+    size = G.shape[0]
+    if n_components is not None and n_components < size // 10:
+        V, U = scipy.sparse.linalg.eigsh(G, k = n_components, which = 'LA')
+    else:
+        V, U = scipy.linalg.eigh(G)
+    order = np.argsort(V)[::-1]
+    V, U = V[order], U[:, order]
+    V[V <= V[0] * size * np.finfo(V.dtype).eps] = 0
+    if n_components is not None:
+        V, U = V[:n_components], U[:, :n_components]
+    return V, U
+
+def _inverse_sqrt(V):
+    """Returns 1 / sqrt(V), zero where V is zero"""
+    inverse = np.zeros(V.shape)
+    inverse[V > 0] = 1 / np.sqrt(V[V > 0])
+    return inverse
+
+def _product_operator(A, transpose_first):
+    """Returns a LinearOperator that computes A * A.T * x if 
+    transpose_first is True or A.T * A * x otherwise, without forming the 
+    product"""
+    size = A.shape[0] if transpose_first is True else A.shape[1]
+    if transpose_first is True:
+        matvec = lambda x: np.dot(A, np.dot(A.T, x))
+    else:
+        matvec = lambda x: np.dot(A.T, np.dot(A, x))
+    return scipy.sparse.linalg.LinearOperator((size, size), matvec = matvec,
+                                              dtype = 'float64')
+
+def _choose_formulation(shape, ratio = 4):
+    """Returns 'rows' if the matrix has at least ratio times more columns 
+    than rows, 'columns' if it has at least ratio times more rows than 
+    columns and 'svd' otherwise"""
+    m, n = shape
+    if n >= ratio * m:
+        return 'rows'
+    elif m >= ratio * n:
+        return 'columns'
+    else:
+        return 'svd'
+
+def gram_pca(data, output_dimension = None):
+    """Perform PCA by the eigendecomposition of the Gram matrix of the 
+    rows, i.e. the (channels x channels) matrix data * data.T.
+
+    For a data operator, e.g. TreatedData, the Gram matrix is accumulated 
+    in a single pass over blocks of columns, and a second pass projects the
+    data on the eigenvectors, so the data matrix is never formed. This is 
+    efficient when there are many more columns (pixels) than rows 
+    (channels). For an array, if only a few components are requested the 
+    Gram matrix is not formed either (see _gram_eigh). The scores of the 
+    components whose variance is zero to machine precision are set to 
+    zero, so that the number of components is the same as with the SVD.
+
+    Parameters
+    ----------
+    data : numpy array or data operator
+        MxN matrix of input data. A data operator must have the gram and 
+        transpose_dot methods.
+    output_dimension : None or int
+        The number of components to compute.
+
+    Returns
+    -------
+    v - NxK matrix of normalized scores
+    V - K vector of variances
+    pc - MxK matrix of the data projected on v. For a data operator the 
+         rows that are not in its signal mask are included.
+    """
+    V, U, C = _rows_gram_eigh(data, output_dimension)
+    inverse_S = _inverse_sqrt(V)
+    v = _transpose_dot(data, U) * inverse_S
+    if C is None:
+        pc = np.dot(data, v)
+    else:
+        pc = np.dot(C, U) * inverse_S
+    return v, V, pc
+
+def _rows_gram_eigh(data, output_dimension):
+    """Returns the eigenvalues and eigenvectors of the Gram matrix of the 
+    rows of data and, for a data operator, the Gram matrix of all its rows 
+    by the selected ones (None for an array). See gram_pca."""
+    print "Performing PCA with a Gram matrix based algorithm"
+    if isinstance(data, np.ndarray):
+        C = None
+        if output_dimension is not None and \
+            output_dimension < data.shape[0] // 10:
+            G = _product_operator(data, transpose_first = True)
+        else:
+            G = np.dot(data, data.T)
+    else:
+        C = data.gram(all_rows = True)
+        G = C[data.rows]
+    V, U = _gram_eigh(G, output_dimension)
+    return V, U, C
+
+def pca(data, fast = False, output_dimension = None, n_iter = 2, 
+        n_oversamples = 10):
     """Perform PCA using SVD.
-    data - MxN matrix of input data
+    data - MxN matrix of input data or data operator (see randomized_svd)
     (M dimensions, N trials)
+    fast - if True, a randomized SVD of rank output_dimension is computed
+    output_dimension - number of components to compute. If None all are 
+    computed.
+    n_iter - number of power iterations of the randomized SVD
+    n_oversamples - number of additional random vectors of the randomized
+    SVD
     signals - MxN matrix of projected data
     PC - each column is a PC
     V - Mx1 matrix of variances
+
+    If fast is False the cheaper formulation is chosen from the shape of 
+    the matrix: when it has many more columns than rows (or vice versa) the
+    PCA is computed from the eigendecomposition of the smaller Gram matrix,
+    data * data.T (or data.T * data), instead of the SVD of data. When only
+    a few components are requested they are computed with ARPACK. A data 
+    operator is only formed as an array when it has many more rows than 
+    columns, otherwise the Gram matrix of its rows is accumulated.
     """
-    print "Performing PCA with a SVD based algorithm"
-    N, M = data.shape
-    Y = data
-    if fast is True and sklearn is True:
+    if fast is True:
+        print "Performing PCA with a SVD based algorithm"
         if output_dimension is None:
             messages.warning_exit('When using fast_svd it is necessary to '
                                   'define the output_dimension')
-        u, S, PC = fast_svd(Y, output_dimension, q = 3)
+        u, S, PC = randomized_svd(data, output_dimension, 
+                                  n_oversamples = n_oversamples, 
+                                  n_iter = n_iter)
+        V = S ** 2
+        v = PC.T
+        return v, V
+    formulation = _choose_formulation(data.shape)
+    if not isinstance(data, np.ndarray):
+        if formulation == 'columns':
+            # The Gram matrix of the columns needs the data as an array
+            data = data.to_array()
+        else:
+            # The SVD of a data operator would need it as an array too, the
+            # same components are computed from the Gram matrix of its rows
+            formulation = 'rows'
+            if output_dimension is None:
+                output_dimension = min(data.shape)
+    if formulation == 'rows':
+        # As gram_pca but without projecting the data on the scores
+        V, U = _rows_gram_eigh(data, output_dimension)[:2]
+        v = _transpose_dot(data, U) * _inverse_sqrt(V)
+        return v, V
+    if formulation == 'columns':
+        print "Performing PCA with a Gram matrix based algorithm"
+        if output_dimension is not None and \
+            output_dimension < data.shape[1] // 10:
+            G = _product_operator(data, transpose_first = False)
+        else:
+            G = np.dot(data.T, data)
+        V, v = _gram_eigh(G, output_dimension)
     else:
-        u, S, PC = scipy.linalg.svd(Y, full_matrices = False)
-    
-    v = PC.T
-    V = S ** 2
-    return v,V
+        print "Performing PCA with a SVD based algorithm"
+        u, S, PC = scipy.linalg.svd(data, full_matrices = False)
+        v = PC[:output_dimension].T
+        V = S[:output_dimension] ** 2
+    return v, V
@@ -20,6 +20,7 @@
 import  math
 import glob
 import os
+import tempfile
 from StringIO import StringIO
 try:
     from collections import OrderedDict
@@ -35,6 +36,8 @@ import scipy.interpolate
 import scipy.signal
 import scipy.ndimage
 
+from hyperspy import messages
+
 def import_rpy():
     try:
         import rpy
@@ -101,7 +104,43 @@ def generate_axis(origin,step,N,index=0):
     return np.linspace(origin-index*step, origin+step*(N-1-index), N)    
 
 
-def two_area_powerlaw_estimation(SI, E1, E2, only_current_spectrum = False):
+def two_area_indexes(axis, E1, E2):
+    """Returns the indexes that limit the two areas of the two area method
+    
+    Parameters
+    ----------
+    axis : DataAxis instance
+    E1, E2 : float
+        The limits of the background window in the axis units
+        
+    Returns
+    -------
+    i1, i2, i3 : int
+        The first area is i1:i3 and the second one i3:i2
+    """
+    i1 = axis.value2index(E1)
+    if (axis.value2index(E2) - i1) % 2 == 0:
+        i2 = axis.value2index(E2)
+    else :
+        i2 = axis.value2index(E2) - 1
+    i3 = (i2+i1) / 2
+    return i1, i2, i3
+
+def powerlaw_from_areas(I1, I2, E1, E2, E3):
+    """Returns the parameters of the power law A*E**-r that has the areas
+    I1 in the interval E1-E3 and I2 in the interval E3-E2
+    
+    Returns
+    -------
+    r, A
+    """
+    r = 2*np.log(I1 / I2) / math.log(E2/E1)
+    k = 1 - r
+    A = k * I2 / (E2**k - E3**k)
+    return r, A
+
+def two_area_powerlaw_estimation(SI, E1, E2, only_current_spectrum = False,
+                                 use_cumsum = False):
     """Estimate a power law fit by the two area method
     
     Parameters
@@ -111,6 +150,14 @@ def two_area_powerlaw_estimation(SI, E1, E2, only_current_spectrum = False):
         first point in energy units
     E2 : float
         second point in energy units
+    only_current_spectrum : bool
+        If True, the estimation is only performed for the current spectrum
+    use_cumsum : bool
+        If True, the areas are computed from the cumulative sum cached by
+        the Spectrum instance. Its computation requires a full pass over the 
+        data, but afterwards the estimation in any other window only costs
+        two subtractions per pixel, what speeds up scans of the background 
+        window.
     
     Returns
     -------
@@ -118,19 +165,16 @@ def two_area_powerlaw_estimation(SI, E1, E2, only_current_spectrum = False):
     keys: r, A
     """
     axis = SI.axes_manager._slicing_axes[0]
-    energy2index = axis.value2index
-    i1 = energy2index(E1)
-    if (energy2index(E2) - i1) % 2 == 0:
-        i2 = energy2index(E2)
-    else :
-        i2 = energy2index(E2) - 1
+    i1, i2, i3 = two_area_indexes(axis, E1, E2)
     E2 = axis.axis[i2]
-    i3 = (i2+i1) / 2
     E3 = axis.axis[i3]
     if only_current_spectrum is True:
         dc = SI()
-        I1 = SI.energyscale * np.sum(dc[i1:i3], 0)
-        I2 = SI.energyscale * np.sum(dc[i3:i2],0)
+        I1 = axis.scale * np.sum(dc[i1:i3], 0)
+        I2 = axis.scale * np.sum(dc[i3:i2],0)
+    elif use_cumsum is True:
+        I1 = axis.scale * SI.integrate_in_index_range(i1, i3)
+        I2 = axis.scale * SI.integrate_in_index_range(i3, i2)
     else:
         dc = SI.data
         gi = [slice(None),] * len(dc.shape)
@@ -139,9 +183,7 @@ def two_area_powerlaw_estimation(SI, E1, E2, only_current_spectrum = False):
         gi[axis.index_in_array] = slice(i3,i2)
         I2 = axis.scale * np.sum(dc[gi],axis.index_in_array)
 
-    r = 2*np.log(I1 / I2) / math.log(E2/E1)
-    k = 1 - r
-    A = k * I2 / (E2**k - E3**k)
+    r, A = powerlaw_from_areas(I1, I2, E1, E2, E3)
     return {'r': r, 'A': A}
     
 def gaussian_estimation(SI, E1, E2):
@@ -299,34 +341,100 @@ higher_than = None):
     if fold_back_clean is True:
         clean_signal.fold()
         
-def rebin(a, new_shape):
+def rebin(a, new_shape, method = 'sum', dtype = None):
     """Rebin SI
     
-    rebin ndarray data into a smaller ndarray of the same rank whose dimensions
-    are factors of the original dimensions. eg. An array with 6 columns and 4 
-    rows can be reduced to have 6,3,2 or 1 columns and 4,2 or 1 rows.
+    rebin ndarray data into a smaller ndarray of the same rank. If the new 
+    dimensions are factors of the original dimensions the data is simply 
+    reshaped and summed, e.g. an array with 6 columns and 4 rows can be 
+    reduced to have 6,3,2 or 1 columns and 4,2 or 1 rows. Otherwise the 
+    pixels that overlap two bins contribute to each bin with a weight 
+    proportional to the overlapping fraction of the pixel.
     example usages:
-    >>> a=rand(6,4); b=rebin(a,3,2)
-    >>> a=rand(6); b=rebin(a,2)
-    Adapted from scipy cookbook
+    >>> a=rand(6,4); b=rebin(a,(3,2))
+    >>> a=rand(6); b=rebin(a,(4,))
     
     Parameters
     ----------
     a : numpy array
     new_shape : tuple
         shape after binning
+    method : {'sum', 'mean'}
+    dtype : None or numpy dtype
+        The type of the accumulator. If None and the factors are integers 
+        the numpy defaults are used, i.e. floating point data keeps its 
+        type. For non integer factors the data type is kept if it is 
+        floating point and float64 is used otherwise, and a non floating 
+        point dtype is rejected.
         
     Returns
     -------
     numpy array
     """
+    if method not in ('sum', 'mean'):
+        messages.warning_exit("Unknown rebin method: %s" % method)
     shape = a.shape
-    lenShape = len(shape)
-    factor = np.asarray(shape)/np.asarray(new_shape)
-    evList = ['a.reshape('] + \
-             ['new_shape[%d],factor[%d],'%(i,i) for i in xrange(lenShape)] + \
-             [')'] + ['.sum(%d)'%(i+1) for i in xrange(lenShape)]
-    return eval(''.join(evList))
+    new_shape = tuple(new_shape)
+    factors = np.array(shape, dtype = 'float64') / np.array(new_shape)
+    if np.all(factors == np.round(factors)):
+        factors = factors.astype('int')
+        reshaped_shape = []
+        for size, factor in zip(new_shape, factors):
+            reshaped_shape.extend((size, factor))
+        result = a.reshape(reshaped_shape)
+        for i in xrange(len(shape) - 1, -1, -1):
+            result = result.sum(2 * i + 1, dtype = dtype)
+    else:
+        if dtype is None:
+            dtype = a.dtype if a.dtype.kind in ('f', 'c') else np.float64
+        result = a
+        for axis, (size, new_size) in enumerate(zip(shape, new_shape)):
+            if size != new_size:
+                result = rebin_along_axis(result, axis, 
+                    np.arange(new_size + 1) * (size / float(new_size)), 
+                    dtype)
+    if method == 'mean':
+        result = result / float(np.prod(factors))
+    return result
+
+def rebin_along_axis(a, axis, edges, dtype = None):
+    """Integrates the data along the given axis between consecutive edges,
+    considering each pixel as a bin of width 1.
+    
+    Parameters
+    ----------
+    a : numpy array
+    axis : int
+    edges : numpy array
+        The limits of the new bins in pixel units, e.g. 
+        numpy.arange(new_size + 1) * factor. They are clipped to the array 
+        limits.
+    dtype : None or numpy dtype
+        The type of the accumulator, float64 if None. It must be a 
+        floating point type to hold the fractions of the pixels.
+        
+    Returns
+    -------
+    numpy array with len(edges) - 1 elements in the given axis
+    """
+    if dtype is None:
+        dtype = np.float64
+    if np.dtype(dtype).kind not in ('f', 'c'):
+        messages.warning_exit(
+        "Rebinning with non-integer factors requires a floating point "
+        "dtype")
+    size = a.shape[axis]
+    a = np.rollaxis(a, axis, 0)
+    edges = np.clip(np.asarray(edges, dtype = 'float64'), 0, size)
+    # The integral up to each edge is the cumulative sum of the complete 
+    # pixels plus the fraction of the next pixel
+    index = np.floor(edges).astype('int')
+    fraction = (edges - index).astype(dtype).reshape(
+        (-1,) + (1,) * (len(a.shape) - 1))
+    cumsum = np.zeros((size + 1,) + a.shape[1:], dtype = dtype)
+    np.cumsum(a, axis = 0, dtype = dtype, out = cumsum[1:])
+    integral = cumsum[index] + fraction * a[np.minimum(index, size - 1)]
+    return np.rollaxis(integral[1:] - integral[:-1], 0, axis + 1)
     
 def estimate_drift(im1,im2):
     """Estimate the drift  between two images by cross-correlation
@@ -1041,22 +1149,62 @@ def ratio(edge_A, edge_B):
     1.96*ratio_std )
     return ratio, ratio_std
     
-def iterate_axis(data, axis = -1):
-        # We make a copy to guarantee that the data in contiguous, otherwise
-        # it will not return a view of the data
-#        data = data.copy()
-        if axis < 0:
-            axis = len(data.shape) + axis
-        unfolded_axis = axis - 1
-        new_shape = [1] * len(data.shape)
-        new_shape[axis] = data.shape[axis]
-        new_shape[unfolded_axis] = -1
-        data = data.reshape(new_shape)
-        for i in xrange(data.shape[unfolded_axis]):
-            getitem = [0] * len(data.shape)
-            getitem[axis] = slice(None)
-            getitem[unfolded_axis] = i
-            yield(data[getitem])
+def get_temporary_memmap(shape, dtype):
+    """Returns a writable numpy memmap of the given shape and dtype stored 
+    in an anonymous temporary file that is deleted when the array is 
+    released. Useful to store results that may not fit in memory.
+    """
+    return np.memmap(tempfile.TemporaryFile(prefix = 'hyperspy-'), 
+                     dtype = dtype, mode = 'w+', shape = tuple(shape))
+
+def iterate_axis(data, axis = -1, block_size = None):
+    """Iterates over the one dimensional slices of an array along the given
+    axis, in the same order as Signal.iterate_axis.
+    
+    The yielded slices are views of the data, so their modifications are 
+    applied to it. The blocks are also views unless the strides of the data
+    do not allow it, in which case each block is a copy that is written 
+    back to the data when the next one is requested or when the generator 
+    is closed.
+    
+    Parameters
+    ----------
+    data : numpy array
+    axis : int
+    block_size : None or int
+        If not None, the slices are yielded in two dimensional blocks of 
+        block_size slices.
+    """
+    if axis < 0:
+        axis = len(data.shape) + axis
+    data = np.rollaxis(data, axis, len(data.shape))
+    unfolded = data.view()
+    try:
+        # Setting the shape raises an error instead of copying
+        unfolded.shape = (-1, data.shape[-1])
+    except AttributeError:
+        unfolded = None
+    if unfolded is not None:
+        if block_size is None:
+            for i in xrange(unfolded.shape[0]):
+                yield unfolded[i]
+        else:
+            for i in xrange(0, unfolded.shape[0], block_size):
+                yield unfolded[i:i + block_size]
+    elif block_size is None:
+        for index in np.ndindex(*data.shape[:-1]):
+            yield data[index]
+    else:
+        n = int(np.prod(data.shape[:-1]))
+        for i in xrange(0, n, block_size):
+            index = np.unravel_index(np.arange(i, min(i + block_size, n)), 
+                                     data.shape[:-1])
+            block = data[index]
+            try:
+                yield block
+            finally:
+                if data.flags['WRITEABLE']:
+                    data[index] = block
             
 def interpolate_1D(number_of_interpolation_points, data):
     ip = number_of_interpolation_points
@@ -1065,3 +1213,50 @@ def interpolate_1D(number_of_interpolation_points, data):
     new_ax = np.linspace(0, 100, ch * ip - (ip-1))
     interpolator = sp.interpolate.interp1d(old_ax,data)
     return interpolator(new_ax)
+
+def shift_1D(data, shifts, kind = 'linear'):
+    """Shifts the signals stored along the last axis of an array.
+    
+    All the signals are shifted at once with vectorized index arithmetic
+    or, for kind = 'fourier', by a phase shift of their Fourier transform.
+    
+    Parameters
+    ----------
+    data : numpy array
+    shifts : numpy array or float
+        The shift of each signal in channels, of shape data.shape[:-1]. A 
+        positive shift moves the signal towards higher channels.
+    kind : {'linear', 'nearest', 'fourier'}
+        'linear' and 'nearest' interpolate the data and fill the channels 
+        that are out of the range of the original data with zeros. 
+        'fourier' is exact for band limited data, but the signal wraps 
+        around the edges.
+        
+    Returns
+    -------
+    A floating point array of the shape of data.
+    """
+    n = data.shape[-1]
+    shifts = np.asarray(shifts, dtype = 'float64')[..., np.newaxis]
+    if kind == 'fourier':
+        frequencies = np.arange(n // 2 + 1) / float(n)
+        return np.fft.irfft(np.fft.rfft(data) * 
+                            np.exp(-2j * np.pi * frequencies * shifts), n)
+    if kind not in ('linear', 'nearest'):
+        raise ValueError("Unknown kind of shift: %s" % kind)
+    flat = np.asarray(data).reshape((-1, n))
+    positions = (np.arange(n) - shifts) * np.ones(data.shape)
+    positions = positions.reshape((-1, n))
+    # Offsets of the signals in the flattened data
+    offsets = (np.arange(flat.shape[0]) * n)[:, np.newaxis]
+    flat = flat.ravel()
+    if kind == 'nearest' or n == 1:
+        indexes = np.floor(positions + 0.5).clip(0, n - 1).astype(int)
+        result = flat[indexes + offsets].astype('float64')
+    else:
+        indexes = np.floor(positions).clip(0, n - 2).astype(int)
+        weights = positions - indexes
+        indexes += offsets
+        result = flat[indexes] * (1 - weights) + flat[indexes + 1] * weights
+    result[(positions < 0) | (positions > n - 1)] = 0
+    return result.reshape(data.shape)
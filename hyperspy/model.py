@@ -18,7 +18,9 @@
 
 import copy
 import os
+import sys
 import tempfile
+import multiprocessing
 
 import numpy as np
 
@@ -30,6 +32,22 @@ from hyperspy.drawing.utils import on_window_close
 from hyperspy.misc import progressbar
 from hyperspy.signals.eels import EELSSpectrum
 
+# Model fitted by the worker processes of a parallel multifit. It is set
+# before the pool is created so that the forked workers inherit it instead
+# of having to pickle it.
+_multifit_worker_model = None
+
+def _multifit_worker(args):
+    """Fit the given navigation indexes with the inherited model and return
+    the resulting parameters maps values"""
+    indexes, charge_only_fixed, fit_kwargs = args
+    model = _multifit_worker_model
+    for index in indexes:
+        model.axes_manager.set_not_slicing_indexes(index)
+        model.charge(only_fixed = charge_only_fixed)
+        model.fit(**fit_kwargs)
+    return indexes, model._get_parameters_maps_at(indexes)
+
 class Model(list, Optimizers, Estimators):
     """Build and fit a model
     
@@ -523,7 +541,31 @@ class Model(list, Optimizers, Estimators):
                 
     def multifit(self, mask = None, fitter = "leastsq", 
                  charge_only_fixed = False, grad = False, autosave = False, 
-                 autosave_every = 10, **kwargs):
+                 autosave_every = 10, parallel = None, **kwargs):
+        """Fit the model to all the spectra of the SI
+        
+        Parameters
+        ----------
+        mask : None or boolean numpy array
+            If not None, the pixels set to True are not fitted. It must have 
+            the navigation shape.
+        fitter : str
+            see fit
+        charge_only_fixed : bool
+            If True, only the fixed parameters are charged from the 
+            parameters maps before fitting each pixel.
+        grad : bool
+            see fit
+        autosave : bool
+            If True, the parameters maps are saved to a temporary file every 
+            autosave_every pixels.
+        autosave_every : int
+        parallel : None or int
+            If an int > 1, the navigation space is split in blocks that are 
+            fitted by the given number of worker processes. The workers 
+            are forked from the current process, therefore this option is 
+            not available in Windows.
+        """
         if autosave is not False:
             fd, autosave_fn = tempfile.mkstemp(prefix = 'hyperspy_autosave-', 
             dir = '.', suffix = '.npz')
@@ -539,27 +581,88 @@ class Model(list, Optimizers, Estimators):
            messages.warning_exit(
            "The mask must be an array with the same espatial dimensions as the" 
            "navigation shape, %s" % self.axes_manager.navigation_shape)
+        if parallel is not None and parallel > 1 and sys.platform == 'win32':
+            messages.warning(
+            "Parallel fitting is not supported in Windows, fitting serially")
+            parallel = None
         masked_elements = 0 if mask is None else mask.sum()
         pbar = progressbar.progressbar(
         maxval = (np.cumprod(self.axes_manager.navigation_shape)[-1] - 
         masked_elements))
-        i = 0
-        for index in np.ndindex(tuple(self.axes_manager.navigation_shape)):
-            if mask is None or not mask[index]:
-                self.axes_manager.set_not_slicing_indexes(index)
-                self.charge(only_fixed = charge_only_fixed)
-                self.fit(fitter = fitter, grad = grad, **kwargs)
-                i += 1
-                pbar.update(i)
-            if autosave is True and i % autosave_every  == 0:
-                self.save_parameters2file(autosave_fn)
+        if parallel is not None and parallel > 1:
+            self._parallel_multifit(pbar, mask = mask, 
+                charge_only_fixed = charge_only_fixed, parallel = parallel, 
+                autosave_fn = autosave_fn if autosave is True else None, 
+                fitter = fitter, grad = grad, **kwargs)
+        else:
+            i = 0
+            for index in np.ndindex(tuple(self.axes_manager.navigation_shape)):
+                if mask is None or not mask[index]:
+                    self.axes_manager.set_not_slicing_indexes(index)
+                    self.charge(only_fixed = charge_only_fixed)
+                    self.fit(fitter = fitter, grad = grad, **kwargs)
+                    i += 1
+                    pbar.update(i)
+                if autosave is True and i % autosave_every  == 0:
+                    self.save_parameters2file(autosave_fn)
         pbar.finish()
         if autosave is True:
             messages.information(
             'Deleting the temporary file %s pixels' % (autosave_fn + 'npz'))
             os.remove(autosave_fn + '.npz')
 
-            
+    def _parallel_multifit(self, pbar, mask = None, charge_only_fixed = False, 
+                           parallel = 2, autosave_fn = None, **fit_kwargs):
+        """Fit the navigation space in blocks using a pool of worker 
+        processes and collect the results in the parameters maps.
+        
+        See multifit.
+        """
+        global _multifit_worker_model
+        indexes = [index for index in 
+                   np.ndindex(tuple(self.axes_manager.navigation_shape))
+                   if mask is None or not mask[index]]
+        if not indexes:
+            return
+        # Several blocks per worker to balance the load
+        n_blocks = min(len(indexes), 4 * parallel)
+        block_size = int(np.ceil(len(indexes) / float(n_blocks)))
+        tasks = [(indexes[i:i + block_size], charge_only_fixed, fit_kwargs) 
+                 for i in xrange(0, len(indexes), block_size)]
+        _multifit_worker_model = self
+        pool = multiprocessing.Pool(parallel)
+        try:
+            i = 0
+            for block_indexes, maps in pool.imap_unordered(_multifit_worker, 
+                                                           tasks):
+                self._set_parameters_maps_at(block_indexes, maps)
+                i += len(block_indexes)
+                pbar.update(i)
+                if autosave_fn is not None:
+                    self.save_parameters2file(autosave_fn)
+        finally:
+            pool.close()
+            pool.join()
+            _multifit_worker_model = None
+        self.charge()
+
+    def _get_parameters_maps_at(self, indexes):
+        """Returns the values of the parameters maps at the given navigation
+        indexes as a list (one item per component) of lists (one item per 
+        parameter)"""
+        indexes = tuple(np.array(indexes).T)
+        return [[parameter.map[indexes] for parameter in component.parameters]
+                for component in self]
+
+    def _set_parameters_maps_at(self, indexes, maps):
+        """Stores in the parameters maps the values returned by
+        _get_parameters_maps_at"""
+        indexes = tuple(np.array(indexes).T)
+        for component, component_maps in zip(self, maps):
+            for parameter, values in zip(component.parameters, 
+                                         component_maps):
+                parameter.map[indexes] = values
+
     def save_parameters2file(self,filename):
         """Save the parameters array in binary format"""
         kwds = {}
@@ -280,7 +280,64 @@ class EELSModel(Model):
             "The power law background parameters could not be estimated\n"
             "Try choosing a different energy range for the estimation")
 
-    def fit_edge(self, edgenumber, startenergy = None, **kwards):
+    def smart_multifit(self, background_fit_E1 = None, mask = None, 
+                       parallel = None, checkpoint = None, **kwards):
+        """Fits the whole SI in a cascade style, i.e. as smart_fit but 
+        fitting each stage (background and edges) in all the pixels before 
+        proceeding to the next one.
+        
+        Parameters
+        ----------
+        background_fit_E1 : None or float
+            The starting energy of the background fit. If None, the first 
+            energy of the spectrum is used.
+        mask : None or boolean numpy array
+            see multifit
+        parallel : None or int
+            Number of worker processes, see multifit.
+        checkpoint : None or str
+            If not None, the parameters are saved after each stage in a file 
+            whose name is formed by the given string followed by the stage 
+            name, e.g. checkpoint_background.npz. The saved files can be 
+            loaded with load_parameters_from_file.
+        **kwards
+            Passed to multifit.
+        """
+        kwards['mask'] = mask
+        kwards['parallel'] = parallel
+        
+        # Fit background
+        self.fit_background(background_fit_E1, kind = 'multi', **kwards)
+        if checkpoint is not None:
+            self.save_parameters2file('%s_background' % checkpoint)
+
+        # Fit the edges
+        for i in xrange(0,len(self.edges)) :
+            if self.fit_edge(i, background_fit_E1, kind = 'multi', 
+                             **kwards) != 1 and checkpoint is not None:
+                self.save_parameters2file('%s_%s' % (checkpoint, 
+                                                     self.edges[i].name))
+
+    def fit_edge(self, edgenumber, startenergy = None, kind = 'single', 
+                 **kwards):
+        """Fit an ionization edge, its twins and its fine structure in the 
+        region that extends from startenergy to the next edge.
+        
+        Parameters
+        ----------
+        edgenumber : int
+            Index of the edge in self.edges
+        startenergy : None or float
+        kind : {'single', 'multi'}
+            If 'single' only the current spectrum is fitted, if 'multi' all 
+            the SI is fitted using multifit.
+        **kwards
+            Passed to fit or multifit.
+        """
+        if kind == 'multi':
+            fit = self.multifit
+        else:
+            fit = self.fit
         backup_channel_switches = self.channel_switches.copy()
         ea = self.axis.axis[self.channel_switches]
         if startenergy is None:
@@ -334,22 +391,22 @@ class EELSModel(Model):
         if edge.freedelta is True:
             print "Fit without fine structure, delta free"
             edge.delta.free = True
-            self.fit(**kwards)
+            fit(**kwards)
             edge.delta.free = False
             print "delta = ", edge.delta.value
-            self.__touch()
+            self._touch()
         elif edge.intensity.free is True:
             print "Fit without fine structure"
             self.enable_fine_structure(to_activate_fs)
             self.remove_fine_structure_data(to_activate_fs)
             self.disable_fine_structure(to_activate_fs)
-            self.fit(**kwards)
+            fit(**kwards)
 
         if len(to_activate_fs) > 0:
             self.set_data_range_in_units(startenergy, nextedgeenergy)
             self.enable_fine_structure(to_activate_fs)
             print "Fit with fine structure"
-            self.fit(**kwards)
+            fit(**kwards)
             
         self.enable_edges(edges_to_activate)
         # Recover the channel_switches. Remove it or make it smarter.
@@ -18,6 +18,8 @@
 
 import types
 import copy
+import multiprocessing
+import multiprocessing.pool
 
 import numpy as np
 import enthought.traits.api as t
@@ -28,8 +30,35 @@ from hyperspy.axes import AxesManager
 from hyperspy import io
 from hyperspy.drawing import mpl_hie, mpl_hse
 from hyperspy.misc import utils
+from hyperspy.misc import progressbar
 from hyperspy.learn.mva import MVA, MVA_Results
 
+# Default maximum size in bytes of the chunks of data processed at once by
+# the methods that stream over the navigation space
+default_max_chunk_size = 64 * 2**20
+
+def _iterate_blocks(unfolded, block_size = None):
+    """Yields the rows of a two dimensional array one by one if block_size 
+    is None or in blocks of block_size rows otherwise"""
+    if block_size is None:
+        for i in xrange(unfolded.shape[0]):
+            yield unfolded[i]
+    else:
+        for i in xrange(0, unfolded.shape[0], block_size):
+            yield unfolded[i:i + block_size]
+
+def _map_block(args):
+    """Applies a function to each item of a block of signals and returns 
+    the results stacked in an array. See Signal.map"""
+    function, block, out_dtype, kwargs = args
+    if out_dtype == object:
+        results = np.empty(len(block), dtype = object)
+        for i in xrange(len(block)):
+            results[i] = function(block[i], **kwargs)
+        return results
+    return np.array([function(item, **kwargs) for item in block], 
+                    dtype = out_dtype)
+
 
 class Parameters(t.HasTraits, object):
     """A class to comfortably access some parameters as attributes"""
@@ -106,6 +135,10 @@ class Signal(t.HasTraits, MVA):
     original_parameters = t.Instance(Parameters)
     mapped_parameters = t.Instance(Parameters)
     physical_property = t.Str()
+    # Size in bytes of the lazy data above which the navigator is first 
+    # computed from a subsample of the navigation positions, see 
+    # _get_navigator
+    max_navigator_data_size = default_max_chunk_size
 
     def __init__(self, file_data_dict=None, *args, **kw):
         """All data interaction is made through this class or its subclasses
@@ -117,6 +150,7 @@ class Signal(t.HasTraits, MVA):
            see load_dictionary for the format
         """
         super(Signal, self).__init__()
+        self._clear_cache()
         self.mapped_parameters = Parameters()
         self.original_parameters = Parameters()
         if type(file_data_dict).__name__ == "dict":
@@ -174,6 +208,165 @@ class Signal(t.HasTraits, MVA):
         self.original_parameters._get_parameters_dictionary()
         return dic
 
+    def _deepcopy_with_new_data(self, data):
+        """Returns a signal of the same class with a copy of the axes and 
+        parameters of the current one but with the given data. Unlike 
+        deepcopy, the current data is not copied."""
+        dic = {}
+        dic['data'] = data
+        dic['axes'] = self.axes_manager._get_axes_dicts()
+        dic['mapped_parameters'] = \
+        self.mapped_parameters._get_parameters_dictionary()
+        dic['original_parameters'] = \
+        self.original_parameters._get_parameters_dictionary()
+        return self.__class__(dic)
+
+    def _is_lazy(self):
+        """Returns True if the data is stored on disk, i.e. if it is a 
+        numpy memmap or an array-like object such as an h5py dataset."""
+        return isinstance(self.data, np.memmap) or \
+        not isinstance(self.data, np.ndarray)
+
+    def load_to_memory(self):
+        """Reads the data into memory if it is stored on disk, e.g. if it
+        was loaded with lazy = True"""
+        if self._is_lazy() is False:
+            return
+        data = np.empty(self.data.shape, dtype = self.data.dtype)
+        for chunk_slices in self._iterate_chunks():
+            data[chunk_slices] = self.data[chunk_slices]
+        self.close()
+        self.data = data
+
+    def close(self):
+        """Closes the file that stores the data if it is an h5py dataset,
+        i.e. if it was loaded with lazy = True from an hdf5 file that could
+        not be memory-mapped. The data cannot be read after closing the 
+        file unless load_to_memory was called before. Note that the file 
+        is shared by all the signals loaded from it."""
+        if self._is_lazy() and hasattr(self.data, 'file'):
+            self.data.file.close()
+
+    def _reduce_data(self, axes, dtype = None, parallel = None, 
+                     max_chunk_size = None):
+        """Returns the sum of the data over the given axes.
+        
+        The data is summed chunk by chunk if it is stored on disk or if 
+        parallel is not None, in which case the chunks are summed by a pool
+        of threads.
+        
+        Parameters
+        ----------
+        axes : list of positive ints
+        dtype : None or numpy dtype
+            The type of the accumulator, see numpy.sum
+        parallel : None or int
+            Number of threads.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            default_max_chunk_size divided by the number of threads is used.
+        """
+        axes = sorted(axes, reverse = True)
+        def reduce_array(data):
+            for axis in axes:
+                data = data.sum(axis, dtype = dtype)
+            return data
+        if parallel is None or parallel < 2:
+            if self._is_lazy() is False:
+                return reduce_array(self.data)
+            pool = None
+            wave = 1
+        else:
+            if max_chunk_size is None:
+                max_chunk_size = default_max_chunk_size // parallel
+            pool = multiprocessing.pool.ThreadPool(parallel)
+            wave = parallel
+        # The data is split along the first axis that is not reduced so 
+        # that each chunk fills a region of the result
+        free_axes = [i for i in xrange(len(self.data.shape)) 
+                     if i not in axes]
+        chunk_axis = free_axes[0] if free_axes else 0
+        # Position of the chunk axis in the result
+        out_axis = chunk_axis - len([i for i in axes if i < chunk_axis])
+        def reduce_chunk(chunk_slices):
+            return reduce_array(np.asarray(self.data[chunk_slices]))
+        chunks = list(self._iterate_chunks(chunk_axis, max_chunk_size))
+        result = None
+        try:
+            for i in xrange(0, len(chunks), wave):
+                if pool is None:
+                    results = [reduce_chunk(chunks[i])]
+                else:
+                    results = pool.map(reduce_chunk, chunks[i:i + wave])
+                for chunk_slices, chunk_result in zip(chunks[i:i + wave], 
+                                                      results):
+                    if not free_axes:
+                        if result is None:
+                            result = chunk_result
+                        else:
+                            result = result + chunk_result
+                        continue
+                    if result is None:
+                        result = np.empty(
+                            [self.data.shape[j] for j in free_axes], 
+                            dtype = chunk_result.dtype)
+                    result[(slice(None),) * out_axis + 
+                           (chunk_slices[chunk_axis], Ellipsis)] = \
+                    chunk_result
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return np.asarray(result)
+
+    def _get_reduced_signal(self, data, axes, return_signal):
+        """Sets the data resulting of a reduction over the given axes and 
+        removes the axes from the axes manager, either in the current 
+        signal or in a new signal that shares nothing but the new data with 
+        the current one."""
+        if return_signal is True:
+            s = self._deepcopy_with_new_data(data)
+        else:
+            s = self
+            s.data = data
+        for axis in sorted(axes, reverse = True):
+            s.axes_manager.axes.remove(s.axes_manager.axes[axis])
+            for _axis in s.axes_manager.axes:
+                if _axis.index_in_array > axis:
+                    _axis.index_in_array -= 1
+        s.axes_manager.set_signal_dimension()
+        if return_signal is True:
+            return s
+
+    def __setattr__(self, name, value):
+        # Any assignment to data, including the augmented assignments such
+        # as s.data *= 2, invalidates the cached quantities
+        if name == 'data':
+            self._clear_cache()
+        super(Signal, self).__setattr__(name, value)
+
+    def _get_cached(self, key):
+        """Returns the cached quantity stored with the given key or None if
+        it was not computed or if the data changed since it was computed.
+        """
+        if key in self._cache:
+            version, value = self._cache[key]
+            if version == self._data_version:
+                return value
+            del self._cache[key]
+        return None
+
+    def _set_cached(self, key, value):
+        """Stores a quantity computed from the current data"""
+        self._cache[key] = (self._data_version, value)
+
+    def _clear_cache(self):
+        """Discards all the cached quantities by increasing the data 
+        modification counter. It is called when the data is assigned and it
+        must be called by any method that modifies the data in place."""
+        self._data_version = getattr(self, '_data_version', 0) + 1
+        self._cache = {}
+
     def _get_undefined_axes_list(self):
         axes = []
         for i in xrange(len(self.data.shape)):
@@ -189,7 +382,7 @@ class Signal(t.HasTraits, MVA):
     def __call__(self, axes_manager=None):
         if axes_manager is None:
             axes_manager = self.axes_manager
-        return self.data.__getitem__(axes_manager._getitem_tuple)
+        return self.data.__getitem__(tuple(axes_manager._getitem_tuple))
 
     def _get_hse_1D_explorer(self, *args, **kwargs):
         islice = self.axes_manager._slicing_axes[0].index_in_array
@@ -200,16 +393,103 @@ class Signal(t.HasTraits, MVA):
             return self.data.squeeze().T
 
     def _get_hse_2D_explorer(self, *args, **kwargs):
-        islice = self.axes_manager._slicing_axes[0].index_in_array
-        data = self.data.sum(islice)
-        return data
+        return self._get_navigator()
 
     def _get_hie_explorer(self, *args, **kwargs):
-        isslice = [self.axes_manager._slicing_axes[0].index_in_array,
-                   self.axes_manager._slicing_axes[1].index_in_array]
-        isslice.sort()
-        data = self.data.sum(isslice[1]).sum(isslice[0])
-        return data
+        return self._get_navigator()
+
+    def _get_navigator_step(self):
+        """Returns the smallest subsampling step of the navigation axes 
+        such that the sampled data is not bigger than 
+        max_navigator_data_size bytes or the step of a finer navigator that
+        was already computed. Data in memory is not subsampled."""
+        if self._is_lazy() is False:
+            return 1
+        key = self._get_navigator_key(1)[:-1]
+        steps = [cache_key[-1] for cache_key in list(self._cache)
+                 if cache_key[:-1] == key and 
+                 self._get_cached(cache_key) is not None]
+        if steps:
+            return min(steps)
+        nav_dim = self.axes_manager.navigation_dimension
+        data_size = self.data.size * np.dtype(self.data.dtype).itemsize
+        step = 1
+        while data_size / float(step ** nav_dim) > \
+              self.max_navigator_data_size:
+            step *= 2
+        return step
+
+    def _get_navigator_key(self, step):
+        return ('navigator', 
+                tuple([axis.index_in_array for axis in 
+                       self.axes_manager._slicing_axes]), 
+                step)
+
+    def _get_navigator(self, step = None):
+        """Returns the sum over the signal axes of the data.
+        
+        The result is cached until the data or the axes change. To display 
+        quickly the navigator of big datasets the sum is computed only 
+        every `step` navigation positions and the result is expanded to the
+        navigation shape. The sampled navigators form a pyramid, the 
+        finest level computed so far being returned by default.
+        
+        Parameters
+        ----------
+        step : None or int
+            The subsampling step of the navigation axes. If None, the step
+            is given by _get_navigator_step.
+        """
+        if step is None:
+            step = self._get_navigator_step()
+        key = self._get_navigator_key(step)
+        navigator = self._get_cached(key)
+        if navigator is not None:
+            return navigator
+        sig_axes = sorted([axis.index_in_array for axis in 
+                           self.axes_manager._slicing_axes])
+        if step == 1:
+            navigator = self._reduce_data(sig_axes)
+        else:
+            getitem = [slice(None, None, step),] * len(self.data.shape)
+            for axis in sig_axes:
+                getitem[axis] = slice(None)
+            navigator = np.asarray(self.data[tuple(getitem)])
+            for axis in reversed(sig_axes):
+                navigator = navigator.sum(axis)
+            # Expand the navigator to the navigation shape
+            nav_shape = [size for i, size in enumerate(self.data.shape) 
+                         if i not in sig_axes]
+            for axis, size in enumerate(nav_shape):
+                navigator = navigator.repeat(step, axis)
+                navigator = navigator[(slice(None),) * axis + 
+                                      (slice(None, size), Ellipsis)]
+        self._set_cached(key, navigator)
+        return navigator
+
+    def update_navigator(self, step = 1):
+        """Computes the navigator with the given subsampling step of the
+        navigation axes and replots.
+        
+        For datasets stored on disk and bigger than max_navigator_data_size
+        bytes the navigator is first computed from a subsample of the navigation 
+        positions so that it is displayed quickly. Use this method to 
+        compute it at full resolution (step = 1) or at an intermediate 
+        level of the pyramid.
+        
+        The navigator is cached until the data is assigned or modified by
+        a method of the signal. After an item assignment such as 
+        s.data[0] = 1, reassign the data, s.data = s.data, before calling
+        this method.
+        
+        Parameters
+        ----------
+        step : int
+        """
+        if self.axes_manager.navigation_dimension == 0:
+            return
+        self._get_navigator(step)
+        self._replot()
 
     def _get_explorer(self, *args, **kwargs):
         nav_dim = self.axes_manager.navigation_dimension
@@ -364,9 +644,27 @@ reconstruction created using either pca_build_SI or ica_build_SI methods?"
         axis = self._get_positive_axis_index_index(axis)
         if i1 is not None:
             new_offset = self.axes_manager.axes[axis].axis[i1]
-        # We take a copy to guarantee the continuity of the data
-        self.data = self.data[
-        (slice(None),)*axis + (slice(i1, i2), Ellipsis)].copy()
+        getitem = (slice(None),)*axis + (slice(i1, i2), Ellipsis)
+        if isinstance(self.data, np.memmap):
+            # A view of the data on disk
+            self.data = self.data[getitem]
+        elif self._is_lazy() and len(self.data.shape) > 1:
+            # Copy the cropped data chunk by chunk to a temporary file on 
+            # disk
+            shape = list(self.data.shape)
+            shape[axis] = len(xrange(*slice(i1, i2).indices(shape[axis])))
+            data = utils.get_temporary_memmap(shape, self.data.dtype)
+            for chunk_slices in self._iterate_chunks(1 if axis == 0 else 0):
+                getitem = list(chunk_slices[:-1]) + [slice(None),] * (
+                    len(shape) - len(chunk_slices) + 1)
+                getitem[axis] = slice(i1, i2)
+                data[chunk_slices] = self.data[tuple(getitem)]
+            self.data = data
+        elif self._is_lazy():
+            self.data = np.asarray(self.data[getitem])
+        else:
+            # We take a copy to guarantee the continuity of the data
+            self.data = self.data[getitem].copy()
 
         if i1 is not None:
             self.axes_manager.axes[axis].offset = new_offset
@@ -407,6 +705,7 @@ reconstruction created using either pca_build_SI or ica_build_SI methods?"
         """
         self.data = np.roll(self.data, n_x, 0)
         self.data[:n_x, ...] = np.roll(self.data[:n_x, ...], n_y, 1)
+        self._clear_cache()
         self._replot()
 
     # TODO: After using this function the plotting does not work
@@ -428,20 +727,120 @@ reconstruction created using either pca_build_SI or ica_build_SI methods?"
         self.axes_manager.set_signal_dimension()
         self._replot()
 
-    def rebin(self, new_shape):
+    def rebin(self, new_shape, method = 'sum', dtype = None, parallel = None,
+              max_chunk_size = None):
         """
         Rebins the data to the new shape
 
+        The binning factors do not need to be integers: when a new bin 
+        overlaps partially an original bin it receives the corresponding 
+        fraction of its content, so that the total intensity is conserved.
+
+        The data is rebinned chunk by chunk if it is stored on disk or if 
+        parallel is not None, in which case the chunks are rebinned by a 
+        pool of threads.
+
         Parameters
         ----------
         new_shape: tuple of ints
-            The new shape must be a divisor of the original shape
+            The new shape. It cannot be bigger than the original shape.
+        method : {'sum', 'mean'}
+            Whether the new bins contain the sum or the mean of the 
+            original bins.
+        dtype : None or numpy dtype
+            The type of the accumulator. If None and the binning factors 
+            are integers the numpy defaults of sum are used, i.e. floating 
+            point data keeps its type and integer data smaller than the 
+            platform integer, e.g. uint8, is upcast to it to avoid 
+            overflows. For non-integer binning factors float64 is used for
+            integer data.
+        parallel : None or int
+            Number of threads.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            default_max_chunk_size divided by the number of threads is used.
         """
-        factors = np.array(self.data.shape) / np.array(new_shape)
-        self.data = utils.rebin(self.data, new_shape)
+        new_shape = tuple(new_shape)
+        if len(new_shape) != len(self.data.shape):
+            messages.warning_exit(
+            "The new shape must have the same number of dimensions as the "
+            "data")
+        if method not in ('sum', 'mean'):
+            messages.warning_exit("Unknown rebin method: %s" % method)
+        factors = np.array(self.data.shape, dtype = 'float64') / new_shape
+        if np.any(factors < 1):
+            messages.warning_exit(
+            "The new shape cannot be bigger than the original shape")
+        if (parallel is None or parallel < 2) and self._is_lazy() is False:
+            self.data = utils.rebin(self.data, new_shape, method, dtype)
+        else:
+            self.data = self._rebin_in_chunks(new_shape, factors, method, 
+                                              dtype, parallel, 
+                                              max_chunk_size)
         for axis in self.axes_manager.axes:
             axis.scale *= factors[axis.index_in_array]
         self.get_dimensions_from_data()
+        self._clear_cache()
+
+    def _rebin_in_chunks(self, new_shape, factors, method, dtype, parallel,
+                         max_chunk_size):
+        """Returns the rebinned data computed chunk by chunk along the first
+        axis. See rebin."""
+        if parallel is None or parallel < 2:
+            pool = None
+            wave = 1
+        else:
+            if max_chunk_size is None:
+                max_chunk_size = default_max_chunk_size // parallel
+            pool = multiprocessing.pool.ThreadPool(parallel)
+            wave = parallel
+        factor = factors[0]
+        integer_factor = factor == np.round(factor)
+        if integer_factor:
+            # Each chunk contains an integer number of new bins
+            factor = int(factor)
+            multiple_of = factor
+        else:
+            multiple_of = 1
+            if dtype is None and self.data.dtype.kind not in ('f', 'c'):
+                dtype = 'float64'
+        edges = np.arange(new_shape[0] + 1) * factor
+        def rebin_chunk(chunk_slices):
+            chunk = np.asarray(self.data[chunk_slices])
+            start = chunk_slices[0].start
+            size = chunk.shape[0]
+            if integer_factor:
+                return start // factor, utils.rebin(
+                    chunk, (size // factor,) + new_shape[1:], 'sum', dtype)
+            # The rows of the chunk contribute to the new bins that they
+            # overlap, the bins at the edges of the chunk receiving also
+            # contributions from the neighbouring chunks.
+            chunk = utils.rebin(chunk, (size,) + new_shape[1:], 'sum', dtype)
+            first = int(np.floor(start / factor))
+            last = min(int(np.ceil((start + size) / factor)), new_shape[0])
+            return first, utils.rebin_along_axis(
+                chunk, 0, edges[first:last + 1] - start, dtype)
+        chunks = list(self._iterate_chunks(0, max_chunk_size, multiple_of))
+        data = None
+        try:
+            for i in xrange(0, len(chunks), wave):
+                if pool is None:
+                    results = [rebin_chunk(chunks[i])]
+                else:
+                    results = pool.map(rebin_chunk, chunks[i:i + wave])
+                for first, chunk_rebinned in results:
+                    if data is None:
+                        data = np.zeros(new_shape, 
+                                        dtype = chunk_rebinned.dtype)
+                    data[first:first + chunk_rebinned.shape[0]] += \
+                    chunk_rebinned
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if method == 'mean':
+            data = data / float(np.prod(factors))
+        return data
 
     def split_in(self, axis, number_of_parts = None, steps = None):
         """Splits the data
@@ -610,39 +1009,334 @@ reconstruction created using either pca_build_SI or ica_build_SI methods?"
             self._axes_manager_before_unfolding = None
             self._replot()
 
+    def _iterate_chunks(self, axis = 0, max_chunk_size = None, 
+                        multiple_of = 1):
+        """Yields tuples of slices that split the data in chunks along the
+        given axis.
+        
+        For data stored in C order and axis = 0 each chunk is a contiguous 
+        view of the data. The length of the chunks is such that each chunk 
+        is not bigger than max_chunk_size bytes, unless a single row is 
+        bigger.
+        
+        Parameters
+        ----------
+        axis : int
+            The index in array of the axis along which the data is split.
+        max_chunk_size : None or int
+            Maximum size of the chunks in bytes. If None, 
+            default_max_chunk_size is used.
+        multiple_of : int
+            The length of the chunks is a multiple of this number, e.g. the
+            binning factor when rebinning.
+        """
+        if max_chunk_size is None:
+            max_chunk_size = default_max_chunk_size
+        shape = self.data.shape
+        if not shape:
+            yield (Ellipsis,)
+            return
+        row_size = np.prod(shape[:axis] + shape[axis + 1:]) * np.dtype(
+            self.data.dtype).itemsize
+        step = int(max(1, max_chunk_size // max(1, row_size * multiple_of)))
+        step *= multiple_of
+        for i in xrange(0, shape[axis], step):
+            yield (slice(None),) * axis + (slice(i, i + step), Ellipsis)
+
+    def _iterate_navigation_chunks(self, max_chunk_size = None):
+        """Yields tuples of slices that split the data in chunks along the
+        navigation axis that comes first in the array.
+        
+        See _iterate_chunks.
+        """
+        if not self.axes_manager._non_slicing_axes:
+            yield (Ellipsis,)
+            return
+        axis = min([axis.index_in_array for axis in 
+                    self.axes_manager._non_slicing_axes])
+        for chunk_slices in self._iterate_chunks(axis, max_chunk_size):
+            yield chunk_slices
+
+    def map(self, function, out_shape = None, out_dtype = None, 
+            inplace = False, parallel = None, pool_type = 'thread',
+            max_chunk_size = None, **kwargs):
+        """Applies a function to the signal (e.g. the spectrum or the 
+        image) at each point of the navigation space.
+        
+        The navigation space is split in chunks that are processed by a 
+        pool of workers if parallel is not None.
+        
+        Parameters
+        ----------
+        function : callable
+            It is called as function(signal, **kwargs) where signal is an 
+            array with the shape of the signal space. It must return an 
+            array of shape out_shape.
+        out_shape : None or tuple of ints
+            The shape of the output of the function. If None, it is the 
+            shape of the signal space and the result has the same axes as 
+            the current signal.
+        out_dtype : None or numpy dtype
+            The dtype of the result. If None, it is determined from the 
+            output of the function. Use object for functions that return
+            outputs of variable size, e.g. a list of peaks, with out_shape 
+            = ().
+        inplace : bool
+            If True, the output of the function replaces the data, what 
+            requires out_shape to be None.
+        parallel : None or int
+            The number of workers. If None, the function is applied 
+            serially.
+        pool_type : {'thread', 'process'}
+            The type of the pool of workers. Threads are convenient for
+            functions that release the GIL, e.g. most numpy operations. 
+            With processes, the function must be picklable, i.e. defined
+            at module level.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            default_max_chunk_size divided by the number of workers is used.
+        **kwargs
+            Passed to the function.
+            
+        Returns
+        -------
+        A signal if inplace is False. If out_shape is None it is of the 
+        same class as the current signal, otherwise its navigation axes are 
+        those of the current signal and the output axes are undefined. If 
+        out_shape is () and there are no navigation axes, the output of the
+        function is returned.
+        
+        Examples
+        --------
+        >>> maxima = s.map(np.max, out_shape = ())
+        >>> s.map(scipy.signal.medfilt, inplace = True, parallel = 4)
+        """
+        nav_axes = [axis.index_in_array for axis in 
+                    self.axes_manager._non_slicing_axes]
+        sig_axes = [axis.index_in_array for axis in 
+                    self.axes_manager._slicing_axes]
+        signal_shape = tuple([self.data.shape[i] for i in sig_axes])
+        nav_shape = tuple(self.axes_manager.navigation_shape)
+        same_shape = out_shape is None or tuple(out_shape) == signal_shape
+        if inplace is True and same_shape is False:
+            messages.warning_exit(
+            "The output shape must be the signal shape to operate in place")
+        if out_shape is None:
+            out_shape = signal_shape
+        out_shape = tuple(out_shape)
+        # Position of the first navigation axis in the chunk slices
+        first_nav = min(nav_axes) if nav_axes else 0
+        # Permutation to go back from the (navigation, signal) to the data
+        # layout
+        back_axes = list(np.argsort(nav_axes + sig_axes))
+        if parallel is not None and parallel > 1:
+            if max_chunk_size is None:
+                max_chunk_size = default_max_chunk_size // parallel
+            if pool_type == 'process':
+                pool = multiprocessing.Pool(parallel)
+            else:
+                pool = multiprocessing.pool.ThreadPool(parallel)
+            wave = parallel
+        else:
+            pool = None
+            wave = 1
+        if inplace is True:
+            out = self.data
+        else:
+            out = None
+        chunks = list(self._iterate_navigation_chunks(max_chunk_size))
+        pbar = progressbar.progressbar(maxval = len(chunks))
+        try:
+            for i in xrange(0, len(chunks), wave):
+                tasks = []
+                chunks_nav_shapes = []
+                for chunk_slices in chunks[i:i + wave]:
+                    block = np.asarray(self.data[chunk_slices]).transpose(
+                        nav_axes + sig_axes)
+                    chunks_nav_shapes.append(block.shape[:len(nav_axes)])
+                    tasks.append((function, 
+                                  block.reshape((-1,) + signal_shape), 
+                                  out_dtype, kwargs))
+                if pool is None:
+                    results = map(_map_block, tasks)
+                else:
+                    results = pool.map(_map_block, tasks)
+                for chunk_slices, chunk_nav_shape, result in zip(
+                    chunks[i:i + wave], chunks_nav_shapes, results):
+                    result = result.reshape(chunk_nav_shape + out_shape)
+                    if out is None:
+                        if same_shape is True:
+                            shape = self.data.shape
+                        else:
+                            shape = nav_shape + out_shape
+                        if self._is_lazy():
+                            out = utils.get_temporary_memmap(shape, 
+                                                             result.dtype)
+                        else:
+                            out = np.empty(shape, dtype = result.dtype)
+                    if same_shape is True:
+                        out[chunk_slices] = result.transpose(back_axes)
+                    else:
+                        out[chunk_slices[first_nav:]] = result
+                pbar.update(min(i + wave, len(chunks)))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        pbar.finish()
+        if inplace is True:
+            self._clear_cache()
+            self._replot()
+            return
+        if same_shape is True:
+            return self._deepcopy_with_new_data(out)
+        elif not out_shape:
+            return self._get_navigation_signal(out)
+        from hyperspy.signals.image import Image
+        from hyperspy.signals.spectrum import Spectrum
+        axes = self.axes_manager._get_non_slicing_axes_dicts()
+        for size in out_shape:
+            axes.append({'name' : 'undefined',
+                         'scale' : 1.,
+                         'offset' : 0.,
+                         'size' : size,
+                         'units' : 'undefined',
+                         'index_in_array' : len(axes), 
+                         'slice_bool' : True})
+        dic = {'data' : out, 'axes' : axes}
+        if len(out_shape) == 1:
+            return Spectrum(dic)
+        elif len(out_shape) == 2:
+            return Image(dic)
+        else:
+            return Signal(dic)
+
+    def _get_navigation_signal(self, data):
+        """Returns a signal with the navigation axes of the current signal
+        that contains the given data, e.g. a map of a fitted parameter.
+        
+        Parameters
+        ----------
+        data : numpy array with the navigation shape
+        
+        Returns
+        -------
+        Image if the navigation dimension is 2, Spectrum if it is 1, the 
+        data itself if it is 0, i.e. a scalar for a 0-d array, and Signal 
+        otherwise.
+        """
+        from hyperspy.signals.image import Image
+        from hyperspy.signals.spectrum import Spectrum
+        if self.axes_manager.navigation_dimension == 0:
+            data = np.asarray(data)
+            return data[()] if not data.shape else data
+        dic = {'data' : data, 
+               'axes' : self.axes_manager._get_non_slicing_axes_dicts()}
+        if self.axes_manager.navigation_dimension == 2:
+            return Image(dic)
+        elif self.axes_manager.navigation_dimension == 1:
+            return Spectrum(dic)
+        else:
+            return Signal(dic)
+
     def _get_positive_axis_index_index(self, axis):
         if axis < 0:
             axis = len(self.data.shape) + axis
         return axis
 
-    def iterate_axis(self, axis = -1):
-        # We make a copy to guarantee that the data in contiguous, otherwise
-        # it will not return a view of the data
-        self.data = self.data.copy()
+    def iterate_axis(self, axis = -1, block_size = None, 
+                     max_chunk_size = None):
+        """Iterates over the one dimensional slices of the data along the 
+        given axis, e.g. over all the spectra of a spectrum image.
+        
+        When the memory layout allows it, the yielded arrays are views of 
+        the data, therefore no data is copied and any modification is 
+        applied to the data. Otherwise, e.g. when the data is stored in an 
+        hdf5 file or when its strides do not allow to address all the 
+        slices from a single view, the data is copied chunk by chunk and 
+        each chunk is written back when the next one is requested (only if 
+        the data is writable). If the iteration is interrupted, e.g. by 
+        break or by an exception, the current chunk is written back when 
+        the generator is closed, i.e. when it is garbage collected or its 
+        close method is called. Call close explicitly if a reference to the
+        generator is kept.
+        
+        Parameters
+        ----------
+        axis : int
+        block_size : None or int
+            If None, one dimensional arrays are yielded. Otherwise, the 
+            slices are yielded in blocks, i.e. two dimensional arrays of 
+            shape (block_size, axis size), which allows to process them in 
+            vectorized batches. The last block can be smaller.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data copied when views 
+            cannot be used. If None, default_max_chunk_size is used.
+        """
         axis = self._get_positive_axis_index_index(axis)
-        unfolded_axis = axis - 1
-        new_shape = [1] * len(self.data.shape)
-        new_shape[axis] = self.data.shape[axis]
-        new_shape[unfolded_axis] = -1
-        # Warning! if the data is not contigous it will make a copy!!
-        data = self.data.reshape(new_shape)
-        for i in xrange(data.shape[unfolded_axis]):
-            getitem = [0] * len(data.shape)
-            getitem[axis] = slice(None)
-            getitem[unfolded_axis] = i
-            yield(data[getitem])
-
-    def sum(self, axis, return_signal = False):
+        ndim = len(self.data.shape)
+        size = self.data.shape[axis]
+        if isinstance(self.data, np.ndarray):
+            unfolded = np.rollaxis(self.data, axis, ndim).view()
+            try:
+                # Setting the shape raises an error instead of copying
+                unfolded.shape = (-1, size)
+            except AttributeError:
+                unfolded = None
+            if unfolded is not None:
+                try:
+                    for block in _iterate_blocks(unfolded, block_size):
+                        yield block
+                finally:
+                    self._clear_cache()
+                return
+        if isinstance(self.data, np.ndarray):
+            writable = self.data.flags['WRITEABLE']
+        else:
+            writable = getattr(getattr(self.data, 'file', None), 'mode', 
+                               'r') != 'r'
+        if ndim == 1:
+            chunks = [(Ellipsis,)]
+        else:
+            chunks = self._iterate_chunks(1 if axis == 0 else 0, 
+                                          max_chunk_size)
+        try:
+            for chunk_slices in chunks:
+                chunk = np.ascontiguousarray(np.rollaxis(
+                    np.asarray(self.data[chunk_slices]), axis, ndim))
+                try:
+                    for block in _iterate_blocks(chunk.reshape((-1, size)), 
+                                                 block_size):
+                        yield block
+                finally:
+                    # Also when the iteration is interrupted
+                    if writable is True:
+                        self.data[chunk_slices] = np.rollaxis(chunk, 
+                                                              ndim - 1, axis)
+        finally:
+            self._clear_cache()
+
+    def sum(self, axis, return_signal = False, dtype = None, 
+            parallel = None):
         """Sum the data over the specify axis
 
+        The new data is computed directly from the current data, that is 
+        never copied.
+
         Parameters
         ----------
-        axis : int
-            The axis over which the operation will be performed
+        axis : int or tuple of ints
+            The axis or axes over which the operation will be performed
         return_signal : bool
             If False the operation will be performed on the current object. If
             True, the current object will not be modified and the operation
              will be performed in a new signal object that will be returned.
+        dtype : None or numpy dtype
+            The type of the accumulator, see numpy.sum. E.g. use float64 to
+            avoid overflows when summing integer data.
+        parallel : None or int
+            If not None, the data is summed in chunks by the given number 
+            of threads.
 
         Returns
         -------
@@ -664,31 +1358,34 @@ reconstruction created using either pca_build_SI or ica_build_SI methods?"
         (64,64)
         # If we just want to plot the result of the operation
         s.sum(-1, True).plot()
+        # Sum over the two navigation axes in one pass
+        s.sum((0, 1), True)
         """
-        if return_signal is True:
-            s = self.deepcopy()
-        else:
-            s = self
-        s.data = s.data.sum(axis)
-        s.axes_manager.axes.remove(s.axes_manager.axes[axis])
-        for _axis in s.axes_manager.axes:
-            if _axis.index_in_array > axis:
-                _axis.index_in_array -= 1
-        s.axes_manager.set_signal_dimension()
-        if return_signal is True:
-            return s
+        axes = self._get_positive_axes_list(axis)
+        data = self._reduce_data(axes, dtype = dtype, parallel = parallel)
+        return self._get_reduced_signal(data, axes, return_signal)
 
-    def mean(self, axis, return_signal = False):
+    def mean(self, axis, return_signal = False, dtype = None, 
+             parallel = None):
         """Average the data over the specify axis
 
+        The new data is computed directly from the current data, that is 
+        never copied.
+
         Parameters
         ----------
-        axis : int
-            The axis over which the operation will be performed
+        axis : int or tuple of ints
+            The axis or axes over which the operation will be performed
         return_signal : bool
             If False the operation will be performed on the current object. If
             True, the current object will not be modified and the operation
             will be performed in a new signal object that will be returned.
+        dtype : None or numpy dtype
+            The type of the accumulator. If None, float64 is used for 
+            integer data and the data type otherwise, as in numpy.mean
+        parallel : None or int
+            If not None, the data is summed in chunks by the given number 
+            of threads.
 
         Returns
         -------
@@ -711,18 +1408,23 @@ reconstruction created using either pca_build_SI or ica_build_SI methods?"
         # If we just want to plot the result of the operation
         s.mean(-1, True).plot()
         """
-        if return_signal is True:
-            s = self.deepcopy()
-        else:
-            s = self
-        s.data = s.data.mean(axis)
-        s.axes_manager.axes.remove(s.axes_manager.axes[axis])
-        for _axis in s.axes_manager.axes:
-            if _axis.index_in_array > axis:
-                _axis.index_in_array -= 1
-        s.axes_manager.set_signal_dimension()
-        if return_signal is True:
-            return s
+        axes = self._get_positive_axes_list(axis)
+        if dtype is None:
+            if np.dtype(self.data.dtype).kind in ('f', 'c'):
+                dtype = self.data.dtype
+            else:
+                dtype = np.float64
+        data = self._reduce_data(axes, dtype = dtype, parallel = parallel)
+        data = data / float(np.prod([self.data.shape[i] for i in axes]))
+        return self._get_reduced_signal(data, axes, return_signal)
+
+    def _get_positive_axes_list(self, axis):
+        """Returns a sorted list of positive axis indexes given an int or
+        a tuple of ints"""
+        if not hasattr(axis, '__iter__'):
+            axis = (axis,)
+        return sorted(set([self._get_positive_axis_index_index(i) 
+                           for i in axis]))
 
     def copy(self):
         return(copy.copy(self))
@@ -27,7 +27,6 @@ from hyperspy.axes import AxesManager
 from hyperspy.io import load
 
 import numpy as np
-import mdp
 
 from collections import OrderedDict
 
@@ -372,6 +371,7 @@ class AggregateCells(Aggregate,Image):
         self.summary()
 
     def kmeans_cluster_stack(self, clusters=None):
+        import mdp
         smp=self.mapped_parameters
         d=self.data
         # if clusters not given, try to determine what it should be.
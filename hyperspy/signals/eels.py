@@ -26,6 +26,9 @@ from hyperspy.signals.image import Image
 
 from hyperspy.components.eels_cl_edge import edges_dict
 import hyperspy.axes
+from hyperspy import messages
+from hyperspy.misc import utils
+from hyperspy.misc import progressbar
 
 class EELSSpectrum(Spectrum):
     
@@ -35,6 +38,7 @@ class EELSSpectrum(Spectrum):
         self.subshells = set()
         self.elements = set()
         self.edges = list()
+        self.zero_loss = None
 #        self.readout = None
 #        self.dark_current = None
 #        self.gain_correction = None
@@ -422,20 +426,61 @@ class EELSSpectrum(Spectrum):
             saxis = sync_signal.axes_manager.axes[axis.index_in_array]
             saxis.offset += axis.offset - old_offset
 
-    def fourier_log_deconvolution(self):
+    def fourier_log_deconvolution(self, zero_loss = None, 
+                                  max_chunk_size = None):
         """Performs fourier-log deconvolution of the full SI.
         
-        The zero-loss can be specified by defining the parameter 
-        self.zero_loss that must be an instance of Spectrum. Otherwise the 
-        zero loss will be extracted by the reflected tail method
+        The data is processed in chunks of the navigation space using real
+        FFTs. To reduce the wrap-around the spectra are zero padded to at 
+        least twice their length.
+        
+        Parameters
+        ----------
+        zero_loss : None or Spectrum
+            The zero loss, either a SI of the same shape or a single 
+            spectrum that is used for all the pixels, in which case its 
+            transform is computed only once. If None, self.zero_loss is 
+            used.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
         """
         axis = self.axes_manager._slicing_axes[0]
-        if self.zero_loss is None:
-            self.extract_zero_loss()
-        z = np.fft.fft(self.zero_loss.data, axis = axis.index_in_array)
-        j = np.fft.fft(self.data, axis = axis.index_in_array)
-        j1 = z*np.log(j/z)
-        self.data = np.fft.ifft(j1, axis = 0).real
+        if zero_loss is None:
+            zero_loss = self.zero_loss
+        if zero_loss is None:
+            messages.warning_exit(
+            "The zero loss must be given or defined in the zero_loss "
+            "attribute")
+        size = axis.size
+        fft_size = 2 ** int(np.ceil(np.log2(2 * size)))
+        shared_zero_loss = len(zero_loss.data.shape) == 1
+        if shared_zero_loss:
+            z = zero_loss._get_cached(('rfft', fft_size))
+            if z is None:
+                z = np.fft.rfft(zero_loss.data, fft_size)
+                zero_loss._set_cached(('rfft', fft_size), z)
+        if self._is_lazy():
+            out = utils.get_temporary_memmap(self.data.shape, 'float64')
+        elif self.data.dtype.kind == 'f':
+            out = self.data
+        else:
+            out = np.empty(self.data.shape, dtype = 'float64')
+        chunks = list(self._iterate_navigation_chunks(max_chunk_size))
+        pbar = progressbar.progressbar(maxval = len(chunks))
+        for i, chunk_slices in enumerate(chunks):
+            j = np.fft.rfft(self._signal_axis_last(self.data[chunk_slices]), 
+                            fft_size)
+            if shared_zero_loss is False:
+                z = np.fft.rfft(self._signal_axis_last(
+                    zero_loss.data[chunk_slices]), fft_size)
+            j = np.fft.irfft(z * np.log(j / z), fft_size)[..., :size]
+            self._signal_axis_last(out[chunk_slices])[:] = j
+            pbar.update(i + 1)
+        pbar.finish()
+        self.data = out
+        self._clear_cache()
+        self._replot()
         
     def calculate_thickness(self, method = 'threshold', threshold = 3, 
     factor = 1):
@@ -501,6 +546,11 @@ class EELSSpectrum(Spectrum):
             'der_roots' : tuple
                 Position in energy units of the roots of the first
             derivative if der_roots is True (False by default)
+            
+        See also
+        --------
+        Spectrum.calculate_FWHM_maps to estimate the FWHM of all the 
+        spectra at once.
         """
         axis = self.axes_manager._slicing_axes[0]
         i0, i1 = axis.value2index(energy_range[0]), axis.value2index(
@@ -574,126 +624,6 @@ class EELSSpectrum(Spectrum):
 #            (np.hanning(2*channels)[-channels:]).reshape((-1,1,1))
 #            dc[-offset:,:,:] *= 0. 
 #        
-    def remove_spikes(self, threshold = 2200, subst_width = 5, 
-                      coordinates = None):
-        """Remove the spikes in the SI.
-        
-        Detect the spikes above a given threshold and fix them by interpolating 
-        in the give interval. If coordinates is given, it will only remove the 
-        spikes for the specified spectra.
-        
-        Paramerters:
-        ------------
-        threshold : float
-            A suitable threshold can be determined with 
-            Spectrum.spikes_diagnosis
-        subst_width : tuple of int or int
-            radius of the interval around the spike to substitute with the 
-            interpolation. If a tuple, the dimension must be equal to the 
-            number of spikes in the threshold. If int the same value will be 
-            applied to all the spikes.
-        
-        See also
-        --------
-        Spectrum.spikes_diagnosis, Spectrum.plot_spikes
-        """
-        axis = self.axes_manager._slicing_axes[0]
-        int_window = 20
-        dc = self.data
-        der = np.diff(dc, 1, axis.index_in_array)
-        E_ax = axis.axis
-        n_ch = len(E_ax)
-        i = 0
-        if coordinates is None:
-            coordinates = []
-            for index in np.ndindex(tuple(self.axes_manager.navigation_shape)):
-                coordinates.append(index)
-            for index in coordinates:
-                lindex = list(index)
-                lindex.insert(axis.index_in_array, slice(None))
-                if der[lindex].max() >= threshold:
-                    print "Spike detected in ", index
-                    argmax = der[lindex].argmax()
-                    if hasattr(subst_width, '__iter__'):
-                        subst__width = subst_width[index]
-                    else:
-                        subst__width = subst_width
-                    lp1 = np.clip(argmax - int_window, 0, n_ch)
-                    lp2 = np.clip(argmax - subst__width, 0, n_ch)
-                    rp2 = np.clip(argmax + int_window, 0, n_ch)
-                    rp1 = np.clip(argmax + subst__width, 0, n_ch)
-                    x = np.hstack((E_ax[lp1:lp2], E_ax[rp1:rp2]))
-                    nlindex1 = list(index)
-                    nlindex1.insert(axis.index_in_array, 
-                                      slice(lp1, lp2))
-                    nlindex2 = list(index)
-                    nlindex2.insert(axis.index_in_array, 
-                                      slice(rp1, rp2))                
-                    
-                    y = np.hstack((dc[nlindex1], dc[nlindex2])) 
-                    # The weights were commented because the can produce 
-                    # nans, maybe it should be an option?
-                    intp = scipy.interpolate.UnivariateSpline(x, y) 
-                    #,w = 1/np.sqrt(y))
-                    x_int = E_ax[lp2:rp1 + 1]
-                    nlindex3 = list(index)
-                    nlindex3.insert(axis.index_in_array, slice(lp2, rp1 + 1))
-                    dc[nlindex3]  = intp(x_int)
-                    i += 1
-                
-    def spikes_diagnosis(self):
-        """Plots a histogram to help in choosing the threshold for spikes
-        removal.
-        See also
-        --------
-        Spectrum.remove_spikes, Spectrum.plot_spikes
-        """
-        dc = self.data
-        axis = self.axes_manager._slicing_axes[0]
-        der = np.diff(dc, 1, axis.index_in_array)
-        plt.figure()
-        plt.hist(np.ravel(der.max(axis.index_in_array)),100)
-        plt.xlabel('Threshold')
-        plt.ylabel('Counts')
-        plt.draw()
-        
-    def plot_spikes(self, threshold = 2200):
-        """Plot the spikes in the given threshold
-        
-        Parameters
-        ----------
-        threshold : float
-        
-        Returns
-        -------
-        list of spikes coordinates
-        
-        See also
-        --------
-        Spectrum.remove_spikes, Spectrum.spikes_diagnosis
-        """
-        dc = self.data
-        axis = self.axes_manager._slicing_axes[0]
-        der = np.diff(dc,1,axis.index_in_array)
-        i = 0
-        spikes = []
-        for index in np.ndindex(tuple(self.axes_manager.navigation_shape)):
-            lindex = list(index)
-            lindex.insert(axis.index_in_array, slice(None))
-            if der[lindex].max() >= threshold:
-                print "Spike detected in ", index
-                spikes.append(index)
-                argmax = der[lindex].argmax()
-                nlindex = list(index)
-                i1 = np.clip(argmax-100,0, dc.shape[axis.index_in_array]-1)
-                i2 = np.clip(argmax+100,0, dc.shape[axis.index_in_array]-1)
-                nlindex.insert(axis.index_in_array, slice(i1, i2))
-                toplot = dc[nlindex]
-                plt.figure()
-                plt.step(range(len(toplot)), toplot)
-                plt.title(str(index))
-                i += 1
-        return spikes
 #                        
 #    def build_SI_from_substracted_zl(self,ch, taper_nch = 20):
 #        """Modify the SI to have fit with a smoothly decaying ZL
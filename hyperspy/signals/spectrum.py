@@ -19,13 +19,67 @@
 
 import numpy as np
 import scipy as sp
+import matplotlib.pyplot as plt
 
 from hyperspy.signal import Signal
+from hyperspy import messages
 from hyperspy.misc import progressbar
 from hyperspy.misc import utils
 from hyperspy.misc import utils_varia
 from hyperspy.gui.tools import Calibration
 
+def _repair_spikes(spectra, centres, subst_width, int_window = 20,
+                   polynomial_order = 4):
+    """Replaces in place the channels around the spikes of a set of spectra
+    by a polynomial fitted by least squares to the channels at both sides.
+    
+    All the spikes are repaired at once by solving a batch of small 
+    normal equations.
+    
+    Parameters
+    ----------
+    spectra : numpy array of shape (number of spectra, number of channels)
+    centres : numpy array of ints
+        The channel of the spike of each spectrum.
+    subst_width : int or numpy array of ints
+        Radius of the interval around each spike to substitute.
+    int_window : int
+        Radius of the interval around each spike used to fit the 
+        polynomial.
+    polynomial_order : int
+        
+    Returns
+    -------
+    Boolean array that is False for the spikes that could not be repaired
+    because there were not enough channels to fit the polynomial.
+    """
+    n_ch = spectra.shape[1]
+    offsets = np.arange(-int_window, int_window + 1)
+    positions = np.asarray(centres)[:, np.newaxis] + offsets
+    inside = (positions >= 0) & (positions < n_ch)
+    positions = positions.clip(0, n_ch - 1)
+    subst_width = np.asarray(subst_width)
+    if subst_width.shape:
+        subst_width = subst_width[:, np.newaxis]
+    replace = inside & (np.abs(offsets) <= subst_width)
+    fit = (inside & (replace == False)).astype('float64')
+    rows = np.arange(len(positions))[:, np.newaxis]
+    y = spectra[rows, positions].astype('float64')
+    A = (offsets[:, np.newaxis] / float(int_window)) ** \
+    np.arange(polynomial_order + 1)
+    repaired = fit.sum(1) > polynomial_order
+    if not repaired.any():
+        return repaired
+    # Normal equations of the weighted least squares fit of each spike
+    G = np.einsum('kj,ji,jl->kil', fit[repaired], A, A)
+    b = np.einsum('kj,ji->ki', fit[repaired] * y[repaired], A)
+    coefficients = np.linalg.solve(G, b[..., np.newaxis])[..., 0]
+    fitted = np.dot(coefficients, A.T)
+    replace = replace[repaired]
+    spectra[(rows[repaired] * np.ones(replace.shape, dtype = int))[replace],
+            positions[repaired][replace]] = fitted[replace]
+    return repaired
+
 class Spectrum(Signal):
     """
     """
@@ -48,14 +102,123 @@ class Spectrum(Signal):
             data[(slice(None),)*axis + (pixel, Ellipsis)] = \
             (data[(slice(None),)*axis + (pixel - 1, Ellipsis)] + \
             data[(slice(None),)*axis + (pixel + 1, Ellipsis)]) / 2.
+        self._clear_cache()
         self._replot()
 
+    def get_cumulative_sum(self, dtype = None):
+        """Returns the cumulative sum of the data along the signal axis.
+        
+        A zero is prepended to the signal axis so that the sum of the 
+        channels i1:i2 is simply cumsum[..., i2] - cumsum[..., i1]. The 
+        result is cached until the data is assigned, e.g. s.data *= 2, or
+        modified by a method of the signal. Item assignments such as 
+        s.data[0] = 1 are not detected: reassign the data afterwards, 
+        s.data = s.data, to discard the cached sum.
+        
+        The cumulative sum is as big as the data in the accumulator type, 
+        e.g. 8 times the size of uint8 data with float64, and it is kept 
+        while it is cached. For data stored on disk it is computed chunk by
+        chunk and stored in a temporary file instead of in memory.
+
+        Parameters
+        ----------
+        dtype : None or numpy dtype
+            The type of the accumulator. If None, float64 is used when the 
+            data is of integer or boolean type and the data type otherwise.
+
+        Returns
+        -------
+        numpy array with the same shape as the data except in the signal 
+        axis, that is one channel longer.
+
+        See also
+        --------
+        integrate_in_index_range, integrate_in_units_range
+        """
+        axis = self.axes_manager._slicing_axes[0].index_in_array
+        if dtype is None:
+            if self.data.dtype.kind in ('f', 'c'):
+                dtype = self.data.dtype
+            else:
+                dtype = np.float64
+        dtype = np.dtype(dtype)
+        cumsum = self._get_cached(('cumsum', dtype))
+        if cumsum is None:
+            shape = list(self.data.shape)
+            shape[axis] += 1
+            if self._is_lazy():
+                cumsum = utils.get_temporary_memmap(shape, dtype)
+                chunks = self._iterate_navigation_chunks()
+            else:
+                cumsum = np.empty(shape, dtype = dtype)
+                chunks = [(Ellipsis,)]
+            for chunk_slices in chunks:
+                out = cumsum[chunk_slices]
+                out[(slice(None),) * axis + (0, Ellipsis)] = 0
+                np.cumsum(np.asarray(self.data[chunk_slices]), axis = axis, 
+                          dtype = dtype, 
+                          out = out[(slice(None),) * axis + 
+                                    (slice(1, None), Ellipsis)])
+            self._set_cached(('cumsum', dtype), cumsum)
+        return cumsum
+
+    def integrate_in_index_range(self, i1 = None, i2 = None, dtype = None):
+        """Sums the channels i1:i2 of all the spectra using the cached
+        cumulative sum, so that the cost of each window is independent of
+        its width.
+
+        Parameters
+        ----------
+        i1, i2 : None or int
+            The range as in a python slice
+        dtype : None or numpy dtype
+            see get_cumulative_sum
+
+        Returns
+        -------
+        numpy array with the navigation shape
+        """
+        axis = self.axes_manager._slicing_axes[0]
+        i1, i2, step = slice(i1, i2).indices(axis.size)
+        i2 = max(i1, i2)
+        cumsum = self.get_cumulative_sum(dtype)
+        return cumsum.take(i2, axis.index_in_array) - \
+        cumsum.take(i1, axis.index_in_array)
+
+    def integrate_in_units_range(self, x1 = None, x2 = None, dtype = None):
+        """Integrates all the spectra in the given range of the signal 
+        axis units.
+
+        Parameters
+        ----------
+        x1, x2 : None or float
+        dtype : None or numpy dtype
+            see get_cumulative_sum
+
+        Returns
+        -------
+        numpy array with the navigation shape
+
+        See also
+        --------
+        integrate_in_index_range
+        """
+        axis = self.axes_manager._slicing_axes[0]
+        return axis.scale * self.integrate_in_index_range(
+            axis.value2index(x1), axis.value2index(x2), dtype)
+
 
     def align_with_array_1D(self, shift_array, axis = -1,
-                            interpolation_method = 'linear'):
+                            interpolation_method = 'linear',
+                            max_chunk_size = None):
         """Shift each one dimensional object by the amount specify by a given
         array
 
+        The data is processed in chunks, the spectra of each chunk being 
+        shifted at once for the 'linear', 'nearest' and 'fourier' methods.
+        The data is cropped to the range that is defined for all the 
+        spectra after the shift.
+
         Parameters
         ----------
         shift_map : numpy array
@@ -63,27 +226,50 @@ class Spectrum(Signal):
         interpolation_method : str or int
             Specifies the kind of interpolation as a string ('linear',
             'nearest', 'zero', 'slinear', 'quadratic, 'cubic') or as an integer
-            specifying the order of the spline interpolator to use.
+            specifying the order of the spline interpolator to use. 
+            Additionally 'fourier' shifts the spectra by a phase shift of 
+            their Fourier transform, which is appropriate for band limited 
+            data.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
+
+        See also
+        --------
+        utils.shift_1D
         """
 
         axis = self._get_positive_axis_index_index(axis)
         coord = self.axes_manager.axes[axis]
         offset = coord.offset
         _axis = coord.axis.copy()
-        maxval = np.cumprod(shift_array.shape)[-1] - 1
-        pbar = progressbar.progressbar(maxval = maxval)
-        i = 0
-        for dat, shift in zip(self.iterate_axis(axis),
-                              utils.iterate_axis(shift_array, axis)):
-                si = sp.interpolate.interp1d(_axis ,dat,
-                                             bounds_error = False,
-                                             fill_value = 0.,
-                                             kind = interpolation_method)
-                coord.offset = offset - shift[0]
-                dat[:] = si(coord.axis)
-                pbar.update(i)
-                i += 1
-        coord.offset = offset
+        ndim = len(self.data.shape)
+        vectorized = interpolation_method in ('linear', 'nearest', 'fourier')
+        if ndim == 1:
+            chunks = [(Ellipsis,)]
+        else:
+            chunks = list(self._iterate_chunks(1 if axis == 0 else 0,
+                                               max_chunk_size))
+        pbar = progressbar.progressbar(maxval = len(chunks))
+        for i, chunk_slices in enumerate(chunks):
+            chunk = np.asarray(self.data[chunk_slices])
+            data = np.rollaxis(chunk, axis, ndim)
+            shifts = np.rollaxis(shift_array[chunk_slices], axis, ndim)[..., 0]
+            if vectorized is True:
+                data[:] = utils.shift_1D(data, shifts / coord.scale,
+                                         interpolation_method)
+            else:
+                for index in np.ndindex(shifts.shape):
+                    si = sp.interpolate.interp1d(_axis, data[index],
+                                                 bounds_error = False,
+                                                 fill_value = 0.,
+                                                 kind = interpolation_method)
+                    data[index] = si(_axis - shifts[index])
+            if self._is_lazy():
+                self.data[chunk_slices] = chunk
+            pbar.update(i + 1)
+        pbar.finish()
+        self._clear_cache()
 
         # Cropping time
         mini, maxi = shift_array.min(), shift_array.max()
@@ -92,15 +278,52 @@ class Spectrum(Signal):
         if maxi > 0:
             self.crop_in_units(axis, None, _axis[-1] - maxi)
 
-    def interpolate_in_index_1D(self, axis, i1, i2, delta = 3, **kwargs):
+    def interpolate_in_index_1D(self, axis, i1, i2, delta = 3, 
+                                max_chunk_size = None, **kwargs):
+        """Replaces the channels i1:i2 of a given axis by an interpolation 
+        of the delta channels at each side.
+
+        Since all the spectra are interpolated at the same positions, the 
+        interpolation weights are computed once by interpolating the 
+        identity matrix and they are applied to chunks of spectra at once 
+        as a matrix product.
+
+        Parameters
+        ----------
+        axis : int
+        i1, i2 : int
+            The range of channels to interpolate.
+        delta : int
+            Number of channels at each side of the range used to compute 
+            the interpolation.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
+        **kwargs
+            Passed to scipy.interpolate.interp1d, e.g. kind.
+        """
         axis = self.axes_manager.axes[axis]
+        ia = axis.index_in_array
+        ndim = len(self.data.shape)
         i0 = int(np.clip(i1 - delta, 0, np.inf))
         i3 = int(np.clip(i2 + delta, 0, axis.size))
-        for dat in self.iterate_axis(axis.index_in_array):
-            dat_int = sp.interpolate.interp1d(range(i0,i1) + range(i2,i3),
-                dat[i0:i1].tolist() + dat[i2:i3].tolist(),
-                **kwargs)
-            dat[i1:i2] = dat_int(range(i1,i2))
+        known = np.hstack((np.arange(i0, i1), np.arange(i2, i3)))
+        # weights[j, k] is the contribution of the known channel j to the 
+        # interpolated channel k
+        weights = sp.interpolate.interp1d(known, np.eye(len(known)), 
+                                          **kwargs)(np.arange(i1, i2))
+        if ndim == 1:
+            chunks = [(Ellipsis,)]
+        else:
+            chunks = list(self._iterate_chunks(1 if ia == 0 else 0,
+                                               max_chunk_size))
+        for chunk_slices in chunks:
+            chunk = np.asarray(self.data[chunk_slices])
+            data = np.rollaxis(chunk, ia, ndim)
+            data[..., i1:i2] = np.dot(data[..., known], weights)
+            if self._is_lazy():
+                self.data[chunk_slices] = chunk
+        self._clear_cache()
 
     def interpolate_in_units_1D(self, axis, u1, u2, delta = 3, **kwargs):
         axis = self.axes_manager.axes[axis]
@@ -112,7 +335,8 @@ class Spectrum(Signal):
     def estimate_shift_in_index_1D(self, irange = (None,None), axis = -1,
                                    reference_indexes = None, max_shift = None,
                                    interpolate = True,
-                                   number_of_interpolation_points = 5):
+                                   number_of_interpolation_points = 5,
+                                   max_chunk_size = None):
         """Estimate the shifts in a given axis using cross-correlation
 
         This method can only estimate the shift by comparing unidimensional
@@ -121,7 +345,10 @@ class Spectrum(Signal):
         the results it is convenient to select the feature of interest setting
         the irange keyword.
 
-        By default interpolation is used to obtain subpixel precision.
+        The cross-correlations are computed by FFT for all the spectra of a 
+        chunk of data at once. By default the position of the maximum of 
+        the cross-correlation is refined by fitting a parabola to the 
+        maximum and its two neighbours to obtain subpixel precision.
 
         Parameters
         ----------
@@ -134,46 +361,81 @@ class Spectrum(Signal):
             Defines the coordinates of the spectrum that will be used as a
             reference. If None the spectrum of 0 coordinates will be used.
         max_shift : int
-
+            If not None, the maximum of the cross-correlation is only 
+            searched for shifts of up to max_shift channels.
         interpolate : bool
-
+            Whether to refine the shifts to subpixel precision.
         number_of_interpolation_points : int
-            Number of interpolation points. Warning: making this number too big
-            can saturate the memory
+            Deprecated. It is ignored since the subpixel precision does not
+            rely on the interpolation of the data any more.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
 
         Return
         ------
         An array with the result of the estimation
         """
-
-        ip = number_of_interpolation_points + 1
+        if number_of_interpolation_points != 5:
+            messages.warning(
+            "number_of_interpolation_points is deprecated and ignored, the "
+            "shifts are refined by fitting a parabola to the maximum of the "
+            "cross-correlation")
         axis = self.axes_manager.axes[axis]
+        ia = axis.index_in_array
+        ndim = len(self.data.shape)
         if reference_indexes is None:
-            reference_indexes = [0,] * (len(self.axes_manager.axes) - 1)
+            reference_indexes = [0,] * (ndim - 1)
         else:
             reference_indexes = list(reference_indexes)
-        reference_indexes.insert(axis.index_in_array, slice(None))
+        reference_indexes.insert(ia, slice(None))
         i1, i2 = irange
-        array_shape = [axis.size for axis in self.axes_manager.axes]
-        array_shape[axis.index_in_array] = 1
-        shift_array = np.zeros(array_shape)
-        ref = self.data[reference_indexes][i1:i2]
-        if interpolate is True:
-            ref = utils.interpolate_1D(ip, ref)
-        for dat, shift in zip(self.iterate_axis(axis.index_in_array),
-                              utils.iterate_axis(shift_array,
-                                                 axis.index_in_array)):
-            dat = dat[i1:i2]
-            if interpolate is True:
-                dat = utils.interpolate_1D(ip, dat)
-            shift[:] = np.argmax(np.correlate(ref, dat,'full')) - len(ref) + 1
-
+        ref = np.asarray(self.data[tuple(reference_indexes)][i1:i2], 
+                         dtype = 'float64')
+        n = len(ref)
+        # Zero padding to compute the linear cross-correlation
+        fft_size = 2 ** int(np.ceil(np.log2(2 * n - 1)))
+        ref_fft = np.fft.rfft(ref, fft_size)
+        max_lag = n - 1
         if max_shift is not None:
-            if interpolate is True:
-                max_shift *= ip
-            shift_array.clip(a_min = -max_shift, a_max = max_shift)
-        if interpolate is True:
-            shift_array /= ip
+            max_lag = int(min(max_lag, abs(max_shift)))
+        lags = np.arange(-max_lag, max_lag + 1)
+        array_shape = list(self.data.shape)
+        array_shape[ia] = 1
+        shift_array = np.zeros(array_shape)
+        if ndim == 1:
+            chunks = [(Ellipsis,)]
+        else:
+            chunks = list(self._iterate_chunks(1 if ia == 0 else 0,
+                                               max_chunk_size))
+        pbar = progressbar.progressbar(maxval = len(chunks))
+        for i, chunk_slices in enumerate(chunks):
+            data = np.rollaxis(np.asarray(self.data[chunk_slices]), ia, 
+                               ndim)[..., i1:i2]
+            # correlation[..., lag] = sum(ref[j + lag] * data[..., j])
+            correlation = np.fft.irfft(
+                ref_fft * np.fft.rfft(data, fft_size).conj(), 
+                fft_size)[..., lags % fft_size]
+            imax = correlation.argmax(-1)
+            shifts = lags[imax].astype('float64')
+            if interpolate is True and len(lags) > 2:
+                # Vertex of the parabola through the maximum and its two 
+                # neighbours
+                correlation = correlation.reshape((-1, len(lags)))
+                imax = imax.ravel()
+                inner = imax.clip(1, len(lags) - 2)
+                rows = np.arange(len(inner))
+                y0 = correlation[rows, inner - 1]
+                y1 = correlation[rows, inner]
+                y2 = correlation[rows, inner + 1]
+                curvature = y0 - 2 * y1 + y2
+                refine = (curvature < 0) & (inner == imax)
+                curvature[refine == False] = -1
+                delta = np.where(refine, 0.5 * (y0 - y2) / curvature, 0)
+                shifts += delta.reshape(shifts.shape)
+            shift_array[chunk_slices] = np.expand_dims(shifts, ia)
+            pbar.update(i + 1)
+        pbar.finish()
         shift_array *= axis.scale
         return shift_array
 
@@ -190,7 +452,9 @@ class Spectrum(Signal):
         the results it is convenient to select the feature of interest setting
         the irange keyword.
 
-        By default interpolation is used to obtain subpixel precision.
+        By default the position of the maximum of the cross-correlation is 
+        refined by fitting a parabola to the maximum and its two neighbours
+        to obtain subpixel precision.
 
         Parameters
         ----------
@@ -203,13 +467,14 @@ class Spectrum(Signal):
         reference_indexes : tuple of ints or None
             Defines the coordinates of the spectrum that will be used as a
             reference. If None the spectrum of 0 coordinates will be used.
-        max_shift : float
-
+        max_shift : None or float
+            If not None, the maximum of the cross-correlation is only 
+            searched for shifts of up to max_shift in the units of the axis.
         interpolate : bool
-
+            Whether to refine the shifts to subpixel precision.
         number_of_interpolation_points : int
-            Number of interpolation points. Warning: making this number too big
-            can saturate the memory
+            Deprecated. It is ignored since the subpixel precision does not
+            rely on the interpolation of the data any more.
 
         Return
         ------
@@ -229,6 +494,7 @@ class Spectrum(Signal):
                                    irange = (i1, i2),
                                    reference_indexes = reference_indexes,
                                    max_shift = max_shift,
+                                   interpolate = interpolate,
                                    number_of_interpolation_points =
                                    number_of_interpolation_points)
 
@@ -244,7 +510,9 @@ class Spectrum(Signal):
         the results it is convenient to select the feature of interest setting
         the irange keyword.
 
-        By default interpolation is used to obtain subpixel precision.
+        By default the position of the maximum of the cross-correlation is 
+        refined by fitting a parabola to the maximum and its two neighbours
+        to obtain subpixel precision.
 
         It is possible to align several signals using the shift map estimated
         for this signal using the also_align keyword.
@@ -260,13 +528,14 @@ class Spectrum(Signal):
         reference_indexes : tuple of ints or None
             Defines the coordinates of the spectrum that will be used as a
             reference. If None the spectrum of 0 coordinates will be used.
-        max_shift : float
-
+        max_shift : None or float
+            If not None, the maximum of the cross-correlation is only 
+            searched for shifts of up to max_shift in the units of the axis.
         interpolate : bool
-
+            Whether to refine the shifts to subpixel precision.
         number_of_interpolation_points : int
-            Number of interpolation points. Warning: making this number too big
-            can saturate the memory
+            Deprecated. It is ignored since the subpixel precision does not
+            rely on the interpolation of the data any more.
 
         also_align : list of signals
             A list of Signal instances that has exactly the same dimensions
@@ -292,7 +561,8 @@ class Spectrum(Signal):
         for signal in also_align:
             signal.align_with_array_1D(shift_array = shift_array, axis = axis)
     def peakfind_1D(self, xdim=None,slope_thresh=0.5, amp_thresh=None, subchannel=True,
-                    medfilt_radius=5, maxpeakn=30000, peakgroup=10):
+                    medfilt_radius=5, maxpeakn=30000, peakgroup=10,
+                    parallel=None):
         """Find peaks along a 1D line (peaks in spectrum/spectra).
 
         Function to locate the positive peaks in a noisy x-y data set.
@@ -337,157 +607,512 @@ class Spectrum(Signal):
         subpix : bool (optional)
                  default is set to True
 
+        parallel : None or int (optional)
+                   number of threads, see Signal.map
+
         Returns
         -------
         P : array of shape (npeaks, 3)
             contains position, height, and width of each peak
         """
-        from peak_char import one_dim_findpeaks
-        if len(self.data.shape)==1:
-            # preallocate a large array for the results
-            self.peaks=one_dim_findpeaks(self.data, slope_thresh=slope_thresh, amp_thresh=amp_thresh,
-                                         medfilt_radius=medfilt_radius, maxpeakn=maxpeakn,
-                                         peakgroup=peakgroup, subchannel=subchannel)
-        elif len(self.data.shape)==2:
-            pbar=progressbar.ProgressBar(maxval=self.data.shape[1]).start()
-            # preallocate a large array for the results
-            # the third dimension is for the number of rows in your data.
-            # assumes spectra are rows of the 2D array, each col is a channel.
-            self.peaks=np.zeros((maxpeakn,3,self.data.shape[0]))
-            for i in xrange(self.data.shape[1]):
-                tmp=one_dim_findpeaks(self.data[i], slope_thresh=slope_thresh,
-                                                    amp_thresh=amp_thresh,
-                                                    medfilt_radius=medfilt_radius,
-                                                    maxpeakn=maxpeakn,
-                                                    peakgroup=peakgroup,
-                                                    subchannel=subchannel)
-                self.peaks[:tmp.shape[0],:,i]=tmp
-                pbar.update(i+1)
-            # trim any extra blank space
-            # works by summing along axes to compress to a 1D line, then finds
-            # the first 0 along that line.
-            trim_id=np.min(np.nonzero(np.sum(np.sum(self.peaks,axis=2),
-                                             axis=1)==0))
-            pbar.finish()
-            self.peaks=self.peaks[:trim_id,:,:]
-        elif len(self.data.shape)==3:
-            # preallocate a large array for the results
-            self.peaks=np.zeros((maxpeakn,3,self.data.shape[0],
-                                 self.data.shape[1]))
-            pbar=progressbar.ProgressBar(maxval=self.data.shape[0]).start()
-            for i in xrange(self.data.shape[0]):
-                for j in xrange(self.data.shape[1]):
-                    tmp=one_dim_findpeaks(self.data[i,j], slope_thresh=slope_thresh, amp_thresh=amp_thresh,
-                                         medfilt_radius=medfilt_radius, maxpeakn=maxpeakn,
-                                         peakgroup=peakgroup, subchannel=subchannel)
-                    self.peaks[:tmp.shape[0],:,i,j]=tmp
-                pbar.update(i+1)
-            # trim any extra blank space
-            # works by summing along axes to compress to a 1D line, then finds
-            # the first 0 along that line.
-            trim_id=np.min(np.nonzero(np.sum(np.sum(np.sum(self.peaks,axis=3),axis=2),axis=1)==0))
-            pbar.finish()
-            self.peaks=self.peaks[:trim_id,:,:,:]
+        from hyperspy.peak_char import one_dim_findpeaks
+        peaks = self.map(one_dim_findpeaks, out_shape=(), out_dtype=object,
+                         parallel=parallel, slope_thresh=slope_thresh,
+                         amp_thresh=amp_thresh, medfilt_radius=medfilt_radius,
+                         maxpeakn=maxpeakn, peakgroup=peakgroup,
+                         subchannel=subchannel)
+        if self.axes_manager.navigation_dimension == 0:
+            # A single spectrum, map returns the output of the function
+            self.peaks = peaks
+            return
+        peaks = peaks.data
+        # Store the peaks in an array of shape (npeaks, 3, navigation shape)
+        # where npeaks is the maximum number of peaks found in a spectrum
+        npeaks = max([pixel_peaks.shape[0] for pixel_peaks in peaks.flat])
+        self.peaks = np.zeros((npeaks, 3) + peaks.shape)
+        for index in np.ndindex(peaks.shape):
+            self.peaks[(slice(0, peaks[index].shape[0]), slice(None)) + 
+                       index] = peaks[index]
+
+    def _get_spectra_derivative(self, spectra):
+        """Returns the derivative of a set of spectra stored in the rows of
+        a two dimensional array"""
+        if spectra.dtype.kind == 'u':
+            spectra = spectra.astype('float64')
+        return np.diff(spectra, 1, 1)
+
+    def _process_spikes(self, threshold, mad_factor, subst_width = None,
+                        max_chunk_size = None):
+        """Finds the spikes chunk by chunk and, if subst_width is not None,
+        repairs them. See find_spikes and remove_spikes."""
+        axis = self.axes_manager._slicing_axes[0]
+        ia = axis.index_in_array
+        n_ch = axis.size
+        spikes = []
+        n_spikes = 0
+        unrepaired = 0
+        chunks = list(self._iterate_navigation_chunks(max_chunk_size))
+        pbar = progressbar.progressbar(maxval = len(chunks))
+        for i, chunk_slices in enumerate(chunks):
+            chunk = np.asarray(self.data[chunk_slices])
+            data = self._signal_axis_last(chunk)
+            spectra = data.reshape((-1, n_ch))
+            derivative = self._get_spectra_derivative(spectra)
+            centres = derivative.argmax(1)
+            maxima = derivative.max(1)
+            if threshold == 'auto':
+                median = np.median(derivative, 1)
+                mad = np.median(np.abs(derivative - median[:, np.newaxis]), 
+                                1)
+                rows = np.where(maxima > median + mad_factor * mad)[0]
+            else:
+                rows = np.where(maxima >= threshold)[0]
+            del derivative
+            if len(rows):
+                index = list(np.unravel_index(rows, data.shape[:-1]))
+                index.insert(ia, centres[rows])
+                for dim, chunk_slice in enumerate(chunk_slices):
+                    if isinstance(chunk_slice, slice) and chunk_slice.start:
+                        index[dim] = index[dim] + chunk_slice.start
+                spikes.append(np.array(index, dtype = int).T)
+            if subst_width is not None and len(rows):
+                if hasattr(subst_width, '__iter__'):
+                    # The widths are given in the order of the spikes
+                    widths = np.asarray(
+                        subst_width[n_spikes:n_spikes + len(rows)])
+                else:
+                    widths = subst_width
+                spikes_spectra = spectra[rows]
+                unrepaired += np.sum(_repair_spikes(
+                    spikes_spectra, centres[rows], widths) == False)
+                spectra[rows] = spikes_spectra
+                data[:] = spectra.reshape(data.shape)
+                if self._is_lazy():
+                    self.data[chunk_slices] = chunk
+            n_spikes += len(rows)
+            pbar.update(i + 1)
+        pbar.finish()
+        if spikes:
+            spikes = np.vstack(spikes)
+        else:
+            spikes = np.zeros((0, len(self.data.shape)), dtype = int)
+        messages.information("%i spikes found" % len(spikes))
+        if unrepaired:
+            messages.warning("%i spikes could not be repaired because they "
+                             "are too close to the edges of the spectrum" 
+                             % unrepaired)
+        return spikes
+
+    def find_spikes(self, threshold = 2200, mad_factor = 10., 
+                    max_chunk_size = None):
+        """Finds the spikes in the SI.
+
+        The spike of each spectrum is located at the maximum of its 
+        derivative, which must be above a threshold. The derivative is 
+        computed chunk by chunk, so the memory usage is bounded by the 
+        chunk size.
+
+        Parameters
+        ----------
+        threshold : float or 'auto'
+            If a float, the threshold of the derivative. A suitable value 
+            can be determined with Spectrum.spikes_diagnosis. If 'auto', 
+            the threshold of each spectrum is the median of its derivative
+            plus mad_factor times its median absolute deviation, which is a
+            robust estimate of the noise.
+        mad_factor : float
+            See threshold.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
+
+        Returns
+        -------
+        An int array with a row per spike that contains its index in the 
+        data array, the index in the signal axis being the channel of 
+        maximum derivative.
+
+        See also
+        --------
+        Spectrum.remove_spikes, Spectrum.spikes_diagnosis, 
+        Spectrum.plot_spikes
+        """
+        return self._process_spikes(threshold, mad_factor, None, 
+                                    max_chunk_size)
 
     def remove_spikes(self, threshold = 2200, subst_width = 5,
-                      coordinates = None):
+                      coordinates = None, mad_factor = 10., 
+                      max_chunk_size = None):
         """Remove the spikes in the SI.
 
         Detect the spikes above a given threshold and fix them by interpolating
         in the give interval. If coordinates is given, it will only remove the
         spikes for the specified spectra.
 
+        The spikes are found as in find_spikes. The channels around each 
+        spike are substituted by a fourth order polynomial fitted by least 
+        squares to the 20 channels at each side, all the spikes of a chunk 
+        of data being repaired at once.
+
         Parameters:
         ------------
-        threshold : float
+        threshold : float or 'auto'
             A suitable threshold can be determined with
-            Spectrum.spikes_diagnosis
+            Spectrum.spikes_diagnosis. See find_spikes for 'auto'.
         subst_width : tuple of int or int
             radius of the interval around the spike to substitute with the
             interpolation. If a tuple, the dimension must be equal to the
-            number of spikes in the threshold. If int the same value will be
-            applied to all the spikes.
+            number of coordinates if given or to the number of spikes 
+            otherwise, the spikes being in the order returned by 
+            find_spikes. If int the same value will be applied to all the 
+            spikes.
+        coordinates : None or list of tuples
+            If not None, the spike of maximum derivative of each of the
+            given spectra is removed regardless of the threshold.
+        mad_factor : float
+            See find_spikes.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
+
+        Returns
+        -------
+        The spikes as returned by find_spikes.
 
         See also
         --------
-        Spectrum.spikes_diagnosis, Spectrum.plot_spikes
+        Spectrum.find_spikes, Spectrum.spikes_diagnosis, 
+        Spectrum.plot_spikes
         """
-        from scipy.interpolate import UnivariateSpline
-
-        int_window = 20
-        dc = self.data
-        # differentiate the last axis
-        der = np.diff(dc,1)
-        E_ax = self.axes_manager.axes[-1].axis
-        n_ch = E_ax.size
-        index = 0
         if coordinates is None:
-            if len(dc.shape)==3:
-                for i in xrange(dc.shape[0]):
-                    for j in xrange(dc.shape[1]):
-                        if der[i,j,:].max() >= threshold:
-                            print "Spike detected in (%s, %s)" % (i, j)
-                            argmax = der[i,j,:].argmax()
-                            if hasattr(subst_width, '__iter__'):
-                                subst__width = subst_width[index]
-                            else:
-                                subst__width = subst_width
-                            lp1 = np.clip(argmax - int_window, 0, n_ch)
-                            lp2 = np.clip(argmax - subst__width, 0, n_ch)
-                            rp2 = np.clip(argmax + int_window, 0, n_ch)
-                            rp1 = np.clip(argmax + subst__width, 0, n_ch)
-                            x = np.hstack((E_ax[lp1:lp2], E_ax[rp1:rp2]))
-                            y = np.hstack((dc[i,j,lp1:lp2], dc[i,j,rp1:rp2]))
-                            # The weights were commented because the can produce nans
-                            # Maybe it should be an option?
-                            intp =UnivariateSpline(x,y) #,w = 1/np.sqrt(y))
-                            x_int = E_ax[lp2:rp1+1]
-                            dc[i,j,lp2:rp1+1] = intp(x_int)
-                            index += 1
-            elif len(dc.shape)==2:
-                for i in xrange(dc.shape[0]):
-                        if der[i,:].max() >= threshold:
-                            print "Spike detected in (%s)" % (i)
-                            argmax = der[i,:].argmax()
-                            if hasattr(subst_width, '__iter__'):
-                                subst__width = subst_width[index]
-                            else:
-                                subst__width = subst_width
-                            lp1 = np.clip(argmax - int_window, 0, n_ch)
-                            lp2 = np.clip(argmax - subst__width, 0, n_ch)
-                            rp2 = np.clip(argmax + int_window, 0, n_ch)
-                            rp1 = np.clip(argmax + subst__width, 0, n_ch)
-                            x = np.hstack((E_ax[lp1:lp2], E_ax[rp1:rp2]))
-                            y = np.hstack((dc[i,lp1:lp2], dc[i,rp1:rp2]))
-                            # The weights were commented because the can produce nans
-                            # Maybe it should be an option?
-                            intp =UnivariateSpline(x,y) #,w = 1/np.sqrt(y))
-                            x_int = E_ax[lp2:rp1+1]
-                            dc[i,lp2:rp1+1] = intp(x_int)
-                            index += 1
+            if hasattr(subst_width, '__iter__'):
+                n_spikes = len(self.find_spikes(threshold, mad_factor, 
+                                                max_chunk_size))
+                if len(subst_width) != n_spikes:
+                    messages.warning_exit(
+                    "%i spikes were found but %i subst_width values were "
+                    "given" % (n_spikes, len(subst_width)))
+            spikes = self._process_spikes(threshold, mad_factor, 
+                                          subst_width, max_chunk_size)
+            self._clear_cache()
+            self._replot()
+            return spikes
+        ia = self.axes_manager._slicing_axes[0].index_in_array
+        getitems = []
+        for spike_spectrum in coordinates:
+            getitem = list(spike_spectrum)
+            getitem.insert(ia, slice(None))
+            getitems.append(tuple(getitem))
+        spectra = np.array([self.data[getitem] for getitem in getitems])
+        centres = self._get_spectra_derivative(spectra).argmax(1)
+        _repair_spikes(spectra, centres, subst_width)
+        spikes = []
+        for getitem, spectrum, centre in zip(getitems, spectra, centres):
+            self.data[getitem] = spectrum
+            spikes.append(getitem[:ia] + (centre,) + getitem[ia + 1:])
+        self._clear_cache()
+        self._replot()
+        return np.array(spikes, dtype = int)
+
+    def spikes_diagnosis(self, max_chunk_size = None):
+        """Plots a histogram to help in choosing the threshold for spikes
+        removal.
+        
+        See also
+        --------
+        Spectrum.remove_spikes, Spectrum.plot_spikes
+        """
+        n_ch = self.axes_manager._slicing_axes[0].size
+        maxima = []
+        for chunk_slices in self._iterate_navigation_chunks(max_chunk_size):
+            spectra = self._signal_axis_last(
+                self.data[chunk_slices]).reshape((-1, n_ch))
+            maxima.append(self._get_spectra_derivative(spectra).max(1))
+        plt.figure()
+        plt.hist(np.hstack(maxima), 100)
+        plt.xlabel('Threshold')
+        plt.ylabel('Counts')
+        plt.draw()
+
+    def plot_spikes(self, threshold = 2200, mad_factor = 10.):
+        """Plot the spikes in the given threshold
+        
+        Parameters
+        ----------
+        threshold : float or 'auto'
+        mad_factor : float
+            See find_spikes.
+        
+        Returns
+        -------
+        list of spikes coordinates
+        
+        See also
+        --------
+        Spectrum.remove_spikes, Spectrum.spikes_diagnosis
+        """
+        ia = self.axes_manager._slicing_axes[0].index_in_array
+        n_ch = self.axes_manager._slicing_axes[0].size
+        spikes = []
+        for spike in self.find_spikes(threshold, mad_factor):
+            index = tuple(spike[:ia]) + tuple(spike[ia + 1:])
+            print "Spike detected in ", index
+            spikes.append(index)
+            i1 = np.clip(spike[ia] - 100, 0, n_ch - 1)
+            i2 = np.clip(spike[ia] + 100, 0, n_ch - 1)
+            getitem = list(index)
+            getitem.insert(ia, slice(i1, i2))
+            toplot = self.data[tuple(getitem)]
+            plt.figure()
+            plt.step(range(len(toplot)), toplot)
+            plt.title(str(index))
+        return spikes
+
+    def _signal_axis_last(self, data):
+        """Returns a view of the given data (e.g. a chunk) in which the 
+        signal axis is the last one"""
+        return np.rollaxis(np.asarray(data), 
+                           self.axes_manager._slicing_axes[0].index_in_array,
+                           len(data.shape))
+
+    def power_law_signal_maps(self, windows, max_chunk_size = None):
+        """Integrates the signal above a power law background in one or 
+        several energy windows.
+
+        The background is estimated in each pixel by the two area method. 
+        The data is read only once: for each chunk of the navigation space 
+        the background of all the windows is estimated and the background 
+        subtracted signal integrated before reading the next chunk. 
+        Therefore the memory usage is bounded by the chunk size.
+
+        Parameters
+        ----------
+        windows : list of tuples
+            Each item defines a map as 
+            ((background_E1, background_E2), (signal_E1, signal_E2))
+            in the units of the signal axis.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
+
+        Returns
+        -------
+        List of dictionaries, one per window, with keys 'signal', 'r' and 
+        'A'. The values are signals with the navigation axes of the spectrum,
+        or scalars for a single spectrum.
+
+        See also
+        --------
+        remove_power_law_background, utils.two_area_powerlaw_estimation
+        """
+        axis = self.axes_manager._slicing_axes[0]
+        nav_shape = tuple(self.axes_manager.navigation_shape)
+        nav_index = min([ax.index_in_array for ax in 
+                         self.axes_manager._non_slicing_axes] + [0])
+        parameters = []
+        results = []
+        for (bg_E1, bg_E2), (s_E1, s_E2) in windows:
+            i1, i2, i3 = utils.two_area_indexes(axis, bg_E1, bg_E2)
+            s1 = axis.value2index(s_E1)
+            s2 = axis.value2index(s_E2)
+            parameters.append((i1, i2, i3, bg_E1, axis.axis[i2], 
+                               axis.axis[i3], s1, s2, 
+                               np.log(axis.axis[s1:s2])))
+            results.append({'signal' : np.zeros(nav_shape), 
+                            'r' : np.zeros(nav_shape),
+                            'A' : np.zeros(nav_shape)})
+        chunks = list(self._iterate_navigation_chunks(max_chunk_size))
+        pbar = progressbar.progressbar(maxval = len(chunks))
+        for i, chunk_slices in enumerate(chunks):
+            data = self._signal_axis_last(self.data[chunk_slices])
+            result_slices = chunk_slices[nav_index:]
+            for (i1, i2, i3, E1, E2, E3, s1, s2, logx), result in \
+            zip(parameters, results):
+                I1 = axis.scale * data[..., i1:i3].sum(-1, dtype = 'float64')
+                I2 = axis.scale * data[..., i3:i2].sum(-1, dtype = 'float64')
+                r, A = utils.powerlaw_from_areas(I1, I2, E1, E2, E3)
+                bg = A * np.exp(-r[..., np.newaxis] * logx).sum(-1)
+                result['signal'][result_slices] = axis.scale * (
+                    data[..., s1:s2].sum(-1, dtype = 'float64') - bg)
+                result['r'][result_slices] = r
+                result['A'][result_slices] = A
+            pbar.update(i + 1)
+        pbar.finish()
+        for result in results:
+            for key in result.keys():
+                result[key] = self._get_navigation_signal(result[key])
+        return results
+
+    def remove_power_law_background(self, E1, E2, inplace = False, 
+                                    max_chunk_size = None):
+        """Subtracts a power law background estimated by the two area method
+        in the energy window E1-E2.
+        
+        The channels below E2 are set to zero. The data is processed in 
+        chunks of the navigation space, so that no temporary array of the 
+        size of the data is created. If inplace is False and the data is 
+        stored on disk, the result is stored in a temporary file.
+
+        Parameters
+        ----------
+        E1, E2 : float
+            The limits of the background window in the units of the signal 
+            axis.
+        inplace : bool
+            If True, the data of the current spectrum is modified, what 
+            requires it to be of floating point type. Otherwise a new 
+            spectrum is returned.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
 
+        Returns
+        -------
+        A spectrum of the same class if inplace is False.
+
+        See also
+        --------
+        power_law_signal_maps
+        """
+        axis = self.axes_manager._slicing_axes[0]
+        i1, i2, i3 = utils.two_area_indexes(axis, E1, E2)
+        E2 = axis.axis[i2]
+        E3 = axis.axis[i3]
+        logx = np.log(axis.axis[i2:])
+        if inplace is True:
+            if self.data.dtype.kind not in ('f', 'c'):
+                messages.warning_exit(
+                "The background can only be removed in place from floating "
+                "point data")
+            out = self.data
         else:
-            for spike_spectrum in coordinates:
-                i, j = spike_spectrum
-                print "Spike detected in (%s, %s)" % (i, j)
-                argmax = der[:,i,j].argmax()
-                if hasattr(subst_width, '__iter__'):
-                    subst__width = subst_width[index]
-                else:
-                    subst__width = subst_width
-                lp1 = np.clip(argmax - int_window, 0, n_ch)
-                lp2 = np.clip(argmax - subst__width, 0, n_ch)
-                rp2 = np.clip(argmax + int_window, 0, n_ch)
-                rp1 = np.clip(argmax + subst__width, 0, n_ch)
-                x = np.hstack((E_ax[lp1:lp2], E_ax[rp1:rp2]))
-                y = np.hstack((dc[lp1:lp2,i,j], dc[rp1:rp2,i,j]))
-                # The weights were commented because the can produce nans
-                # Maybe it should be an option?
-                intp =UnivariateSpline(x,y) # ,w = 1/np.sqrt(y))
-                x_int = E_ax[lp2:rp1+1]
-                dc[lp2:rp1+1,i,j] = intp(x_int)
-                index += 1
-        self.data=dc
+            if self.data.dtype.kind in ('f', 'c'):
+                dtype = self.data.dtype
+            else:
+                dtype = np.float64
+            if self._is_lazy():
+                out = utils.get_temporary_memmap(self.data.shape, dtype)
+            else:
+                out = np.empty(self.data.shape, dtype = dtype)
+        chunks = list(self._iterate_navigation_chunks(max_chunk_size))
+        pbar = progressbar.progressbar(maxval = len(chunks))
+        for i, chunk_slices in enumerate(chunks):
+            data = self._signal_axis_last(self.data[chunk_slices])
+            I1 = axis.scale * data[..., i1:i3].sum(-1, dtype = 'float64')
+            I2 = axis.scale * data[..., i3:i2].sum(-1, dtype = 'float64')
+            r, A = utils.powerlaw_from_areas(I1, I2, E1, E2, E3)
+            chunk = np.asarray(out[chunk_slices])
+            out_chunk = self._signal_axis_last(chunk)
+            out_chunk[..., i2:] = data[..., i2:] - A[..., np.newaxis] * \
+            np.exp(-r[..., np.newaxis] * logx)
+            out_chunk[..., :i2] = 0
+            if not isinstance(out, np.ndarray):
+                # e.g. an h5py dataset, that is not modified through views
+                out[chunk_slices] = chunk
+            pbar.update(i + 1)
+        pbar.finish()
+        if inplace is True:
+            self._clear_cache()
+            self._replot()
+        else:
+            return self._deepcopy_with_new_data(out)
+
+    def calculate_FWHM_maps(self, factor = 0.5, signal_range = (None, None),
+                            max_chunk_size = None):
+        """Estimates the width, centre and height of the highest peak of 
+        every spectrum.
+        
+        The spectra are processed in chunks of the navigation space. The 
+        centre and height of each peak are given by the vertex of the 
+        parabola through its maximum and the two neighbouring channels, and
+        the positions where the peak crosses factor times its height at 
+        both sides of the maximum are found by linear interpolation.
+        
+        Parameters
+        ----------
+        factor : float < 1
+            By default is 0.5 to give FWHM. Choose any other float to give
+            find the position of a different fraction of the peak.
+        signal_range : tuple of floats
+            Range of the signal axis in its units where the peak is 
+            searched, e.g. (-2, 2) for the zero loss peak of an EELS 
+            spectrum. If None the range is not limited in that side.
+        max_chunk_size : None or int
+            Maximum size in bytes of the chunks of data. If None, 
+            signal.default_max_chunk_size is used.
+        
+        Returns
+        -------
+        Dictionary of signals with the navigation axes of the spectrum, or
+        of scalars for a single spectrum. Keys:
+            'FWHM' : width at the given fraction of the height
+            'left', 'right' : positions of the crossings
+            'centre' : position of the maximum
+            'height' : height of the maximum
+        The values are nan for the peaks whose crossings could not be found
+        in the given range.
+        """
+        axis = self.axes_manager._slicing_axes[0]
+        ia = axis.index_in_array
+        i1 = axis.value2index(signal_range[0])
+        i2 = axis.value2index(signal_range[1])
+        x = axis.axis[i1:i2]
+        size = len(x)
+        nav_shape = self.data.shape[:ia] + self.data.shape[ia + 1:]
+        results = {}
+        for key in ('FWHM', 'left', 'right', 'centre', 'height'):
+            results[key] = np.zeros(nav_shape)
+        channels = np.arange(size)
+        chunks = list(self._iterate_navigation_chunks(max_chunk_size))
+        pbar = progressbar.progressbar(maxval = len(chunks))
+        for i, chunk_slices in enumerate(chunks):
+            data = self._signal_axis_last(self.data[chunk_slices])
+            chunk_nav_shape = data.shape[:-1]
+            y = data[..., i1:i2].reshape((-1, size)).astype('float64')
+            rows = np.arange(y.shape[0])
+            imax = y.argmax(1)
+            # Parabolic interpolation of the maximum
+            inner = imax.clip(1, max(size - 2, 1))
+            y0 = y[rows, (inner - 1).clip(0, size - 1)]
+            y1 = y[rows, inner]
+            y2 = y[rows, (inner + 1).clip(0, size - 1)]
+            curvature = y0 - 2 * y1 + y2
+            refine = (curvature < 0) & (inner == imax)
+            curvature[refine == False] = -1
+            delta = np.where(refine, 0.5 * (y0 - y2) / curvature, 0)
+            height = np.where(refine, y1 - 0.25 * (y0 - y2) * delta, 
+                              y[rows, imax])
+            centre = x[imax] + delta * axis.scale
+            # Linear interpolation of the crossings closest to the maximum
+            level = factor * height
+            below = y < level[:, np.newaxis]
+            jl = np.where(below & (channels < imax[:, np.newaxis]), 
+                          channels, -1).max(1)
+            jr = np.where(below & (channels > imax[:, np.newaxis]), 
+                          channels, size).min(1)
+            found_left = jl >= 0
+            found_right = jr < size
+            jl = jl.clip(0, size - 2)
+            jr = jr.clip(1, size - 1)
+            left = x[jl] + axis.scale * (level - y[rows, jl]) / (
+                y[rows, jl + 1] - y[rows, jl])
+            right = x[jr - 1] + axis.scale * (level - y[rows, jr - 1]) / (
+                y[rows, jr] - y[rows, jr - 1])
+            left[found_left == False] = np.nan
+            right[found_right == False] = np.nan
+            if ia < len(chunk_slices) - 1:
+                result_slices = chunk_slices[:ia] + chunk_slices[ia + 1:]
+            else:
+                result_slices = chunk_slices
+            for key, value in (('FWHM', right - left), ('left', left), 
+                               ('right', right), ('centre', centre), 
+                               ('height', height)):
+                results[key][result_slices] = value.reshape(chunk_nav_shape)
+            pbar.update(i + 1)
+        pbar.finish()
+        for key in results.keys():
+            results[key] = self._get_navigation_signal(results[key])
+        return results
 
     def to_image(self):
         from hyperspy.signals.image import Image
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import h5py
+from nose.tools import assert_true, assert_equal, assert_raises, \
+    with_setup
+
+from hyperspy.io import load
+from hyperspy.signals.spectrum import Spectrum
+
+data = np.arange(4 * 5 * 6, dtype = 'float64').reshape((4, 5, 6))
+tmp_dir = None
+my_path = os.path.dirname(__file__)
+
+def make_tmp_dir():
+    global tmp_dir
+    tmp_dir = tempfile.mkdtemp(prefix = 'hyperspy-')
+
+def remove_tmp_dir():
+    shutil.rmtree(tmp_dir)
+
+def save_spectrum(filename, compression = None):
+    """Saves data in a hdf5 file. If compression is not None the dataset 
+    is compressed, so that it cannot be memory-mapped."""
+    s = Spectrum({'data' : data})
+    s.mapped_parameters.name = 'test'
+    s.mapped_parameters.record_by = 'spectrum'
+    s.mapped_parameters.signal = ''
+    filename = os.path.join(tmp_dir, filename)
+    s.save(filename)
+    if compression is not None:
+        f = h5py.File(filename, mode = 'a')
+        group = f['Experiments']['test']
+        del group['data']
+        group.create_dataset('data', data = data, compression = compression)
+        f.close()
+    return filename
+
+@with_setup(make_tmp_dir, remove_tmp_dir)
+def test_memmap():
+    s = load(save_spectrum('memmap.hdf5'), lazy = True)
+    assert_true(isinstance(s.data, np.memmap))
+    assert_true(np.all(s.sum(-1, return_signal = True).data == 
+                       data.sum(-1)))
+    s.crop_in_pixels(2, 1, 4)
+    assert_true(isinstance(s.data, np.memmap))
+    assert_true(np.all(s.data == data[..., 1:4]))
+    # The memmap is written chunk by chunk
+    s.save(os.path.join(tmp_dir, 'copy.hdf5'))
+    assert_true(np.all(load(os.path.join(tmp_dir, 'copy.hdf5')).data == 
+                       data[..., 1:4]))
+
+@with_setup(make_tmp_dir, remove_tmp_dir)
+def test_h5py_dataset():
+    s = load(save_spectrum('compressed.hdf5', 'gzip'), lazy = True)
+    assert_true(isinstance(s.data, h5py.Dataset))
+    assert_true(np.allclose(s.mean(0, return_signal = True).data, 
+                            data.mean(0)))
+    assert_true(np.all(s.sum(-1, return_signal = True).data == 
+                       data.sum(-1)))
+    # The dataset is written chunk by chunk
+    s.save(os.path.join(tmp_dir, 'copy.hdf5'))
+    assert_true(np.all(load(os.path.join(tmp_dir, 'copy.hdf5')).data == 
+                       data))
+    dataset = s.data
+    s.load_to_memory()
+    assert_true(isinstance(s.data, np.ndarray))
+    assert_true(not isinstance(s.data, np.memmap))
+    assert_true(np.all(s.data == data))
+    # load_to_memory closes the file
+    assert_true(not dataset.id.valid)
+
+@with_setup(make_tmp_dir, remove_tmp_dir)
+def test_crop_h5py_dataset():
+    s = load(save_spectrum('compressed.hdf5', 'gzip'), lazy = True)
+    s.crop_in_pixels(1, 1, 3)
+    assert_true(isinstance(s.data, np.memmap))
+    assert_equal(s.data.shape, (4, 2, 6))
+    assert_true(np.all(s.data == data[:, 1:3]))
+    s.close()
+
+def test_lazy_not_supported():
+    filename = os.path.join(my_path, 'dm3_1D_data', 'test-1.dm3')
+    assert_raises(SystemExit, load, filename, lazy = True)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true
+
+def get_random_matrix(shape, rank = None, seed = 0):
+    """Returns a matrix of uniform random numbers in [0, 1) or, if rank is
+    not None, the (non-negative) product of two such matrices of that 
+    rank"""
+    random = np.random.RandomState(seed)
+    if rank is None:
+        return random.rand(*shape)
+    return np.dot(random.rand(shape[0], rank), random.rand(rank, shape[1]))
+
+def assert_same_columns(a, b):
+    """The components are defined up to their sign"""
+    signs = np.sign((a * b).sum(0))
+    assert_true(np.allclose(a, b * signs))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true, assert_equal
+
+from hyperspy.learn.data_operator import UnfoldedData, TreatedData
+from hyperspy.tests.learn.common import get_random_matrix
+
+def get_unfolded_data():
+    """Returns an UnfoldedData of an array of shape (4, 6, 5) with the 
+    signal in the second axis and the same matrix as an array"""
+    data = get_random_matrix((24, 5)).reshape((4, 6, 5))
+    return (UnfoldedData(data, [0, 2], [1]), 
+            data.transpose(0, 2, 1).reshape((20, 6)).T)
+
+def test_unfolded_data_columns():
+    unfolded, X = get_unfolded_data()
+    assert_equal(unfolded.shape, X.shape)
+    for columns in (slice(None), slice(3, 12), [1, 2, 3], [0, 7, 19], 
+                    [12, 2, 13]):
+        assert_true(np.allclose(unfolded[:, columns], X[:, columns]))
+    assert_true(np.allclose(unfolded[[1, 4], [0, 17]], X[[1, 4]][:, [0, 17]]))
+    assert_equal(unfolded[:, []].shape, (6, 0))
+
+def test_treated_unfolded_data_blocks():
+    unfolded, X = get_unfolded_data()
+    navigation_mask = np.ones(20, dtype = 'bool')
+    navigation_mask[[3, 4, 11]] = False
+    signal_mask = np.ones(6, dtype = 'bool')
+    signal_mask[0] = False
+    treated = TreatedData(unfolded, navigation_mask, signal_mask, 
+                          max_chunk_size = 8 * 6 * 4)
+    treated.center()
+    masked = X[:, navigation_mask]
+    centered = masked - masked[signal_mask].mean(0)
+    # Blocks of contiguous and of sparse columns
+    for j0, j1 in ((0, 3), (2, 6), (0, 17)):
+        assert_true(np.allclose(treated.get_block(j0, j1), 
+                                centered[signal_mask, j0:j1]))
+        assert_true(np.allclose(treated.get_block(j0, j1, all_rows = True),
+                                centered[:, j0:j1]))
+    assert_true(np.allclose(treated.to_array(), centered[signal_mask]))
+    assert_true(np.allclose(treated.gram(), 
+        np.dot(centered[signal_mask], centered[signal_mask].T)))
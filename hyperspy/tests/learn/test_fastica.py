@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true
+
+from hyperspy.learn.fastica import fastica
+
+def get_whitened_mixture():
+    """Returns the whitened mixture of a uniform and a laplacian source, 
+    the whitening and the mixing matrices"""
+    random = np.random.RandomState(0)
+    n = 5000
+    sources = np.array([random.uniform(-1, 1, n), random.laplace(size = n)])
+    mixing = np.array([[1., 0.5], [0.3, 1.]])
+    X = np.dot(mixing, sources).T
+    X -= X.mean(0)
+    s, u = np.linalg.eigh(np.cov(X.T))
+    whitening = (u / np.sqrt(s)).T
+    return np.dot(X, whitening.T), whitening, mixing
+
+def assert_unmixes(W, whitening, mixing):
+    """Up to permutation and scale, the unmixing matrix inverts the mixing
+    matrix"""
+    product = np.abs(np.dot(np.dot(W, whitening), mixing))
+    product /= product.max(1)[:, np.newaxis]
+    assert_true(np.allclose(np.sort(product, 1), [[0, 1], [0, 1]], 
+                            atol = 0.1))
+
+def test_fastica_recovers_the_sources():
+    X, whitening, mixing = get_whitened_mixture()
+    for fun in ('logcosh', 'exp', 'cube'):
+        W = fastica(X, fun = fun, n_restarts = 2, random_state = 0)
+        assert_unmixes(W, whitening, mixing)
+
+def test_parallel_restarts():
+    X, whitening, mixing = get_whitened_mixture()
+    W = fastica(X, n_restarts = 3, random_state = 0)
+    parallel_W = fastica(X, n_restarts = 3, random_state = 0, parallel = 2)
+    assert_true(np.allclose(W, parallel_W))
+    assert_unmixes(parallel_W, whitening, mixing)
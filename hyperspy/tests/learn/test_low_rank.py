@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true, assert_equal
+
+from hyperspy.learn.low_rank import LowRankData, ResidualData
+from hyperspy.tests.learn.common import get_random_matrix
+
+def get_low_rank_data():
+    """Returns a LowRankData of shape (4, 6, 5) with the signal in the 
+    second axis and the same data as an array"""
+    factors = get_random_matrix((6, 2))
+    scores = get_random_matrix((2, 20), seed = 1)
+    # The pixels are numbered in the order of the unfolded data
+    dense = np.dot(factors, scores).T.reshape((4, 5, 6)).transpose(0, 2, 1)
+    return LowRankData(factors, scores, (4, 6, 5), [0, 2], [1]), dense
+
+def test_indexing():
+    data, dense = get_low_rank_data()
+    for index in (Ellipsis, 1, (1, 2), (slice(1, 3), 0, slice(None, None, 2)),
+                  (Ellipsis, 3), (2, slice(None), 4)):
+        result = data[index]
+        assert_equal(result.shape, dense[index].shape)
+        assert_true(np.allclose(result, dense[index]))
+    assert_true(np.allclose(np.asarray(data), dense))
+
+def test_residual():
+    data, dense = get_low_rank_data()
+    residual = ResidualData(dense + 1, data)
+    assert_true(np.allclose(residual[1:3, :, 2], 1))
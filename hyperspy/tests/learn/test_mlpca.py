@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true, assert_almost_equal
+
+from hyperspy.learn.mlpca import _ml_projection
+from hyperspy.tests.learn.common import get_random_matrix
+
+def test_ml_projection():
+    X = get_random_matrix((15, 50))
+    W = get_random_matrix((15, 50), seed = 1) + 0.1
+    U = np.linalg.qr(get_random_matrix((15, 3), seed = 2))[0]
+    MLX, Sobj = _ml_projection(X, W, U, block_size = 16)
+    # Weighted least squares fit of each column
+    expected = np.empty(X.shape)
+    for j in xrange(X.shape[1]):
+        M = np.dot(U.T * W[:, j], U)
+        F = np.linalg.solve(M, np.dot(U.T * W[:, j], X[:, j]))
+        expected[:, j] = np.dot(U, F)
+    assert_true(np.allclose(MLX, expected))
+    assert_almost_equal(Sobj, (W * (X - expected) ** 2).sum())
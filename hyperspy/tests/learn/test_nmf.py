@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true
+
+from hyperspy.learn.nmf import nmf
+from hyperspy.tests.learn.common import get_random_matrix
+
+def test_nmf_reconstruction():
+    X = get_random_matrix((30, 200), rank = 3)
+    for solver in ('mu', 'hals'):
+        W, H, value = nmf(X, 3, solver = solver, max_iter = 2000, 
+                          tol = 1e-10, random_state = 0)
+        assert_true(W.min() >= 0 and H.min() >= 0)
+        error = np.linalg.norm(X - np.dot(W, H)) / np.linalg.norm(X)
+        assert_true(error < 1e-2)
+
+def test_nmf_kullback_leibler():
+    X = get_random_matrix((30, 200), rank = 3)
+    W, H, value = nmf(X, 3, loss = 'kullback-leibler', max_iter = 2000, 
+                      tol = 1e-10, random_state = 0)
+    error = np.linalg.norm(X - np.dot(W, H)) / np.linalg.norm(X)
+    assert_true(error < 1e-2)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true, assert_equal
+
+from hyperspy.learn.svd_pca import pca, randomized_svd, gram_pca
+from hyperspy.learn.data_operator import TreatedData
+from hyperspy.tests.learn.common import get_random_matrix, \
+    assert_same_columns
+
+class NotCopiedData(TreatedData):
+    def to_array(self, all_rows = False):
+        raise AssertionError("The data operator was formed as an array")
+
+def test_svd_of_a_data_operator_does_not_copy_it():
+    # Neither of the shapes has many more rows than columns
+    for shape in ((30, 40), (40, 30)):
+        X = get_random_matrix(shape, rank = 3)
+        v, V = pca(NotCopiedData(X, max_chunk_size = 8 * 40 * 10))
+        expected_v, expected_V = pca(X)
+        assert_equal(V.shape, expected_V.shape)
+        assert_true(np.allclose(V, expected_V))
+        assert_same_columns(v[:, :3], expected_v[:, :3])
+
+def test_randomized_svd():
+    X = get_random_matrix((50, 200), rank = 5)
+    U, S, Vh = np.linalg.svd(X, full_matrices = False)
+    for A in (X, TreatedData(X, max_chunk_size = 8 * 50 * 30)):
+        u, s, vh = randomized_svd(A, 5, random_state = 0)
+        assert_equal(u.shape, (50, 5))
+        assert_equal(vh.shape, (5, 200))
+        assert_true(np.allclose(s, S[:5]))
+        assert_same_columns(u, U[:, :5])
+        assert_same_columns(vh.T, Vh[:5].T)
+
+def test_gram_pca_with_masks():
+    X = get_random_matrix((20, 300), rank = 3)
+    signal_mask = np.ones(X.shape[0], dtype = 'bool')
+    signal_mask[[2, 5]] = False
+    navigation_mask = np.ones(X.shape[1], dtype = 'bool')
+    navigation_mask[::7] = False
+    treated = TreatedData(X, navigation_mask, signal_mask, 
+                          max_chunk_size = 8 * 20 * 50)
+    v, V, pc = gram_pca(treated, output_dimension = 3)
+    masked = X[signal_mask][:, navigation_mask]
+    U, S, Vh = np.linalg.svd(masked, full_matrices = False)
+    assert_true(np.allclose(V, S[:3] ** 2))
+    assert_same_columns(v, Vh[:3].T)
+    # The projection includes the rows that are not in the signal mask
+    assert_equal(pc.shape, (X.shape[0], 3))
+    assert_true(np.allclose(pc, np.dot(X[:, navigation_mask], v)))
+
+def test_number_of_components_does_not_depend_on_the_formulation():
+    # The 'rows', 'columns' and 'svd' formulations of a rank 3 matrix
+    for shape in ((10, 200), (200, 10), (30, 40)):
+        X = get_random_matrix(shape, rank = 3)
+        S = np.linalg.svd(X, compute_uv = False)
+        v, V = pca(X)
+        assert_equal(V.shape, (min(shape),))
+        assert_equal(v.shape, (shape[1], min(shape)))
+        assert_true(np.allclose(V[:3], S[:3] ** 2))
+        v, V = pca(X, output_dimension = 3)
+        assert_equal(V.shape, (3,))
+        assert_equal(v.shape, (shape[1], 3))
+        assert_true(np.allclose(V, S[:3] ** 2))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true, assert_equal, assert_raises
+
+from hyperspy.misc.utils import rebin
+
+def test_fractional_rebin():
+    a = np.arange(1, 7)
+    # The new bins are 1.5 pixels wide and share the pixels 1 and 4
+    expected = np.array([1 + 2 / 2., 2 / 2. + 3, 4 + 5 / 2., 5 / 2. + 6])
+    result = rebin(a, (4,))
+    assert_equal(result.dtype, np.float64)
+    assert_true(np.allclose(result, expected))
+    assert_true(np.allclose(rebin(a, (4,), method = 'mean'), 
+                            expected / 1.5))
+
+def test_fractional_rebin_2D():
+    a = np.arange(24.).reshape((6, 4))
+    result = rebin(a, (4, 2))
+    expected = np.array([a[0] + a[1] / 2., a[1] / 2. + a[2], 
+                         a[3] + a[4] / 2., a[4] / 2. + a[5]])
+    expected = expected[:, ::2] + expected[:, 1::2]
+    assert_true(np.allclose(result, expected))
+    assert_true(np.allclose(result.sum(), a.sum()))
+
+def test_integer_rebin():
+    a = np.arange(24).reshape((6, 4))
+    assert_true(np.all(rebin(a, (3, 2)) == 
+                       a.reshape((3, 2, 2, 2)).sum(3).sum(1)))
+
+def test_invalid_arguments():
+    a = np.arange(6)
+    # The fractions of the pixels would be truncated
+    assert_raises(SystemExit, rebin, a, (4,), 'sum', 'int64')
+    assert_raises(SystemExit, rebin, a, (3,), 'median')
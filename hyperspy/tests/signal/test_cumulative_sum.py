@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true
+
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.misc.utils import get_temporary_memmap
+
+def get_random_data():
+    return np.random.RandomState(0).randint(0, 255, (4, 5, 30)).astype(
+        'uint8')
+
+def test_integrate_in_index_range():
+    data = get_random_data()
+    s = Spectrum({'data' : data})
+    assert_true(np.allclose(s.integrate_in_index_range(3, 17), 
+                            data[..., 3:17].sum(-1)))
+    # Assigning the data discards the cached cumulative sum
+    s.data = s.data * 2
+    assert_true(np.allclose(s.integrate_in_index_range(3, 17), 
+                            2 * data[..., 3:17].sum(-1)))
+
+def test_cumulative_sum_of_data_on_disk():
+    data = get_random_data()
+    memmap = get_temporary_memmap(data.shape, data.dtype)
+    memmap[:] = data
+    s = Spectrum({'data' : memmap})
+    cumsum = s.get_cumulative_sum()
+    assert_true(isinstance(cumsum, np.memmap))
+    assert_true(np.allclose(cumsum[..., 1:], np.cumsum(data, -1)))
+    assert_true(np.all(cumsum[..., 0] == 0))
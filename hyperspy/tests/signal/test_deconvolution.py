@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import math
+
+import numpy as np
+from nose.tools import assert_true
+
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.signals.eels import EELSSpectrum
+from hyperspy.experiments import Experiments
+
+length = 100
+x = np.arange(length, dtype = 'float64')
+
+def gaussian(centre, sigma, area = 1., x = x):
+    return area * np.exp(-(x - centre) ** 2 / (2 * sigma ** 2)) / \
+        (sigma * np.sqrt(2 * np.pi))
+
+def richardson_lucy(D, kernel, iterations):
+    """The direct convolution Richardson-Lucy deconvolution of a single
+    spectrum"""
+    imax = kernel.argmax()
+    mimax = length - 1 - imax
+    O = D.copy()
+    for i in xrange(iterations):
+        first = np.convolve(kernel, O)[imax: imax + length]
+        O = O * np.convolve(kernel[::-1], D / first)[mimax: mimax + length]
+    return O
+
+def get_blurred_spectra():
+    """Returns an SI of shape (2, 3, length) of two gaussian peaks on a 
+    constant background"""
+    data = np.array([gaussian(40 + 5 * i, 2, 100.) + 
+                     gaussian(60, 4, 50.) + 1. for i in xrange(6)])
+    return Spectrum({'data' : data.reshape((2, 3, length))})
+
+def get_expected_richardson_lucy(s, kernel, iterations):
+    D = s.data.reshape((-1, length))
+    kernel = kernel.reshape((-1, length))
+    if len(kernel) == 1:
+        kernel = kernel.repeat(len(D), 0)
+    return np.array([richardson_lucy(d, k, iterations) for d, k in 
+                     zip(D, kernel)]).reshape(s.data.shape)
+
+def test_richardson_lucy_shared_kernel():
+    s = get_blurred_spectra()
+    psf = gaussian(30, 3)
+    expected = get_expected_richardson_lucy(s, psf, 15)
+    # Chunks of a single row of spectra
+    Experiments(s).richardson_lucy_deconvolution(
+        kernel = Spectrum({'data' : psf}), max_chunk_size = 3 * length * 8)
+    assert_true(np.allclose(s.data, expected))
+
+def test_richardson_lucy_kernel_per_pixel():
+    s = get_blurred_spectra()
+    psf = np.array([gaussian(30 + i, 2 + 0.5 * i) for i in xrange(6)])
+    psf = psf.reshape((2, 3, length))
+    expected = get_expected_richardson_lucy(s, psf, 15)
+    Experiments(s).richardson_lucy_deconvolution(
+        kernel = Spectrum({'data' : psf}), max_chunk_size = 3 * length * 8)
+    assert_true(np.allclose(s.data, expected))
+
+def test_richardson_lucy_mask():
+    s = get_blurred_spectra()
+    original = s.data.copy()
+    psf = gaussian(30, 3)
+    expected = get_expected_richardson_lucy(s, psf, 15)
+    mask = np.array([[True, False, True], [False, True, False]])
+    expected[mask == False] = original[mask == False]
+    Experiments(s).richardson_lucy_deconvolution(
+        kernel = Spectrum({'data' : psf}), mask = mask, 
+        max_chunk_size = 3 * length * 8)
+    assert_true(np.allclose(s.data, expected))
+
+def test_richardson_lucy_tolerance():
+    psf = gaussian(30, 3)
+    # All the spectra converge after the first iteration with a large
+    # tolerance, and never with a tiny one
+    for tolerance, iterations in ((1., 1), (1e-12, 15)):
+        s = get_blurred_spectra()
+        expected = get_expected_richardson_lucy(s, psf, iterations)
+        Experiments(s).richardson_lucy_deconvolution(
+            kernel = Spectrum({'data' : psf}), tolerance = tolerance)
+        assert_true(np.allclose(s.data, expected))
+
+def get_loss_spectra():
+    """Returns the low loss and high loss SIs of shape (2, 3, 256) of 
+    increasing thickness, the zero loss and the zero loss convolved core 
+    loss"""
+    size = 256
+    energy = np.arange(size, dtype = 'float64')
+    zero_loss = gaussian(10, 2, 1000., energy)
+    core_loss = np.where(energy >= 20, 10 * np.exp(-(energy - 20) / 10.), 0)
+    core_loss = np.convolve(zero_loss, core_loss)[:size]
+    ll = np.empty((6, size))
+    hl = np.empty((6, size))
+    for i, thickness in enumerate(np.linspace(0.1, 0.6, 6)):
+        single_scattering = gaussian(50, 8, thickness, energy)
+        plural_scattering = np.zeros(size)
+        plural_scattering[0] = 1
+        term = plural_scattering.copy()
+        for n in xrange(1, 8):
+            term = np.convolve(term, single_scattering)[:size]
+            plural_scattering += term / math.factorial(n)
+        ll[i] = np.convolve(zero_loss, plural_scattering)[:size]
+        hl[i] = np.convolve(core_loss, plural_scattering)[:size]
+    return (Spectrum({'data' : hl.reshape((2, 3, size))}), 
+            EELSSpectrum({'data' : ll.reshape((2, 3, size))}), 
+            zero_loss, core_loss)
+
+def test_fourier_ratio_shared_zero_loss():
+    hl, ll, zero_loss, core_loss = get_loss_spectra()
+    ll.zero_loss = EELSSpectrum({'data' : zero_loss})
+    # Chunks of a single row of spectra
+    result = Experiments(hl, ll).fourier_ratio_deconvolution(
+        max_chunk_size = 3 * 256 * 8)
+    assert_true(np.allclose(result.data, core_loss, 
+                            atol = 1e-3 * core_loss.max()))
+
+def test_fourier_ratio_zero_loss_per_pixel():
+    hl, ll, zero_loss, core_loss = get_loss_spectra()
+    ll.zero_loss = EELSSpectrum({'data' : zero_loss})
+    shared = Experiments(hl, ll).fourier_ratio_deconvolution()
+    ll.zero_loss = EELSSpectrum({'data' : zero_loss * np.ones((2, 3, 1))})
+    result = Experiments(hl, ll).fourier_ratio_deconvolution(
+        max_chunk_size = 3 * 256 * 8)
+    assert_true(np.allclose(result.data, shared.data))
+    assert_true(np.allclose(result.data, core_loss, 
+                            atol = 1e-3 * core_loss.max()))
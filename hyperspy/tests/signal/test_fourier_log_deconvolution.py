@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import math
+
+import numpy as np
+from nose.tools import assert_true
+
+from hyperspy.signals.eels import EELSSpectrum
+
+size = 256
+x = np.arange(size, dtype = 'float64')
+
+def gaussian(centre, sigma, area = 1.):
+    return area * np.exp(-(x - centre) ** 2 / (2 * sigma ** 2)) / \
+        (sigma * np.sqrt(2 * np.pi))
+
+def get_low_loss(zero_loss, single_scattering):
+    """Returns the Poisson sum of the multiple scattering of 
+    single_scattering convolved with zero_loss"""
+    data = zero_loss.copy()
+    term = zero_loss.copy()
+    for n in xrange(1, 8):
+        term = np.convolve(term, single_scattering)[:size]
+        data += term / math.factorial(n)
+    return data
+
+def get_low_loss_spectra():
+    """Returns an SI of shape (2, 3, size) with increasing thickness, its 
+    zero loss and the zero loss convolved single scattering distributions"""
+    zero_loss = gaussian(10, 2, 1000.)
+    data = np.empty((2, 3, size))
+    expected = np.empty((2, 3, size))
+    for i, thickness in enumerate(np.linspace(0.1, 0.6, 6)):
+        single_scattering = gaussian(50, 8, thickness)
+        data.reshape((-1, size))[i] = get_low_loss(zero_loss, 
+                                                   single_scattering)
+        expected.reshape((-1, size))[i] = np.convolve(zero_loss, 
+            single_scattering)[:size]
+    return EELSSpectrum({'data' : data}), zero_loss, expected
+
+def test_shared_zero_loss():
+    s, zero_loss, expected = get_low_loss_spectra()
+    s.zero_loss = EELSSpectrum({'data' : zero_loss})
+    # Chunks of a single row of spectra
+    s.fourier_log_deconvolution(max_chunk_size = 3 * size * 8)
+    assert_true(np.allclose(s.data, expected, atol = 1e-2))
+
+def test_zero_loss_per_pixel():
+    s, zero_loss, expected = get_low_loss_spectra()
+    zero_loss = EELSSpectrum({'data' : 
+        zero_loss * np.ones((2, 3, 1))})
+    s.fourier_log_deconvolution(zero_loss = zero_loss, 
+                                max_chunk_size = 3 * size * 8)
+    assert_true(np.allclose(s.data, expected, atol = 1e-2))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true
+
+from hyperspy.signals.spectrum import Spectrum
+from hyperspy.misc.utils import get_temporary_memmap, \
+    two_area_powerlaw_estimation, two_area_indexes
+
+def get_power_law_spectra(data = None):
+    """Returns spectra with a power law background of variable exponent 
+    and an edge at 300 eV"""
+    energy = np.arange(100., 400.)
+    r = np.linspace(2.5, 3.5, 12).reshape((3, 4, 1))
+    if data is None:
+        data = 1e9 * energy ** -r + 10. * (energy >= 300)
+    axes = [{'name' : name,
+             'scale' : 1.,
+             'offset' : offset,
+             'size' : size,
+             'units' : units,
+             'index_in_array' : i,
+             'slice_bool' : i == 2} for i, (name, offset, size, units) in 
+             enumerate((('x', 0., 3, 'nm'), ('y', 0., 4, 'nm'), 
+                        ('Energy', 100., 300, 'eV')))]
+    return Spectrum({'data' : data, 'axes' : axes})
+
+def get_full_cube_result(s, E1, E2):
+    """The background removed from the whole data at once with 
+    two_area_powerlaw_estimation"""
+    parameters = two_area_powerlaw_estimation(s, E1, E2)
+    axis = s.axes_manager._slicing_axes[0]
+    i2 = two_area_indexes(axis, E1, E2)[1]
+    result = np.zeros(s.data.shape)
+    result[..., i2:] = s.data[..., i2:] - \
+        parameters['A'][..., np.newaxis] * \
+        axis.axis[i2:] ** -parameters['r'][..., np.newaxis]
+    return result
+
+def test_remove_power_law_background():
+    s = get_power_law_spectra()
+    expected = get_full_cube_result(s, 200., 290.)
+    # Chunks of a single row of spectra
+    result = s.remove_power_law_background(200., 290., 
+                                           max_chunk_size = 4 * 300 * 8)
+    assert_true(np.allclose(result.data, expected))
+    s.remove_power_law_background(200., 290., inplace = True, 
+                                  max_chunk_size = 4 * 300 * 8)
+    assert_true(np.allclose(s.data, expected))
+
+def test_remove_power_law_background_from_data_on_disk():
+    data = get_power_law_spectra().data
+    memmap = get_temporary_memmap(data.shape, data.dtype)
+    memmap[:] = data
+    s = get_power_law_spectra(memmap)
+    result = s.remove_power_law_background(200., 290.)
+    assert_true(isinstance(result.data, np.memmap))
+    assert_true(np.allclose(result.data, get_full_cube_result(s, 200., 290.)))
+
+def test_power_law_signal_maps():
+    s = get_power_law_spectra()
+    result = s.power_law_signal_maps([((200., 290.), (300., 350.))], 
+                                     max_chunk_size = 4 * 300 * 8)[0]
+    expected = get_full_cube_result(s, 200., 290.)[..., 200:250].sum(-1)
+    assert_true(np.allclose(result['signal'].data, expected))
+    parameters = two_area_powerlaw_estimation(s, 200., 290.)
+    assert_true(np.allclose(result['r'].data, parameters['r']))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true
+
+from hyperspy.signals.spectrum import Spectrum
+
+def get_shifted_gaussians(shifts):
+    """Returns a spectrum per shift, a gaussian centred at 100 - shift"""
+    x = np.arange(200.)
+    shifts = np.asarray(shifts)[:, np.newaxis]
+    return Spectrum({'data' : np.exp(-(x - 100 + shifts) ** 2 / 
+                                     (2 * 5. ** 2))})
+
+def test_subpixel_shifts():
+    shifts = [0., 2.3, -4.6, 0.4]
+    s = get_shifted_gaussians(shifts)
+    result = s.estimate_shift_in_index_1D()
+    assert_true(np.allclose(result.ravel(), shifts, atol = 0.01))
+
+def test_max_shift():
+    s = get_shifted_gaussians([0., 2.3, -4.6])
+    result = s.estimate_shift_in_index_1D(max_shift = 3, 
+                                          interpolate = False)
+    assert_true(np.all(np.abs(result) <= 3))
+    assert_true(np.allclose(result.ravel()[:2], [0, 2]))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Copyright 2007-2011 The Hyperspy developers
+#
+# This file is part of  Hyperspy.
+#
+#  Hyperspy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+#  Hyperspy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with  Hyperspy.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from nose.tools import assert_true, assert_equal, assert_almost_equal
+
+from hyperspy.signals.spectrum import Spectrum
+
+# The methods that return maps of the navigation space must work with a 
+# single spectrum, i.e. with no navigation axes
+
+def get_gaussian_spectrum():
+    x = np.arange(100, 200, 0.5)
+    data = 100 * np.exp(-(x - 150) ** 2 / (2 * 4. ** 2)) + \
+        1e8 * x ** -3
+    axes = [{'name' : 'Energy',
+             'scale' : 0.5,
+             'offset' : 100.,
+             'size' : len(x),
+             'units' : 'eV',
+             'index_in_array' : 0,
+             'slice_bool' : True}]
+    return Spectrum({'data' : data, 'axes' : axes})
+
+def test_map_scalar_output():
+    s = get_gaussian_spectrum()
+    maximum = s.map(np.max, out_shape = ())
+    assert_equal(maximum, s.data.max())
+
+def test_calculate_FWHM_maps():
+    s = get_gaussian_spectrum()
+    s.data -= 1e8 * s.axes_manager.axes[0].axis ** -3
+    results = s.calculate_FWHM_maps()
+    assert_almost_equal(results['FWHM'], 2 * np.sqrt(2 * np.log(2)) * 4.,
+                        places = 1)
+    assert_almost_equal(results['centre'], 150., places = 2)
+
+def test_peakfind_1D():
+    s = get_gaussian_spectrum()
+    s.peakfind_1D()
+    assert_true(isinstance(s.peaks, np.ndarray))
+
+def test_power_law_signal_maps():
+    s = get_gaussian_spectrum()
+    result = s.power_law_signal_maps([((110., 130.), (140., 160.))])[0]
+    assert_true(np.isscalar(result['signal']))
+    assert_almost_equal(result['r'], 3., places = 1)
@@ -34,7 +34,7 @@ import hyperspy.Release as Release
 if os.path.exists('build'):
     distutils.dir_util.remove_tree('build')
 
-install_req = ['scipy', 'ipython', 'matplotlib', 'numpy', 'mdp', 'netcdf', 
+install_req = ['scipy', 'ipython', 'matplotlib', 'numpy', 'netcdf', 
 'nose', 'traits', 'traitsui', 'h5py', 'nose',]
 # Add also open-cv and chaco?
 